@@ -0,0 +1,65 @@
+"""
+compares the sequential page crawl of the domain with listing every org unit
+in its own thread, against the fake directory from tests/ with a simulated
+round trip latency.
+
+    python benchmarks/bench_listing.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from fake_directory import FakeDirectory  # noqa: E402
+from schild_workspace import WorkspaceUsers  # noqa: E402
+
+CLASSES = [f"{year:02}{letter}" for year in range(5, 11) for letter in "abcd"]
+ORG_UNITS = [f"/Schüler/{year:02}" for year in range(5, 11)]
+ORG_UNITS += ["/Schüler/Oberstufe", "/Lehrer"]
+
+
+def users(amount):
+    org_units = [f"/Schüler/{klasse[:2]}/{klasse}" for klasse in CLASSES]
+    org_units += ["/Schüler/Oberstufe/EF", "/Schüler/Oberstufe/Q1", "/Lehrer"]
+    return [
+        {
+            "primaryEmail": f"user{i:06}@example.org",
+            "orgUnitPath": org_units[i % len(org_units)],
+            "name": {"givenName": "User", "familyName": str(i)},
+            "externalIds": [{"value": str(i), "type": "organization"}],
+        }
+        for i in range(amount)
+    ]
+
+
+def run(directory, **kwargs):
+    calls = directory.calls["list"]
+    start = time.perf_counter()
+    workspace = WorkspaceUsers(
+        "example.org",
+        creds=AnonymousCredentials(),
+        api_endpoint=directory.url,
+        **kwargs,
+    )
+    elapsed = time.perf_counter() - start
+    return len(workspace.users), directory.calls["list"] - calls, elapsed
+
+
+def main(amount=10000, latency=0.2):
+    with FakeDirectory(users(amount), latency=latency) as directory:
+        print(f"{amount} users, {latency * 1000:.0f} ms per request")
+        variants = {
+            "sequential": {},
+            "per org unit": {"list_org_units": ORG_UNITS},
+        }
+        for label, kwargs in variants.items():
+            loaded, calls, elapsed = run(directory, **kwargs)
+            print(f"{label:>14}: {elapsed:6.2f} s, {calls:3} list calls, {loaded} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+compares sanitize_username with the former implementation, which
+concatenated strings and decoded every non-ascii character on its own.
+
+    python benchmarks/bench_sanitize.py
+"""
+import os
+import random
+import sys
+import timeit
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from schild_workspace.names import sanitize_username, sanitize_usernames  # noqa: E402
+
+FIRST_NAMES = ["Jürgen", "Ömer", "José", "Zoë", "Ana-Lena", "Çağla", "Max", "Sören", "Noémie"]
+LAST_NAMES = ["Müller", "Schröder", "Yıldız", "Kovačević", "Groß", "van der Berg", "Dvořák"]
+
+
+def legacy_sanitize_username(name):
+    REPLACE_MAP = {" ": "-", "ß": "ss", "ä": "ae", "ö": "oe", "ü": "ue", "æ": ""}
+    TARGET_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789._-"
+    username = ""
+
+    def _char_translate(c):
+        base = unicodedata.decomposition(c).split(" ")[0].strip("0")
+        return bytes.fromhex(base).decode("utf-8")
+
+    for c in name.lower():
+        if c in TARGET_CHARS:
+            username += c
+        elif c in REPLACE_MAP:
+            username += REPLACE_MAP[c]
+        else:
+            username += _char_translate(c)
+    return username
+
+
+def names(amount, seed=0):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}" for _ in range(amount)
+    ]
+
+
+def main(amount=10000, repeat=5):
+    column = [name for name in names(amount) if "ı" not in name]
+    for name in column[:200]:
+        assert legacy_sanitize_username(name) == sanitize_username(name), name
+    results = {
+        "legacy": lambda: [legacy_sanitize_username(name) for name in column],
+        "sanitize_username": lambda: [sanitize_username(name) for name in column],
+        "sanitize_usernames": lambda: sanitize_usernames(column),
+    }
+    print(f"{len(column)} names, best of {repeat}")
+    for label, run in results.items():
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f"{label:>20}: {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
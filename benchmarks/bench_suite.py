@@ -0,0 +1,135 @@
+"""
+runs the main operations against the fake directory from tests/ for
+synthetic schools of different sizes and reports wall time, directory api
+calls and peak memory (tracemalloc, also counts the fake server) per step.
+
+    python benchmarks/bench_suite.py                 # 1000, 10000 and 50000 students
+    python benchmarks/bench_suite.py 1000 --latency 0.05
+    python benchmarks/bench_suite.py 10000 --no-memory
+
+tracemalloc slows python down noticeably, use --no-memory for wall times
+that are comparable with production runs.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from fake_directory import FakeDirectory  # noqa: E402
+from schild_workspace import SchildUsers, WorkspaceUsers  # noqa: E402
+from schild_workspace.passwords import PasswordExport  # noqa: E402
+from schild_workspace.workspace_users import plan_next_year  # noqa: E402
+from synthetic import SyntheticSchool  # noqa: E402
+
+SIZES = (1000, 10000, 50000)
+
+
+class Step(object):
+    def __init__(self, name, seconds, calls, peak):
+        self.name = name
+        self.seconds = seconds
+        self.calls = calls
+        self.peak = peak
+
+    def __str__(self):
+        peak = "-" if self.peak is None else f"{self.peak / 2**20:7.1f} MiB"
+        return f"{self.name:>22}: {self.seconds:8.3f} s {self.calls:7} calls {peak:>11}"
+
+
+def api_calls(directory):
+    """directory api operations, batched ones included, without the batch requests"""
+    return sum(directory.calls.values()) - directory.calls["batch"]
+
+
+def measure(name, directory, function, memory=True):
+    """runs function, its output is discarded. returns (Step, result)"""
+    calls = api_calls(directory)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = function()
+    finally:
+        seconds = time.perf_counter() - start
+        peak = None
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    step = Step(name, seconds, api_calls(directory) - calls, peak)
+    return step, result
+
+
+def run(amount, latency=0.0, memory=True, batch_size=50):
+    school = SyntheticSchool(amount)
+    steps = []
+    with tempfile.TemporaryDirectory() as tmp, FakeDirectory(
+        school.directory_users(), latency=latency
+    ) as directory:
+        schild_file = os.path.join(tmp, "schild.txt")
+        school.write_schild_csv(schild_file)
+
+        def _step(name, function):
+            step, result = measure(name, directory, function, memory)
+            steps.append(step)
+            return result
+
+        schild = _step("load schild csv", lambda: SchildUsers(schild_file))
+        workspace = _step(
+            "_get_users",
+            lambda: WorkspaceUsers(
+                "example.org", creds=AnonymousCredentials(), api_endpoint=directory.url
+            ),
+        )
+        _step("get_former_students", lambda: workspace.get_former_students(schild))
+        terms = school.search_terms()
+        _step("query x100", lambda: [workspace.query(name=term) for term in terms])
+        _step("search x100", lambda: [workspace.search(term) for term in terms])
+        _step("find_users x100", lambda: [schild.find_users(term) for term in terms])
+        new_students = [
+            user for user in schild.users if int(user.schildID) >= school.amount
+        ]
+        _step(
+            "add_schild_students",
+            lambda: workspace.add_schild_students(
+                new_students,
+                batch_size=batch_size,
+                password_export=PasswordExport(tmp),
+            ),
+        )
+        # every student has to be promoted, or the step measures too little
+        students = sum(1 for user in workspace.users if user.is_student())
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            planned = len(plan_next_year(workspace.users))
+        assert planned == students, f"{planned} of {students} students planned"
+        _step(
+            "move_to_next_year",
+            lambda: workspace.move_to_next_year(True, batch_size=batch_size),
+        )
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=SIZES)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--no-memory", action="store_true")
+    args = parser.parse_args()
+    for amount in args.sizes:
+        print(f"{amount} students, {args.latency * 1000:.0f} ms latency")
+        for step in run(amount, args.latency, not args.no_memory, args.batch_size):
+            print(step)
+        print()
+
+
+if __name__ == "__main__":
+    main()
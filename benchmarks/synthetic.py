@@ -0,0 +1,81 @@
+"""
+synthetic schools for the benchmarks: SCHILD exports and the matching
+directory users.
+
+students 0..amount-1 have an account, `new` students only exist in SCHILD
+and `former` students only in the directory.
+"""
+import csv
+import random
+
+from schild_workspace.workspace_users import org_unit_for_class
+
+FIRST_NAMES = [
+    "Max", "Eva", "Jürgen", "Ömer", "José", "Zoë", "Ana-Lena", "Çağla", "Sören",
+    "Noémie", "Lukas", "Mia", "Leon", "Emma", "Finn", "Hannah", "Elias", "Lea",
+]
+LAST_NAMES = [
+    "Müller", "Schröder", "Yılmaz", "Kovačević", "Groß", "van der Berg", "Dvořák",
+    "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker",
+]
+# the numeric scheme next_org_unit promotes, 051 -> /Schüler/05/051
+CLASSES = [f"{year:02}{number}" for year in range(5, 11) for number in range(1, 5)]
+CLASSES += ["EF", "Q1", "Q2"]
+
+
+class SyntheticSchool(object):
+    def __init__(self, amount, new=0.1, former=0.1, seed=0):
+        rng = random.Random(seed)
+        self.amount = amount
+        self.students = []
+        for i in range(amount + int(amount * new)):
+            self.students.append(
+                {
+                    "Vorname": rng.choice(FIRST_NAMES),
+                    "Nachname": f"{rng.choice(LAST_NAMES)}{i}",
+                    "Klasse": rng.choice(CLASSES),
+                    "Interne ID-Nummer": str(i),
+                }
+            )
+        self.former = set(range(amount - int(amount * former), amount))
+
+    def write_schild_csv(self, path):
+        """the SCHILD export, without the former students"""
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.students[0]), delimiter=";")
+            writer.writeheader()
+            for i, student in enumerate(self.students):
+                if i not in self.former:
+                    writer.writerow(student)
+
+    def directory_users(self):
+        """the accounts of the first `amount` students and a few teachers"""
+        users = []
+        for i, student in enumerate(self.students[: self.amount]):
+            users.append(
+                {
+                    "primaryEmail": f"student{i}@example.org",
+                    "orgUnitPath": org_unit_for_class(student["Klasse"]),
+                    "name": {
+                        "givenName": student["Vorname"],
+                        "familyName": student["Nachname"],
+                    },
+                    "externalIds": [
+                        {"value": student["Interne ID-Nummer"], "type": "organization"}
+                    ],
+                }
+            )
+        for i in range(max(1, self.amount // 20)):
+            users.append(
+                {
+                    "primaryEmail": f"teacher{i}@example.org",
+                    "orgUnitPath": "/Lehrer",
+                    "name": {"givenName": "Teacher", "familyName": str(i)},
+                }
+            )
+        return users
+
+    def search_terms(self, amount=100, seed=1):
+        rng = random.Random(seed)
+        students = rng.sample(self.students[: self.amount], min(amount, self.amount))
+        return [student["Nachname"][:6] for student in students]
@@ -1,2 +1,26 @@
-from .workspace_users import WorkspaceUsers
-from .schild_users import SchildUsers
+"""
+the google client libraries take a moment to import, so the classes are
+only imported on first use. scripts that only read SCHILD exports never
+load them.
+"""
+import importlib
+
+_EXPORTS = {
+    "WorkspaceUsers": ".workspace_users",
+    "AsyncWorkspaceUsers": ".async_workspace_users",
+    "SchildUsers": ".schild_users",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
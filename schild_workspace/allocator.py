@@ -0,0 +1,94 @@
+import re
+import threading
+from collections import defaultdict
+
+_SUFFIX = re.compile(r"^(.*?)(\d*)$")
+
+
+def _split(local_part):
+    """"max.muster12" -> ("max.muster", "12")"""
+    return _SUFFIX.match(local_part).groups()
+
+
+class UsernameAllocator(object):
+    """
+    hands out free addresses username@domain, username1@domain, ...
+
+    used addresses (primary addresses and aliases) are kept in a dict
+    from the name without trailing digits to the set of used suffixes,
+    an allocated address counts as used right away, so it is reserved
+    until it is released again.
+    """
+
+    def __init__(self, domain, addresses=()):
+        self.domain = domain
+        self._used = defaultdict(set)
+        # first counter worth probing per username
+        self._next = {}
+        self._lock = threading.Lock()
+        for address in addresses:
+            self.add(address)
+
+    @classmethod
+    def from_users(cls, domain, users):
+        addresses = []
+        for user in users:
+            addresses.append(user["primaryEmail"])
+            addresses += user.get("aliases", [])
+        return cls(domain, addresses)
+
+    def _local_part(self, address):
+        local_part, _, domain = address.lower().partition("@")
+        if domain and domain != self.domain:
+            return None
+        return local_part
+
+    def __contains__(self, address):
+        local_part = self._local_part(address)
+        if local_part is None:
+            return False
+        base, suffix = _split(local_part)
+        return suffix in self._used.get(base, ())
+
+    def add(self, address):
+        local_part = self._local_part(address)
+        if local_part is None:
+            return
+        base, suffix = _split(local_part)
+        with self._lock:
+            self._used[base].add(suffix)
+
+    def release(self, address):
+        local_part = self._local_part(address)
+        if local_part is None:
+            return
+        base, suffix = _split(local_part)
+        with self._lock:
+            self._used[base].discard(suffix)
+            # a smaller counter may be free again
+            self._next.clear()
+
+    def allocate(self, username):
+        """returns and reserves the first free address for username"""
+        with self._lock:
+            counter = self._next.get(username, 0)
+            while True:
+                local_part = f"{username}{counter or ''}"
+                base, suffix = _split(local_part)
+                if suffix not in self._used[base]:
+                    break
+                counter += 1
+            self._used[base].add(suffix)
+            self._next[username] = counter + 1
+        return f"{local_part}@{self.domain}"
+
+    def allocate_batch(self, requests):
+        """
+        requests is a list of (key, username) tuples, returns {key: address}.
+        keys are processed in sorted order, so the same input always gets
+        the same addresses.
+        """
+        return {
+            key: self.allocate(username)
+            for key, username in sorted(requests, key=lambda request: str(request[0]))
+        }
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote, urlencode
+
+import httplib2
+import httpx
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+
+from .allocator import UsernameAllocator
+from .credentials import get_credentials
+from .metrics import Metrics
+from .passwords import PasswordExport
+from .provisioning import TokenBucket, is_retryable
+from .records import USER_LIST_FIELDS
+from .wordlist import generate_password
+from .workspace_users import (
+    MAX_PAGE_SIZE,
+    User,
+    UserIndex,
+    build_query,
+    insert_body,
+    new_user_data,
+    org_unit_for_class,
+    patch_body,
+    plan_next_year,
+    username_for,
+)
+
+DEFAULT_API_ENDPOINT = "https://admin.googleapis.com/"
+USERS_PATH = "admin/directory/v1/users"
+
+
+class AsyncWorkspaceUsers(object):
+    """
+    asyncio counterpart of WorkspaceUsers for the bulk operations:
+
+        async with AsyncWorkspaceUsers("example.org") as workspace:
+            await workspace.list()
+            failed = await workspace.add_schild_students(schild.users)
+
+    requests go directly to the json api over the connection pool of an
+    httpx.AsyncClient, at most `concurrency` at a time and optionally
+    limited to queries_per_second. failed requests are retried
+    like in execute_with_backoff and counted in self.metrics.
+
+    the userlist is kept in memory like in WorkspaceUsers, list() loads it.
+    """
+
+    def __init__(
+        self,
+        domain,
+        creds=None,
+        api_endpoint=None,
+        concurrency=10,
+        queries_per_second=None,
+        metrics=None,
+        customer="my_customer",
+    ):
+        self.domain = domain
+        self.customer = customer
+        self.creds = creds if creds is not None else get_credentials()
+        self.api_endpoint = api_endpoint or DEFAULT_API_ENDPOINT
+        self.concurrency = concurrency
+        # proxies are taken from the environment (HTTPS_PROXY) by httpx
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency),
+            timeout=httpx.Timeout(60.0),
+            follow_redirects=True,
+        )
+        self.rate_limiter = None
+        if queries_per_second:
+            self.rate_limiter = TokenBucket(queries_per_second)
+        self.retries = 5
+        self.base_delay = 1.0
+        self.max_delay = 32.0
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._refresh_lock = None
+        self.users = []
+        # set once list() loaded the whole domain
+        self.complete = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.http.aclose()
+
+    @property
+    def users(self):
+        return self._users
+
+    @users.setter
+    def users(self, users):
+        self._users = users
+        self.index = UserIndex(users)
+        self._allocator = None
+
+    @property
+    def allocator(self):
+        if self._allocator is None:
+            self._allocator = UsernameAllocator.from_users(self.domain, self._users)
+        return self._allocator
+
+    def get_user_by_mail(self, mail):
+        return self.index.by_mail.get(mail)
+
+    def get_user_by_schild_id(self, schild_id):
+        return self.index.by_schild_id.get(str(schild_id))
+
+    def _add_to_users(self, user):
+        self._users.append(user)
+        self.index.add(user)
+        if self._allocator is not None:
+            self._allocator.add(user["primaryEmail"])
+        return user
+
+    def _remove_from_users(self, user):
+        self.index.remove(user)
+        if self._allocator is not None:
+            self._allocator.release(user["primaryEmail"])
+        self._users = [other for other in self._users if other is not user]
+
+    def _store_result(self, result):
+        user = self.index.by_mail.get(result["primaryEmail"])
+        if user is None:
+            return self._add_to_users(User(result))
+        user.data = result
+        user.clean()
+        self.index.update(user)
+        return user
+
+    # -- requests
+
+    async def _headers(self):
+        if not self.creds.valid:
+            if self._refresh_lock is None:
+                self._refresh_lock = asyncio.Lock()
+            async with self._refresh_lock:
+                if not self.creds.valid:
+                    # google-auth only refreshes synchronously
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self.creds.refresh, Request())
+        headers = {"Accept": "application/json"}
+        self.creds.apply(headers)
+        return headers
+
+    def _url(self, key=None, params=None):
+        url = self.api_endpoint.rstrip("/") + "/" + USERS_PATH
+        if key:
+            url += "/" + quote(key)
+        params = {name: value for name, value in (params or {}).items() if value}
+        if params:
+            url += "?" + urlencode(params)
+        return url
+
+    async def _send(self, operation, method, key=None, params=None, body=None):
+        url = self._url(key, params)
+        data = json.dumps(body).encode() if body is not None else None
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve())
+            headers = await self._headers()
+            if data is not None:
+                headers["Content-Type"] = "application/json"
+            start = time.perf_counter()
+            response = await self.http.request(
+                method, url, headers=headers, content=data
+            )
+            status, content = response.status_code, response.content
+            seconds = time.perf_counter() - start
+            self.metrics.add_bytes(operation, len(data or b""), len(content))
+            if status < 300:
+                self.metrics.record(operation, seconds)
+                return json.loads(content) if content else None
+            error = HttpError(httplib2.Response({"status": status}), content, uri=url)
+            self.metrics.record(operation, seconds, error)
+            if attempt >= self.retries or not is_retryable(error):
+                raise error
+            self.metrics.retry(operation)
+            delay = min(self.max_delay, self.base_delay * 2**attempt)
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            attempt += 1
+
+    async def _map(self, function, items):
+        """
+        awaits function(item) for all items, at most self.concurrency at a
+        time. returns a list of (result, error) tuples in the order of items.
+        """
+        results = [None] * len(items)
+        pending = iter(enumerate(items))
+
+        async def _worker():
+            for i, item in pending:
+                try:
+                    results[i] = (await function(item), None)
+                except Exception as e:
+                    results[i] = (None, e)
+
+        workers = min(self.concurrency, len(items))
+        await asyncio.gather(*[_worker() for _ in range(workers)])
+        return results
+
+    # -- operations
+
+    async def _list(self, query=None):
+        users = []
+        params = {
+            "customer": self.customer,
+            "maxResults": MAX_PAGE_SIZE,
+            "orderBy": "email",
+            "fields": USER_LIST_FIELDS,
+            "query": query,
+        }
+        while True:
+            result = await self._send("list", "GET", params=params)
+            users += result.get("users", [])
+            if not result.get("nextPageToken"):
+                return users
+            params["pageToken"] = result["nextPageToken"]
+
+    async def list(self, query=None, org_units=None):
+        """
+        without arguments the whole domain is loaded into self.users.
+        a query (see build_query) only merges the matching users into
+        self.users, org_units lists these org units concurrently instead
+        of the whole domain. returns the listed users.
+        """
+        if org_units:
+            pages = await asyncio.gather(
+                *[self._list(build_query(org_unit=org_unit)) for org_unit in org_units]
+            )
+            results = {}
+            for users in pages:
+                for user in users:
+                    results.setdefault(user["primaryEmail"], user)
+            results = sorted(results.values(), key=lambda user: user["primaryEmail"])
+        else:
+            results = await self._list(query)
+        if query is None:
+            self.users = [User(user) for user in results]
+            self.complete = not org_units
+            return list(self.users)
+        return [self._store_result(user) for user in results]
+
+    async def add_user(
+        self,
+        first_name,
+        last_name,
+        recoveryEmail=None,
+        schild_id=None,
+        password=None,
+        teacher=False,
+        schoolclass=None,
+        changePasswordAtNextLogin=False,
+        primaryEmail=None,
+    ):
+        """same as WorkspaceUsers.add_user, returns a tuple (User, password)"""
+        if not teacher and not schoolclass:
+            print("you need to proivide a schoolclass for students")
+            return None
+        user = User(
+            new_user_data(
+                first_name,
+                last_name,
+                recoveryEmail,
+                schild_id,
+                teacher,
+                schoolclass,
+                changePasswordAtNextLogin,
+            )
+        )
+        existing = self.get_user_by_schild_id(schild_id) if schild_id else None
+        if existing is not None:
+            user["primaryEmail"] = existing["primaryEmail"]
+            return await self.update_user(user), None
+        if not primaryEmail:
+            primaryEmail = self.allocator.allocate(
+                username_for(first_name, last_name, teacher)
+            )
+        user["primaryEmail"] = primaryEmail
+        if not password:
+            password = generate_password()
+        try:
+            result = await self._send(
+                "insert", "POST", body=insert_body(user, password)
+            )
+        except Exception:
+            self.allocator.release(primaryEmail)
+            raise
+        return self._store_result(result), password
+
+    async def update_user(self, user):
+        """sends the changed fields of user, see WorkspaceUsers.update_user"""
+        cached = self.index.by_mail.get(user["primaryEmail"])
+        body = patch_body(user, cached)
+        if not body:
+            return cached if cached is not None else user
+        result = await self._send("patch", "PATCH", user["primaryEmail"], body=body)
+        return self._store_result(result)
+
+    async def delete_user(self, user):
+        await self._send("delete", "DELETE", user["primaryEmail"])
+        cached = self.index.by_mail.get(user["primaryEmail"])
+        if cached is not None:
+            self._remove_from_users(cached)
+
+    async def move_to_next_year(self, i_really_know_what_i_am_doing=False):
+        """
+        promote all students to the next grade, see
+        WorkspaceUsers.move_to_next_year. the whole domain is listed first,
+        unless list() already loaded it. returns a list of (step, error)
+        tuples for failed users.
+        """
+        if not i_really_know_what_i_am_doing:
+            print("think again!")
+            return None
+        if not self.complete:
+            await self.list()
+
+        async def _move(step):
+            user = self.get_user_by_mail(step["primaryEmail"])
+            if step["to"] == "delete":
+                return await self.delete_user(user)
+            user["orgUnitPath"] = step["to"]
+            return await self.update_user(user)
+
+        steps = [step for _, step in plan_next_year(self.users)]
+        results = await self._map(_move, steps)
+        return [(step, error) for step, (_, error) in zip(steps, results) if error]
+
+    async def add_schild_students(
+        self, schild_users, onboarding=False, password_export=None
+    ):
+        """
+        creates accounts for all new schild_users and moves existing ones to
+        their class, see WorkspaceUsers.add_schild_students. passwords go to
+        password_export. returns a list of (schild_user, error) tuples for
+        failed students. like move_to_next_year, the whole domain is listed
+        first if needed.
+        """
+        schild_users = list(schild_users)
+        if not self.complete:
+            await self.list()
+        addresses = self.allocator.allocate_batch(
+            [
+                (
+                    str(user["Interne ID-Nummer"]),
+                    username_for(user["Vorname"], user["Nachname"]),
+                )
+                for user in schild_users
+                if not self.get_user_by_schild_id(user["Interne ID-Nummer"])
+            ]
+        )
+
+        async def _add(user):
+            schild_id = str(user["Interne ID-Nummer"])
+            return await self.add_user(
+                first_name=user["Vorname"],
+                last_name=user["Nachname"],
+                schild_id=schild_id,
+                schoolclass=org_unit_for_class(user["Klasse"], onboarding),
+                primaryEmail=addresses.get(schild_id),
+            )
+
+        results = await self._map(_add, schild_users)
+        failed = []
+        if password_export is None:
+            password_export = PasswordExport()
+        with password_export:
+            for user, (result, error) in zip(schild_users, results):
+                if error is not None:
+                    failed.append((user, error))
+                    continue
+                workspace_user, pw = result
+                if pw:
+                    password_export.add(user["Klasse"], workspace_user, pw)
+        return failed
@@ -0,0 +1,176 @@
+import time
+
+from googleapiclient.http import BatchHttpRequest
+
+from .metrics import operation_name
+from .provisioning import backoff_delay, is_retryable
+
+# the directory api accepts up to 1000 calls per batch, google recommends 50
+DEFAULT_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 1000
+
+
+class BatchResult(object):
+    def __init__(self, operation, user, result=None, error=None):
+        self.operation = operation
+        self.user = user
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error: {self.error}"
+        return f"{self.operation} {self.user.get('primaryEmail')} - {status}"
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class DirectoryBatch(object):
+    """
+    queues directory api requests and sends them in groups of `size`
+    through the http batch endpoint.
+
+    every queued request belongs to a User, results and errors are
+    collected as BatchResult objects in `self.results`. with keep_results
+    unset they are only passed to on_flush, for jobs over many users.
+
+    a full group is sent when the next request is queued (or on flush), so
+    nothing reaches on_flush before add() or skip() returned and the caller
+    has registered what it waits for.
+    """
+
+    def __init__(self, workspace, size=DEFAULT_BATCH_SIZE, keep_results=True):
+        if not 0 < size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch size must be between 1 and {MAX_BATCH_SIZE}")
+        self.workspace = workspace
+        self.size = size
+        self.keep_results = keep_results
+        self.results = []
+        self._queue = []
+        self._skipped = []
+        # called with the BatchResults of every flush
+        self.on_flush = None
+
+    def __enter__(self):
+        self.workspace._batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.flush()
+        finally:
+            self.workspace._batch = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def errors(self):
+        return [result for result in self.results if not result.ok]
+
+    def add(self, operation, request, user, on_success=None, on_error=None):
+        if len(self._queue) >= self.size:
+            self.flush()
+        self._queue.append((operation, request, user, on_success, on_error))
+
+    def skip(self, operation, user):
+        """
+        records an operation that needed no request, e.g. an update without
+        changes. it is reported with the next flush.
+        """
+        self._skipped.append(BatchResult(operation, user, user))
+
+    def flush(self):
+        """send all queued requests, returns the BatchResults of this flush"""
+        skipped, self._skipped = self._skipped, []
+        queue, self._queue = self._queue, []
+        flushed = skipped + self._send(queue) if queue else skipped
+        if not flushed:
+            return []
+        if self.keep_results:
+            self.results += flushed
+        if self.on_flush is not None:
+            self.on_flush(flushed)
+        return flushed
+
+    def _send(self, queue):
+        """
+        sends queue as one batch request. parts failing with 429, 403
+        rateLimitExceeded or 5xx are sent again in a new batch after
+        backoff_delay, up to workspace.retries times.
+        """
+        metrics = self.workspace.metrics
+        flushed = [None] * len(queue)
+        todo = list(range(len(queue)))
+        attempt = 0
+        while todo:
+            responses = self._execute([queue[i] for i in todo])
+            retry = []
+            for i, (response, exception) in zip(todo, responses):
+                operation, request, user, on_success, on_error = queue[i]
+                if metrics is not None:
+                    metrics.record(operation_name(request), error=exception)
+                if (
+                    exception is not None
+                    and attempt < self.workspace.retries
+                    and is_retryable(exception)
+                ):
+                    if metrics is not None:
+                        metrics.retry(operation_name(request))
+                    retry.append(i)
+                    continue
+                if exception is None and on_success:
+                    response = on_success(response)
+                elif exception is not None and on_error:
+                    on_error(exception)
+                flushed[i] = BatchResult(operation, user, response, exception)
+            if retry:
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+            todo = retry
+        return flushed
+
+    def _execute(self, queue):
+        """one batch request, returns a (response, exception) tuple per part"""
+        responses = {}
+
+        def _callback(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        metrics = self.workspace.metrics
+        # every part of a batch counts against the quota of the api
+        rate_limiter = self.workspace.rate_limiter
+        batch_request = self.workspace._new_batch_request(_callback)
+        for i, (_, request, _, _, _) in enumerate(queue):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            if metrics is not None:
+                metrics.track_bytes(request)
+            batch_request.add(request, request_id=str(i))
+        start = time.perf_counter()
+        try:
+            batch_request.execute()
+        except Exception as e:
+            if metrics is not None:
+                metrics.record("batch", time.perf_counter() - start, e)
+            # nothing of this batch arrived, e.g. pending inserts are rolled back
+            for _, _, _, _, on_error in queue:
+                if on_error:
+                    on_error(e)
+            raise
+        if metrics is not None:
+            metrics.record("batch", time.perf_counter() - start)
+        return [responses.get(str(i), (None, None)) for i in range(len(queue))]
+
+
+def new_batch_request(service, callback, api_endpoint=None):
+    """
+    the batch uri of a service built from the discovery document always
+    points to googleapis.com, an alternative api_endpoint has to be passed
+    explicitly.
+    """
+    if api_endpoint:
+        batch_uri = api_endpoint.rstrip("/") + "/batch"
+        return BatchHttpRequest(callback=callback, batch_uri=batch_uri)
+    return service.new_batch_http_request(callback=callback)
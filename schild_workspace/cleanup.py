@@ -0,0 +1,227 @@
+"""
+suspends or deletes inactive accounts, without loading the whole domain.
+
+    workspace = WorkspaceUsers("example.org", lazy=True)
+    policies = [
+        CleanupPolicy(DELETE, org_unit="/Schüler/Ehemalige"),
+        CleanupPolicy(DELETE, inactive_days=360, suspended=True),
+        CleanupPolicy(SUSPEND, inactive_days=360, org_unit="/Schüler"),
+    ]
+    report = Cleanup(workspace, policies).run()  # dry run
+    print(report)
+
+the userlist is read page by page with only the fields needed to decide
+(CLEANUP_FIELDS), every page is classified and dropped before the next one
+is requested. with apply set, the suspensions and deletions are sent in
+batches through the rate limiter of the workspace, DEFAULT_QUERIES_PER_SECOND
+if it has none (deletions only after the listing, deleting would shift the
+following pages).
+"""
+import datetime
+import sys
+from collections import Counter
+from contextlib import nullcontext
+
+from .batch import DEFAULT_BATCH_SIZE, DirectoryBatch
+from .progress import Progress
+
+SUSPEND = "suspend"
+DELETE = "delete"
+CLEANUP_FIELDS = (
+    "nextPageToken,"
+    "users(primaryEmail,orgUnitPath,suspended,lastLoginTime,creationTime,isAdmin)"
+)
+# lastLoginTime of accounts that never logged in
+NEVER = "1970-01-01T00:00:00.000Z"
+
+
+def parse_time(value):
+    """"2024-05-01T10:00:00.000Z" -> aware datetime, None for missing values"""
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def last_activity(user):
+    """the last login, or the creation time for accounts that never logged in"""
+    login = user.get("lastLoginTime")
+    if login and login != NEVER:
+        return parse_time(login)
+    return parse_time(user.get("creationTime"))
+
+
+def in_org_unit(user, org_unit):
+    """True for users in org_unit or one of its sub org units"""
+    path = user.get("orgUnitPath", "/")
+    return org_unit == "/" or path == org_unit or path.startswith(org_unit + "/")
+
+
+class CleanupPolicy(object):
+    """
+    matches accounts in org_unit (default: all) whose last activity is more
+    than inactive_days ago (default: any). suspended=True only matches
+    suspended accounts, False only active ones. SUSPEND never matches
+    accounts that are suspended already.
+    """
+
+    def __init__(self, action, org_unit=None, inactive_days=None, suspended=None):
+        if action not in (SUSPEND, DELETE):
+            raise ValueError(f"action must be {SUSPEND} or {DELETE}")
+        if org_unit is None and inactive_days is None and suspended is None:
+            raise ValueError("a policy needs an org_unit, inactive_days or suspended")
+        self.action = action
+        self.org_unit = (org_unit.rstrip("/") or "/") if org_unit else None
+        self.inactive_days = inactive_days
+        self.suspended = suspended
+
+    def __repr__(self):
+        conditions = []
+        if self.org_unit:
+            conditions.append(f"in {self.org_unit}")
+        if self.inactive_days is not None:
+            conditions.append(f"inactive for {self.inactive_days} days")
+        if self.suspended is not None:
+            conditions.append("suspended" if self.suspended else "active")
+        return f"{self.action} {', '.join(conditions)}"
+
+    def matches(self, user, now):
+        suspended = bool(user.get("suspended"))
+        if self.action == SUSPEND and suspended:
+            return False
+        if self.suspended is not None and suspended != self.suspended:
+            return False
+        if self.org_unit and not in_org_unit(user, self.org_unit):
+            return False
+        if self.inactive_days is not None:
+            activity = last_activity(user)
+            if activity is None:
+                return False
+            if now - activity <= datetime.timedelta(days=self.inactive_days):
+                return False
+        return True
+
+
+class CleanupReport(object):
+    """
+    counts of a cleanup run. only the failures are kept, the candidates
+    are printed to `out` while the listing is read.
+    """
+
+    def __init__(self, applied=False):
+        self.applied = applied
+        self.scanned = 0
+        self.protected = 0
+        self.actions = Counter()
+        self.failed = []
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def summary(self):
+        summary = {"scanned": self.scanned, "protected": self.protected}
+        summary.update(self.actions)
+        summary["failed"] = len(self.failed)
+        return summary
+
+    def __str__(self):
+        mode = "applied" if self.applied else "dry run"
+        counts = ", ".join(f"{key}: {value}" for key, value in self.summary().items())
+        return f"{mode} - {counts}"
+
+
+class Cleanup(object):
+    """
+    applies CleanupPolicies to all users of workspace, the first matching
+    policy decides. admins are never touched. the local userlist of
+    workspace is not updated, use a lazy WorkspaceUsers.
+    """
+
+    def __init__(self, workspace, policies, now=None):
+        self.workspace = workspace
+        self.policies = list(policies)
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+
+    def classify(self, user):
+        """the action for user, or None"""
+        for policy in self.policies:
+            if policy.matches(user, self.now):
+                return policy.action
+        return None
+
+    def candidates(self, query=None, report=None):
+        """
+        yields (action, user) for every matching user, one listing page at
+        a time. users matching no policy are only counted in report.
+        """
+        for page in self.workspace.iter_pages(query, fields=CLEANUP_FIELDS):
+            for user in page:
+                if report is not None:
+                    report.scanned += 1
+                action = self.classify(user)
+                if action is None:
+                    continue
+                if user.get("isAdmin"):
+                    if report is not None:
+                        report.protected += 1
+                    continue
+                yield action, user
+
+    def run(self, apply=False, batch_size=DEFAULT_BATCH_SIZE, query=None, out=None):
+        """
+        lists the domain (or the users matching a directory query) and
+        prints one line per candidate to out. with apply set, the
+        candidates are suspended or deleted in batches of batch_size.
+        returns a CleanupReport.
+        """
+        out = out if out is not None else sys.stdout
+        report = CleanupReport(applied=apply)
+        workspace = self.workspace
+        progress = Progress("cleanup", quiet=workspace.quiet or not apply)
+        batch = None
+        if apply:
+            batch = DirectoryBatch(workspace, size=batch_size, keep_results=False)
+
+            def _flushed(results):
+                for result in results:
+                    if result.ok:
+                        progress.update(result.user["primaryEmail"])
+                    else:
+                        progress.fail(result.user["primaryEmail"])
+                        report.failed.append(result)
+
+            batch.on_flush = _flushed
+        # deleting while listing would shift the following pages, so only
+        # the addresses are kept and deleted after the listing
+        deletes = []
+        limited = workspace._rate_limited() if apply else nullcontext()
+        with progress, limited:
+            for action, user in self.candidates(query, report):
+                report.actions[action] += 1
+                print(
+                    action,
+                    user["primaryEmail"],
+                    user.get("orgUnitPath", "/"),
+                    user.get("lastLoginTime", ""),
+                    file=out,
+                )
+                if batch is None:
+                    continue
+                if action == DELETE:
+                    deletes.append(user["primaryEmail"])
+                else:
+                    batch.add(action, self._request(action, user), user)
+            if batch is not None:
+                for mail in deletes:
+                    user = {"primaryEmail": mail}
+                    batch.add(DELETE, self._request(DELETE, user), user)
+                batch.flush()
+                if workspace.snapshot is not None:
+                    workspace.snapshot.clear()
+        return report
+
+    def _request(self, action, user):
+        users = self.workspace.service.users()
+        if action == DELETE:
+            return users.delete(userKey=user["primaryEmail"])
+        return users.patch(userKey=user["primaryEmail"], body={"suspended": True})
@@ -0,0 +1,281 @@
+"""
+python -m schild_workspace <command> ...
+
+    sync SCHILD_FILE --domain example.org [--apply]
+    rollover --domain example.org --i-really-know-what-i-am-doing
+    find NAME (--schild SCHILD_FILE | --domain example.org)
+    export --domain example.org [--org-unit /Schüler/05] [--output users.csv]
+    cleanup SCHILD_FILE --domain example.org [--former delete] [--apply]
+    inactive --domain example.org --days 360 [--org-unit /Schüler] [--apply]
+    tenants SCHOOLS_JSON [--job rollover] [--apply] [--processes 4]
+
+only commands that talk to the directory api import the google client
+libraries, `find --schild` just reads the SCHILD export.
+"""
+import argparse
+import csv
+import sys
+
+from .schild_users import SchildUsers
+
+
+def _workspace(args, lazy=False):
+    from .credentials import get_credentials
+    from .workspace_users import WorkspaceUsers
+
+    if not args.domain:
+        raise SystemExit("--domain is needed for this command")
+    creds = get_credentials(args.service_account, args.subject, args.secret_dir)
+    workspace = WorkspaceUsers(
+        args.domain, creds=creds, api_endpoint=args.api_endpoint, lazy=lazy
+    )
+    workspace.quiet = args.quiet
+    return workspace
+
+
+def _report(workspace, args):
+    if not args.quiet:
+        print(workspace.metrics, file=sys.stderr)
+
+
+def _schild_users(path):
+    schild = SchildUsers(path)
+    if schild.users is None:
+        raise SystemExit(f"could not read {path}")
+    return schild
+
+
+def _former(value):
+    from .reconcile import DELETE, SUSPEND
+
+    return {"suspend": SUSPEND, "delete": DELETE, "keep": None}[value]
+
+
+def sync(args):
+    from .passwords import PasswordExport
+    from .reconcile import plan_sync
+
+    schild = _schild_users(args.schild_file)
+    workspace = _workspace(args)
+    plan = plan_sync(schild, workspace, args.onboarding, _former(args.former))
+    print(plan)
+    failed = []
+    if args.apply:
+        export = PasswordExport(args.passwords_dir, sheets=args.sheets)
+        failed = plan.apply(args.batch_size, export) or []
+        for error in failed:
+            print("failed:", error)
+    _report(workspace, args)
+    return 1 if failed else 0
+
+
+def rollover(args):
+    from .journal import Journal
+
+    if not args.i_really_know_what_i_am_doing:
+        print("think again! (--i-really-know-what-i-am-doing)")
+        return 2
+    journal = Journal(args.journal) if args.journal else None
+    # a resume only needs the users of the remaining steps
+    resume = journal is not None and bool(journal.planned)
+    workspace = _workspace(args, lazy=resume)
+    try:
+        failed = workspace.move_to_next_year(True, args.batch_size, journal) or []
+    finally:
+        if journal is not None:
+            journal.close()
+    _report(workspace, args)
+    return 1 if failed else 0
+
+
+def find(args):
+    if args.schild:
+        schild = _schild_users(args.schild)
+        matches = schild.find_users(
+            args.name.casefold(), args.fuzzy, args.school_class, args.limit
+        )
+        for match in matches:
+            print(match["user"])
+        return 0
+    workspace = _workspace(args, lazy=not args.fuzzy)
+    if args.fuzzy:
+        users = workspace.search(args.name, args.school_class or "", args.limit)
+    else:
+        users = workspace.query(args.name, args.school_class or "")[: args.limit]
+    for user in users:
+        print(user["primaryEmail"], user["name"]["fullName"], user["orgUnitPath"])
+    return 0
+
+
+EXPORT_COLUMNS = [
+    "primaryEmail",
+    "givenName",
+    "familyName",
+    "orgUnitPath",
+    "schildId",
+    "suspended",
+    "lastLoginTime",
+]
+
+
+def export(args):
+    workspace = _workspace(args, lazy=bool(args.org_unit))
+    users = workspace.fetch(org_unit=args.org_unit)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(out, delimiter=";", lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+        for user in users:
+            name = user.get("name", {})
+            writer.writerow(
+                [
+                    user["primaryEmail"],
+                    name.get("givenName", ""),
+                    name.get("familyName", ""),
+                    user["orgUnitPath"],
+                    user.schildId or "",
+                    user.get("suspended", False),
+                    user.get("lastLoginTime", ""),
+                ]
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    _report(workspace, args)
+    return 0
+
+
+def cleanup(args):
+    from .reconcile import DELETE, SUSPEND, SyncPlan, plan_sync
+
+    schild = _schild_users(args.schild_file)
+    workspace = _workspace(args)
+    plan = plan_sync(schild, workspace, former=_former(args.former))
+    plan = SyncPlan(
+        workspace, [change for change in plan if change.action in (SUSPEND, DELETE)]
+    )
+    print(plan)
+    failed = []
+    if args.apply:
+        failed = plan.apply(args.batch_size) or []
+        for error in failed:
+            print("failed:", error)
+    _report(workspace, args)
+    return 1 if failed else 0
+
+
+def inactive(args):
+    from .cleanup import Cleanup, CleanupPolicy
+    from .provisioning import TokenBucket
+
+    if args.days is None and not args.org_unit and not args.suspended:
+        raise SystemExit("--days, --org-unit or --suspended is needed")
+    policies = [
+        CleanupPolicy(args.action, org_unit, args.days, args.suspended or None)
+        for org_unit in args.org_unit or [None]
+    ]
+    workspace = _workspace(args, lazy=True)
+    if args.queries_per_second:
+        workspace.rate_limiter = TokenBucket(args.queries_per_second)
+    report = Cleanup(workspace, policies).run(args.apply, args.batch_size)
+    print(report)
+    for result in report.failed:
+        print("failed:", result)
+    _report(workspace, args)
+    return 0 if report.ok else 1
+
+
+def tenants(args):
+    from .tenants import ROLLOVER, load_tenants, run_tenants
+
+    if args.job == ROLLOVER and args.apply and not args.i_really_know_what_i_am_doing:
+        print("think again! (--i-really-know-what-i-am-doing)")
+        return 2
+    report = run_tenants(
+        load_tenants(args.config), args.job, args.apply, args.processes, args.batch_size
+    )
+    print(report)
+    if args.report:
+        report.write_json(args.report)
+    return 0 if report.ok else 1
+
+
+def parser():
+    api = argparse.ArgumentParser(add_help=False)
+    api.add_argument("--domain")
+    api.add_argument("--service-account", help="key file of a service account")
+    api.add_argument("--subject", help="admin the service account acts as")
+    api.add_argument("--secret-dir", default="secret", help="token and client secrets")
+    api.add_argument("--api-endpoint", help=argparse.SUPPRESS)
+    api.add_argument("--quiet", action="store_true", help="no progress and summary")
+
+    root = argparse.ArgumentParser(prog="python -m schild_workspace")
+    commands = root.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("sync", parents=[api], help="SCHILD -> workspace")
+    command.add_argument("schild_file")
+    command.add_argument("--onboarding", action="store_true")
+    command.add_argument(
+        "--former", choices=["suspend", "delete", "keep"], default="suspend"
+    )
+    command.add_argument("--apply", action="store_true", help="default: dry run")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.add_argument("--passwords-dir", default=".")
+    command.add_argument("--sheets", action="store_true", help="printable slips")
+    command.set_defaults(run=sync)
+
+    command = commands.add_parser("rollover", parents=[api], help="next school year")
+    command.add_argument("--i-really-know-what-i-am-doing", action="store_true")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.add_argument("--journal", help="resumable journal file")
+    command.set_defaults(run=rollover)
+
+    command = commands.add_parser("find", parents=[api], help="search users by name")
+    command.add_argument("name")
+    command.add_argument("--schild", help="search this SCHILD export instead")
+    command.add_argument("--class", dest="school_class")
+    command.add_argument("--fuzzy", action="store_true")
+    command.add_argument("--limit", type=int, default=10)
+    command.set_defaults(run=find)
+
+    command = commands.add_parser("export", parents=[api], help="users as csv")
+    command.add_argument("--org-unit")
+    command.add_argument("--output", "-o")
+    command.set_defaults(run=export)
+
+    command = commands.add_parser(
+        "cleanup", parents=[api], help="suspend or delete former students"
+    )
+    command.add_argument("schild_file")
+    command.add_argument("--former", choices=["suspend", "delete"], default="suspend")
+    command.add_argument("--apply", action="store_true", help="default: dry run")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.set_defaults(run=cleanup)
+
+    command = commands.add_parser(
+        "inactive", parents=[api], help="suspend or delete inactive accounts"
+    )
+    command.add_argument("--days", type=int, help="no login for this many days")
+    command.add_argument("--org-unit", action="append", help="can be repeated")
+    command.add_argument("--suspended", action="store_true", help="only suspended")
+    command.add_argument("--action", choices=["suspend", "delete"], default="suspend")
+    command.add_argument("--apply", action="store_true", help="default: dry run")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.add_argument("--queries-per-second", type=float)
+    command.set_defaults(run=inactive)
+
+    command = commands.add_parser("tenants", help="sync or rollover several schools")
+    command.add_argument("config", help="json file, see schild_workspace.tenants")
+    command.add_argument("--job", choices=["sync", "rollover"], default="sync")
+    command.add_argument("--apply", action="store_true", help="default: dry run")
+    command.add_argument("--i-really-know-what-i-am-doing", action="store_true")
+    command.add_argument("--processes", type=int, help="0: one school after another")
+    command.add_argument("--batch-size", type=int, default=50)
+    command.add_argument("--report", help="write the results as json")
+    command.set_defaults(run=tenants)
+    return root
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    return args.run(args)
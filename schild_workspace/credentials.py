@@ -0,0 +1,244 @@
+"""
+credentials for the directory api.
+
+    creds = get_credentials()  # secret/token.pickle, interactive login if needed
+    creds = get_credentials(service_account_file="secret/service_account.json",
+                            subject="admin@example.org")
+
+get_credentials returns one SharedCredentials object per process and
+source. it keeps the access token in memory and in a locked file shared by
+all processes (secret/access_token.json) and refreshes it in a background
+thread before it expires, so requests never wait for a refresh. another
+secret directory can be given as secret_dir, e.g. one per school.
+"""
+import datetime
+import json
+import os
+import os.path
+import pickle
+import threading
+from contextlib import contextmanager
+
+import google.auth.credentials
+from google.auth.transport.requests import Request
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+SCOPES = ["https://www.googleapis.com/auth/admin.directory.user"]
+SECRET_DIR = "secret"
+TOKEN_PATH = os.path.join(SECRET_DIR, "token.pickle")
+CLIENT_SECRETS_PATH = os.path.join(SECRET_DIR, "credentials.json")
+TOKEN_CACHE_PATH = os.path.join(SECRET_DIR, "access_token.json")
+# refresh this many seconds before the token expires (tokens live 3600 s)
+REFRESH_MARGIN = 600
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _utcnow():
+    # google-auth compares naive utc datetimes
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+@contextmanager
+def file_lock(path):
+    """exclusive lock on path (created if missing) across processes"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def installed_app_credentials(
+    token_path=TOKEN_PATH, client_secrets_path=CLIENT_SECRETS_PATH, scopes=SCOPES
+):
+    """
+    the user credentials from token_path, after an interactive login if
+    there are none yet. the pickle is only written under a file lock.
+    """
+    with file_lock(f"{token_path}.lock"):
+        creds = None
+        if os.path.exists(token_path):
+            with open(token_path, "rb") as token:
+                creds = pickle.load(token)
+        if creds and (creds.refresh_token or creds.valid):
+            return creds
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file(client_secrets_path, scopes)
+        creds = flow.run_local_server(port=0)
+        # Save the credentials for the next run
+        with open(token_path, "wb") as token:
+            pickle.dump(creds, token)
+        return creds
+
+
+def service_account_credentials(service_account_file, subject, scopes=SCOPES):
+    """
+    a service account with domain-wide delegation acting as `subject`,
+    an admin of the domain. no interactive login needed.
+    """
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_file(
+        service_account_file, scopes=scopes, subject=subject
+    )
+
+
+class SharedCredentials(google.auth.credentials.Credentials):
+    """
+    wraps credentials that can refresh themselves (`source`) and shares
+    their access token through cache_path with other processes: a process
+    that needs a new token takes the file lock, uses the token another
+    process stored in the meantime or refreshes and stores it.
+
+    start() runs a daemon thread that refreshes `margin` seconds before the
+    token expires.
+    """
+
+    def __init__(
+        self, source, cache_path=TOKEN_CACHE_PATH, margin=REFRESH_MARGIN, key=""
+    ):
+        super().__init__()
+        self.source = source
+        # identifies the account, tokens of other accounts in the cache are ignored
+        self.key = key
+        self.cache_path = cache_path
+        self.margin = margin
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if source.token and source.valid:
+            self.token = source.token
+            self.expiry = source.expiry
+        self._load_cache()
+
+    def _expires_soon(self):
+        if not self.token:
+            return True
+        if self.expiry is None:
+            return False
+        margin = datetime.timedelta(seconds=self.margin)
+        return not self.valid or _utcnow() >= self.expiry - margin
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            expiry = datetime.datetime.fromisoformat(cached["expiry"])
+        except (ValueError, KeyError, TypeError):
+            return False
+        if cached.get("key") != self.key or expiry <= _utcnow():
+            return False
+        if self.expiry is None or expiry > self.expiry:
+            self.token = cached["token"]
+            self.expiry = expiry
+        return True
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        content = json.dumps(
+            {"key": self.key, "token": self.token, "expiry": self.expiry.isoformat()}
+        )
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self, request):
+        with self._lock:
+            if not self._expires_soon():
+                return
+            if not self.cache_path:
+                return self._refresh_source(request)
+            with file_lock(f"{self.cache_path}.lock"):
+                self._load_cache()
+                if self._expires_soon():
+                    self._refresh_source(request)
+                    self._save_cache()
+
+    def _refresh_source(self, request):
+        self.source.refresh(request)
+        self.token = self.source.token
+        self.expiry = self.source.expiry
+        self.refreshes += 1
+
+    def start(self):
+        """starts the background refresh, returns self"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        wait = 0
+        while not self._stop.wait(wait):
+            try:
+                self.refresh(Request())
+            except Exception as e:
+                # requests still refresh on demand, try again soon
+                print("token refresh failed:", e)
+                wait = 30
+                continue
+            if self.expiry is None:
+                return
+            left = (self.expiry - _utcnow()).total_seconds() - self.margin
+            wait = max(left, 1)
+
+
+def get_credentials(
+    service_account_file=None,
+    subject=None,
+    secret_dir=SECRET_DIR,
+    background=True,
+):
+    """
+    the SharedCredentials of this process for a service account (with
+    service_account_file and subject) or the installed app login
+    (token.pickle and credentials.json in secret_dir). the access token
+    is shared through secret_dir/access_token.json.
+    """
+    key = (service_account_file, subject, secret_dir)
+    with _shared_lock:
+        creds = _shared.get(key)
+        if creds is None:
+            if service_account_file:
+                source = service_account_credentials(service_account_file, subject)
+                account = f"{source.service_account_email}:{subject}"
+            else:
+                source = installed_app_credentials(
+                    os.path.join(secret_dir, "token.pickle"),
+                    os.path.join(secret_dir, "credentials.json"),
+                )
+                account = f"{source.client_id}:"
+            cache_path = os.path.join(secret_dir, "access_token.json")
+            creds = _shared[key] = SharedCredentials(source, cache_path, key=account)
+            if background:
+                creds.start()
+    return creds
@@ -0,0 +1,117 @@
+import json
+import os
+import os.path
+import threading
+import time
+
+PLANNED = "planned"
+DONE = "done"
+FAILED = "failed"
+
+
+class Journal(object):
+    """
+    append-only operation log (one json object per line) for bulk jobs.
+
+    every operation is recorded as planned before its request is sent and as
+    done afterwards. opening an existing journal restores this state, so an
+    interrupted job can skip everything that is already done:
+
+        with Journal("rollover_2026.jsonl") as journal:
+            workspace.move_to_next_year(True, journal=journal)
+
+    the file stays open for appending until close() or the end of the
+    with-block, every entry is flushed right away.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.planned = {}
+        self.done = set()
+        self.failed = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if os.path.exists(path):
+            self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _load(self):
+        with open(self.path) as f:
+            content = f.read()
+        if content and not content.endswith("\n"):
+            # terminate a line cut off by a crash before appending
+            with open(self.path, "a") as f:
+                f.write("\n")
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # empty or cut off by a crash
+                continue
+            self._apply(entry)
+
+    def _apply(self, entry):
+        op = entry["op"]
+        if entry["state"] == PLANNED:
+            self.planned[op] = entry.get("payload", {})
+        elif entry["state"] == DONE:
+            self.done.add(op)
+            self.failed.pop(op, None)
+        elif entry["state"] == FAILED:
+            self.failed[op] = entry.get("error")
+
+    def _write(self, entry):
+        entry["time"] = time.time()
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._apply(entry)
+            self._append([line])
+
+    def _append(self, lines):
+        # called with self._lock held
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.writelines(lines)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def plan(self, op, **payload):
+        self._write({"op": op, "state": PLANNED, "payload": payload})
+
+    def plan_all(self, operations):
+        """records many (op, payload) tuples with a single write"""
+        lines = []
+        with self._lock:
+            for op, payload in operations:
+                entry = {"op": op, "state": PLANNED, "payload": payload, "time": time.time()}
+                self._apply(entry)
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._append(lines)
+
+    def complete(self, op):
+        self._write({"op": op, "state": DONE})
+
+    def fail(self, op, error):
+        self._write({"op": op, "state": FAILED, "error": str(error)})
+
+    def is_done(self, op):
+        return op in self.done
+
+    def pending(self):
+        """(op, payload) of all planned operations that are not done yet"""
+        return [
+            (op, payload) for op, payload in self.planned.items() if op not in self.done
+        ]
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from .provisioning import is_quota_error
+
+# upper bounds of the latency histogram in seconds, like prometheus' defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "schild_workspace"
+COUNTED = (
+    "requests",
+    "errors",
+    "quota_errors",
+    "retries",
+    "bytes_sent",
+    "bytes_received",
+    "seconds",
+)
+
+
+def operation_name(request):
+    """"directory.users.patch" -> "patch" """
+    method_id = getattr(request, "methodId", None) or ""
+    return method_id.rpartition(".")[2] or "request"
+
+
+class Metrics(object):
+    """
+    counts the directory api requests of a WorkspaceUsers object per
+    operation (list, get, insert, patch, delete, batch): requests, errors,
+    quota errors, retries, bytes sent and received and a latency histogram.
+
+        print(workspace.metrics)
+        workspace.metrics.write_prometheus("metrics/schild_workspace.prom")
+
+    with log_path set, every request is appended to this file as a json line.
+    requests inside a batch are counted with their operation, their latency
+    is the one of the surrounding "batch" request.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.requests = Counter()
+        self.errors = Counter()
+        self.quota_errors = Counter()
+        self.retries = Counter()
+        self.bytes_sent = Counter()
+        self.bytes_received = Counter()
+        self.seconds = Counter()
+        self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds=None, error=None):
+        """one finished request, seconds is None for requests inside a batch"""
+        with self._lock:
+            self.requests[operation] += 1
+            if error is not None:
+                self.errors[operation] += 1
+                if is_quota_error(error):
+                    self.quota_errors[operation] += 1
+            if seconds is not None:
+                self.seconds[operation] += seconds
+                buckets = self.buckets[operation]
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+                        break
+                else:
+                    buckets[-1] += 1
+        if self.log_path:
+            self._log(
+                {
+                    "operation": operation,
+                    "seconds": seconds,
+                    "error": None if error is None else str(error),
+                }
+            )
+
+    def retry(self, operation):
+        with self._lock:
+            self.retries[operation] += 1
+
+    def add_bytes(self, operation, sent=0, received=0):
+        with self._lock:
+            self.bytes_sent[operation] += sent
+            self.bytes_received[operation] += received
+
+    def track_bytes(self, request, operation=None):
+        """
+        counts the body of request and the raw content of its response,
+        which googleapiclient passes to request.postproc, also inside a batch.
+        returns the operation name.
+        """
+        operation = operation or operation_name(request)
+        self.add_bytes(operation, sent=len(request.body or ""))
+        postproc = request.postproc
+
+        def _postproc(response, content):
+            self.add_bytes(operation, received=len(content or b""))
+            return postproc(response, content)
+
+        request.postproc = _postproc
+        return operation
+
+    def _log(self, entry):
+        entry["time"] = time.time()
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            with open(self.log_path, "a") as f:
+                f.write(line)
+
+    def summary(self):
+        """{operation: {requests, errors, ...}} and the totals under "total" """
+        with self._lock:
+            summary = {}
+            for operation in sorted(self.requests):
+                timed = sum(self.buckets[operation])
+                summary[operation] = {
+                    "requests": self.requests[operation],
+                    "errors": self.errors[operation],
+                    "quota_errors": self.quota_errors[operation],
+                    "retries": self.retries[operation],
+                    "bytes_sent": self.bytes_sent[operation],
+                    "bytes_received": self.bytes_received[operation],
+                    "seconds": round(self.seconds[operation], 6),
+                    "mean_seconds": round(self.seconds[operation] / timed, 6)
+                    if timed
+                    else None,
+                }
+        total = Counter(dict.fromkeys(COUNTED, 0))
+        for values in summary.values():
+            for key, value in values.items():
+                if key != "mean_seconds":
+                    total[key] += value
+        summary["total"] = dict(total)
+        summary["total"]["wall_seconds"] = round(time.time() - self.started, 6)
+        return summary
+
+    def __str__(self):
+        lines = [
+            f"{'operation':>10} {'requests':>9} {'errors':>7} {'quota':>6} "
+            f"{'retries':>8} {'sent':>10} {'received':>10} {'seconds':>9}"
+        ]
+        for operation, values in self.summary().items():
+            lines.append(
+                f"{operation:>10} {values['requests']:9} {values['errors']:7} "
+                f"{values['quota_errors']:6} {values['retries']:8} "
+                f"{values['bytes_sent']:10} {values['bytes_received']:10} "
+                f"{values['seconds']:9.3f}"
+            )
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def prometheus(self):
+        """the metrics in the prometheus text format"""
+        lines = []
+        counters = [
+            ("requests_total", "directory api requests", self.requests),
+            ("errors_total", "failed directory api requests", self.errors),
+            ("quota_errors_total", "requests rejected by the quota", self.quota_errors),
+            ("retries_total", "retried directory api requests", self.retries),
+            ("sent_bytes_total", "request body bytes", self.bytes_sent),
+            ("received_bytes_total", "response body bytes", self.bytes_received),
+        ]
+        with self._lock:
+            for name, help_text, counter in counters:
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+                for operation in sorted(counter):
+                    lines.append(
+                        f'{PREFIX}_{name}{{operation="{operation}"}} {counter[operation]}'
+                    )
+            name = f"{PREFIX}_request_duration_seconds"
+            lines.append(f"# HELP {name} latency of directory api requests")
+            lines.append(f"# TYPE {name} histogram")
+            for operation in sorted(self.buckets):
+                cumulative = 0
+                bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+                for bound, count in zip(bounds, self.buckets[operation]):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{operation="{operation}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{name}_sum{{operation="{operation}"}} {self.seconds[operation]}'
+                )
+                lines.append(f'{name}_count{{operation="{operation}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """for the textfile collector of the node exporter"""
+        _write_atomic(path, self.prometheus())
+
+
+def _write_atomic(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
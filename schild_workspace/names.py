@@ -0,0 +1,74 @@
+import unicodedata
+
+REPLACE_MAP = {" ": "-", "ß": "ss", "ä": "ae", "ö": "oe", "ü": "ue", "æ": ""}
+# letters without a unicode decomposition
+EXTRA_MAP = {
+    "ł": "l",
+    "ø": "o",
+    "đ": "d",
+    "ð": "d",
+    "ħ": "h",
+    "ı": "i",
+    "ŀ": "l",
+    "ŋ": "n",
+    "œ": "oe",
+    "ŧ": "t",
+    "þ": "th",
+    "ſ": "s",
+    "ĸ": "k",
+}
+TARGET_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789._-"
+
+
+def _translate_char(c):
+    if c in TARGET_CHARS:
+        return c
+    if c in REPLACE_MAP:
+        return REPLACE_MAP[c]
+    if c in EXTRA_MAP:
+        return EXTRA_MAP[c]
+    # use the base character, e.g. "é" -> "e" or "ǘ" -> "ü" -> "ue"
+    codes = [
+        code for code in unicodedata.decomposition(c).split(" ") if code and code[0] != "<"
+    ]
+    if codes:
+        base = chr(int(codes[0], 16))
+        if base != c:
+            return _translate_char(base.lower())
+    return ""
+
+
+class _TranslationTable(dict):
+    """str.translate table, characters missing in the table are added on first use"""
+
+    def __missing__(self, codepoint):
+        value = self[codepoint] = _translate_char(chr(codepoint))
+        return value
+
+
+# prebuilt for ascii, latin-1 and latin extended-a/b, which covers SCHILD names
+TRANSLATION_TABLE = _TranslationTable()
+for _codepoint in list(range(0x80)) + list(range(0xC0, 0x250)):
+    TRANSLATION_TABLE[_codepoint]
+del _codepoint
+
+
+def sanitize_username(name):
+    return name.lower().translate(TRANSLATION_TABLE)
+
+
+def sanitize_usernames(names):
+    """sanitize_username for a whole column of names, returns a list"""
+    table = TRANSLATION_TABLE
+    return [name.lower().translate(table) for name in names]
+
+
+def normalize_name(name):
+    """
+    casefolded name for searching, umlauts and diacritics are replaced
+    like in sanitize_username ("Müller" -> "mueller"), spaces are kept
+    and characters without a replacement are dropped.
+    """
+    return " ".join(
+        word.translate(TRANSLATION_TABLE) for word in name.casefold().split()
+    )
@@ -0,0 +1,89 @@
+import csv
+import io
+import os
+import os.path
+from collections import defaultdict
+
+# pending rows after which long runs without batches write a checkpoint
+CHECKPOINT_EVERY = 50
+
+
+class PasswordExport(object):
+    """
+    collects the passwords of new accounts per class and writes them to
+    {prefix}_{Klasse}.csv (given name;family name;mail;password), by
+    default passwords_{Klasse}.csv.
+
+        with PasswordExport() as export:
+            export.add("05a", user, password)
+
+    nothing is written before checkpoint() or the end of the with-block,
+    which also runs on errors. every file is replaced atomically, existing
+    lines are kept. with sheets set, a printable {prefix}_{Klasse}.txt with
+    one slip per student of this run is written as well.
+    """
+
+    def __init__(self, directory=".", sheets=False, prefix="passwords"):
+        self.directory = directory
+        self.prefix = prefix
+        self.sheets = sheets
+        self._pending = defaultdict(list)
+        # the rows of this run, only kept for the sheets
+        self._written = defaultdict(list)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.checkpoint()
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def path(self, klasse, extension="csv"):
+        return os.path.join(self.directory, f"{self.prefix}_{klasse}.{extension}")
+
+    def add(self, klasse, workspace_user, password):
+        self._pending[klasse].append(
+            (
+                workspace_user["name"]["givenName"],
+                workspace_user["name"]["familyName"],
+                workspace_user["primaryEmail"],
+                password,
+            )
+        )
+
+    def checkpoint(self):
+        """writes all pending passwords, one atomic replace per class"""
+        for klasse, rows in self._pending.items():
+            if not rows:
+                continue
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+            writer.writerows(rows)
+            self._replace(klasse, "csv", buffer.getvalue(), append=True)
+            if self.sheets:
+                self._written[klasse] += rows
+                self._replace(klasse, "txt", self._sheet(klasse), append=False)
+        self._pending.clear()
+
+    def _replace(self, klasse, extension, content, append):
+        path = self.path(klasse, extension)
+        if append and os.path.exists(path):
+            with open(path) as f:
+                content = f.read() + content
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _sheet(self, klasse):
+        slips = []
+        for given_name, family_name, mail, password in self._written[klasse]:
+            slips.append(
+                f"Klasse {klasse}\n"
+                f"Name:     {given_name} {family_name}\n"
+                f"Login:    {mail}\n"
+                f"Passwort: {password}\n"
+            )
+        return ("-" * 40 + "\n").join(slips)
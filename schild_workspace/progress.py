@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+
+
+class Progress(object):
+    """
+    reports the progress of a bulk job on one line, at most every `interval`
+    seconds:
+
+        add_schild_students: 120 / 1000 (12%), 40.1/s, 22s left - max.muster@...
+
+    total may be None for iterators of unknown length. with quiet set,
+    nothing is printed but the counters are kept.
+    """
+
+    def __init__(self, label, total=None, out=None, interval=1.0, quiet=False):
+        self.label = label
+        self.total = total
+        self.out = out if out is not None else sys.stderr
+        self.interval = interval
+        self.quiet = quiet
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._reported = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, detail="", skipped=False, failed=False):
+        with self._lock:
+            self.done += 1
+            self.skipped += skipped
+            self.failed += failed
+            now = time.monotonic()
+            if now - self._reported < self.interval:
+                return
+            self._reported = now
+            self._write(self._line(now, detail), end="\r")
+
+    def fail(self, detail=""):
+        self.update(detail, failed=True)
+
+    def skip(self, detail=""):
+        self.update(detail, skipped=True)
+
+    def _line(self, now, detail="", final=False):
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.done / elapsed
+        line = f"{self.label}: {self.done}"
+        if self.total:
+            line += f" / {self.total} ({self.done * 100 // self.total}%)"
+        line += f", {rate:.1f}/s"
+        if self.total and rate and not final:
+            line += f", {(self.total - self.done) / rate:.0f}s left"
+        if detail:
+            line += f" - {detail}"
+        return line
+
+    def _write(self, line, end="\n"):
+        if self.quiet:
+            return
+        # pad to overwrite a longer previous line
+        self.out.write(f"{line:<79}{end}")
+        self.out.flush()
+
+    def close(self):
+        with self._lock:
+            line = self._line(time.monotonic(), final=True)
+            line += f", {self.skipped} skipped, {self.failed} failed"
+            self._write(line)
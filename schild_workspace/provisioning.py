@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+# the directory api allows 2400 queries per minute and user
+DEFAULT_QUERIES_PER_SECOND = 40
+RETRY_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class TokenBucket(object):
+    """allows `rate` acquisitions per second with bursts up to `capacity`"""
+
+    def __init__(self, rate=DEFAULT_QUERIES_PER_SECOND, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def reserve(self):
+        """
+        takes a token right away and returns the seconds to wait before
+        using it, for callers that cannot block like asyncio tasks.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+def is_quota_error(error):
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429:
+        return True
+    if status == 403:
+        content = error.content.decode("utf-8", errors="replace")
+        return any(reason in content for reason in RETRY_REASONS)
+    return False
+
+
+def is_retryable(error):
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status >= 500 or is_quota_error(error)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=32.0):
+    """the seconds to wait before retry number attempt (from 0), with jitter"""
+    delay = min(max_delay, base_delay * 2**attempt)
+    return delay + random.uniform(0, delay / 2)
+
+
+def execute_with_backoff(
+    request, rate_limiter=None, retries=5, base_delay=1.0, max_delay=32.0, metrics=None
+):
+    """
+    executes a request, on 403 rateLimitExceeded, 429 and 5xx it waits
+    base_delay * 2^n seconds (plus jitter) and tries again.
+    every attempt is recorded in metrics (a Metrics object), if given.
+    """
+    operation = None
+    if metrics is not None:
+        operation = metrics.track_bytes(request)
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            result = request.execute()
+        except HttpError as e:
+            if metrics is not None:
+                metrics.record(operation, time.perf_counter() - start, e)
+            if attempt >= retries or not is_retryable(e):
+                raise
+            if metrics is not None:
+                metrics.retry(operation)
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
+            continue
+        if metrics is not None:
+            metrics.record(operation, time.perf_counter() - start)
+        return result
+
+
+def run_concurrently(tasks, workers=4):
+    """
+    runs `tasks` (callables without arguments) on a pool of `workers` threads.
+    returns a list of (result, error) tuples in the order of `tasks`.
+    """
+
+    def _run(task):
+        try:
+            return task(), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run, tasks))
@@ -0,0 +1,176 @@
+from collections import Counter
+
+from .passwords import CHECKPOINT_EVERY, PasswordExport
+from .workspace_users import org_unit_for_class
+
+CREATE = "create"
+MOVE = "move"
+RENAME = "rename"
+SUSPEND = "suspend"
+REACTIVATE = "reactivate"
+DELETE = "delete"
+NOOP = "noop"
+ACTIONS = (CREATE, MOVE, RENAME, REACTIVATE, SUSPEND, DELETE, NOOP)
+
+
+class Change(object):
+    """
+    one step of a SyncPlan. `changes` holds the new field values,
+    `user` is the workspace User (None for CREATE),
+    `schild_user` is the SchildUser (None for SUSPEND and DELETE).
+    """
+
+    def __init__(self, action, schild_user=None, user=None, changes=None):
+        self.action = action
+        self.schild_user = schild_user
+        self.user = user
+        self.changes = changes or {}
+
+    def __repr__(self):
+        target = self.user if self.user is not None else self.schild_user
+        if self.changes:
+            return f"{self.action}: {target} -> {self.changes}"
+        return f"{self.action}: {target}"
+
+
+class SyncPlan(object):
+    """
+    the changes needed to bring the workspace in line with SCHILD.
+    print(plan) gives a dry run, plan.apply() executes it.
+    """
+
+    def __init__(self, workspace, changes, onboarding=False):
+        self.workspace = workspace
+        self.changes = changes
+        self.onboarding = onboarding
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __str__(self):
+        lines = [repr(change) for change in self.pending]
+        lines.append(
+            ", ".join(f"{action}: {count}" for action, count in self.summary().items())
+        )
+        return "\n".join(lines)
+
+    @property
+    def pending(self):
+        return [change for change in self.changes if change.action != NOOP]
+
+    def summary(self):
+        counts = Counter(change.action for change in self.changes)
+        return {action: counts[action] for action in ACTIONS if counts[action]}
+
+    def apply(self, batch_size=None, password_export=None):
+        """
+        executes all pending changes, one request per workspace user.
+        passwords of created accounts go to password_export, by default
+        passwords_{Klasse}.csv, as they are created (with batch_size: after
+        their batch) and are kept if a later request fails. returns the
+        failed BatchResults when batch_size is set.
+        """
+        workspace = self.workspace
+        if password_export is None:
+            password_export = PasswordExport()
+        updates = {}
+        # passwords of batched accounts wait for the result of their batch
+        pending_passwords = {}
+
+        def _export_flushed(results):
+            for result in results:
+                pending = pending_passwords.pop(id(result.user), None)
+                if pending and result.ok:
+                    password_export.add(*pending)
+            password_export.checkpoint()
+
+        with password_export, workspace._bulk_job(batch_size) as batch:
+            if batch is not None:
+                batch.on_flush = _export_flushed
+            for change in self.pending:
+                if change.action == CREATE:
+                    schild_user = change.schild_user
+                    workspace_user, pw = workspace.add_user(
+                        first_name=schild_user["Vorname"],
+                        last_name=schild_user["Nachname"],
+                        schild_id=schild_user["Interne ID-Nummer"],
+                        schoolclass=change.changes["orgUnitPath"],
+                    )
+                    created = (schild_user["Klasse"], workspace_user, pw)
+                    if batch is None:
+                        password_export.add(*created)
+                        if len(password_export) >= CHECKPOINT_EVERY:
+                            password_export.checkpoint()
+                    else:
+                        pending_passwords[id(workspace_user)] = created
+                elif change.action == DELETE:
+                    workspace.delete_user(change.user)
+                else:
+                    for field, value in change.changes.items():
+                        change.user[field] = value
+                    updates[id(change.user)] = change.user
+            for user in updates.values():
+                workspace.update_user(user)
+        if batch is not None:
+            return batch.errors
+
+
+def plan_sync(schild_object, workspace, onboarding=False, former=SUSPEND):
+    """
+    joins SCHILD and workspace on Interne ID-Nummer / externalId and returns
+    a SyncPlan. students missing in SCHILD are suspended, deleted or left
+    alone, depending on `former` (SUSPEND, DELETE or None). suspended
+    students that are in SCHILD are reactivated.
+    """
+    workspace.ensure_complete()
+    changes = []
+    seen = set()
+    for schild_user in schild_object.users:
+        schild_id = str(schild_user.schildID)
+        seen.add(schild_id)
+        target_org_unit = org_unit_for_class(schild_user["Klasse"], onboarding)
+        user = workspace.get_user_by_schild_id(schild_id)
+        if user is None:
+            changes.append(
+                Change(CREATE, schild_user, changes={"orgUnitPath": target_org_unit})
+            )
+            continue
+        planned = False
+        if user["orgUnitPath"] != target_org_unit:
+            changes.append(
+                Change(MOVE, schild_user, user, {"orgUnitPath": target_org_unit})
+            )
+            planned = True
+        name = user.get("name", {})
+        if (name.get("givenName"), name.get("familyName")) != (
+            schild_user["Vorname"],
+            schild_user["Nachname"],
+        ):
+            new_name = {
+                "givenName": schild_user["Vorname"],
+                "familyName": schild_user["Nachname"],
+                "fullName": f"{schild_user['Vorname']} {schild_user['Nachname']}",
+            }
+            changes.append(Change(RENAME, schild_user, user, {"name": new_name}))
+            planned = True
+        if user.get("suspended", False):
+            # back in SCHILD, e.g. after a truncated export
+            changes.append(
+                Change(REACTIVATE, schild_user, user, {"suspended": False})
+            )
+            planned = True
+        if not planned:
+            changes.append(Change(NOOP, schild_user, user))
+    for user in workspace.users:
+        if not user.is_student() or user.schildId is None or user.schildId in seen:
+            continue
+        if former == DELETE:
+            changes.append(Change(DELETE, user=user))
+        elif former == SUSPEND and not user.get("suspended", False):
+            changes.append(Change(SUSPEND, user=user, changes={"suspended": True}))
+        else:
+            changes.append(Change(NOOP, user=user))
+    return SyncPlan(workspace, changes, onboarding=onboarding)
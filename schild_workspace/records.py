@@ -0,0 +1,207 @@
+"""
+compact, slotted stand-ins for User and SchildUser.
+
+they only store the fields this package works with and behave like the
+dict based classes for item access, `in`, get(), schildId/schildID,
+is_student() and repr().
+"""
+from .wordlist import generate_password
+
+# the fields of a workspace user this package reads
+USER_FIELDS = (
+    "primaryEmail",
+    "aliases",
+    "name",
+    "orgUnitPath",
+    "externalIds",
+    "suspended",
+    "agreedToTerms",
+    "lastLoginTime",
+)
+# partial response for users().list, matching USER_FIELDS
+USER_LIST_FIELDS = "nextPageToken,users({})".format(",".join(USER_FIELDS))
+USER_GET_FIELDS = ",".join(USER_FIELDS)
+
+_MISSING = object()
+
+
+class _Record(object):
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(f"{type(self).__name__} has no field {key}")
+        if key not in self.dirty:
+            self.original[key] = getattr(self, key, _MISSING)
+        setattr(self, key, value)
+        self.dirty.add(key)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self._fields and hasattr(self, key)
+
+    def __iter__(self):
+        return (key for key in self._fields if hasattr(self, key))
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            return self.data == other.data
+        return self.data == other
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self):
+        return list(self)
+
+    @property
+    def data(self):
+        return {key: getattr(self, key) for key in self}
+
+    @data.setter
+    def data(self, data):
+        self.dirty = set()
+        self.original = {}
+        for key in self._fields:
+            if hasattr(self, key):
+                delattr(self, key)
+        for key in self._fields:
+            value = data.get(key, _MISSING)
+            if value is not _MISSING:
+                setattr(self, key, value)
+
+
+class UserRecord(_Record):
+    # password is never listed, it is only set locally before saving
+    _fields = USER_FIELDS + ("password",)
+    # dirty: fields assigned since the record was loaded, original: their
+    # loaded values
+    __slots__ = _fields + ("workspace", "dirty", "original")
+
+    def __init__(self, userdata, workspace=None):
+        self.data = userdata
+        self.workspace = workspace
+
+    def __repr__(self):
+        output = self["primaryEmail"] + " - " + self["orgUnitPath"]
+        if "externalIds" in self:
+            output += " - " + self["externalIds"][0]["value"]
+        return output
+
+    @property
+    def schildId(self):
+        if "externalIds" in self:
+            return self["externalIds"][0]["value"]
+        return None
+
+    @schildId.setter
+    def schildId(self, value):
+        if "externalIds" in self:
+            external_ids = [dict(external_id) for external_id in self["externalIds"]]
+            external_ids[0]["value"] = str(value)
+            self["externalIds"] = external_ids
+        else:
+            self["externalIds"] = [{"value": str(value), "type": "organization"}]
+
+    def is_student(self):
+        return self["orgUnitPath"].startswith("/Schüler")
+
+    def clean(self):
+        """same as User.clean"""
+        self.dirty.clear()
+        self.original.clear()
+
+    def rollback(self, fields):
+        """same as User.rollback"""
+        for field in fields:
+            if field not in self.dirty:
+                continue
+            value = self.original.pop(field)
+            if value is _MISSING:
+                delattr(self, field)
+            else:
+                setattr(self, field, value)
+            self.dirty.discard(field)
+
+    def set_password(self, password, prnt=True):
+        self["password"] = password
+        if prnt:
+            print(self["primaryEmail"], password)
+        return self.save()
+
+    def generate_new_password(self):
+        """same as User.generate_new_password"""
+        return self.set_password(generate_password())
+
+    def save(self):
+        if self.workspace is not None:
+            return self.workspace.update_user(self)
+        else:
+            print("no workspace available...")
+            return False
+
+
+class SchildRecord(_Record):
+    """a student row of a SCHILD export, see schild_users.STUDENT_KEYS"""
+
+    _keys = {
+        "Vorname": "vorname",
+        "Nachname": "nachname",
+        "Klasse": "klasse",
+        "Interne ID-Nummer": "schild_id",
+    }
+    _fields = tuple(_keys)
+    __slots__ = tuple(_keys.values())
+
+    def __init__(self, row):
+        for key, slot in self._keys.items():
+            setattr(self, slot, row[key])
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._keys[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(f"SchildRecord has no field {key}")
+        setattr(self, self._keys[key], value)
+
+    def __contains__(self, key):
+        return key in self._keys and hasattr(self, self._keys[key])
+
+    def __delitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __repr__(self):
+        return f"{self.vorname} {self.nachname} - {self.klasse} - {self.schild_id}"
+
+    @property
+    def data(self):
+        return {key: getattr(self, slot) for key, slot in self._keys.items()}
+
+    @property
+    def schildID(self):
+        return self.schild_id
@@ -3,6 +3,18 @@ from csv import (
 )
 from os.path import isfile
 
+from .records import SchildRecord
+from .search import NameIndex
+
+
+STUDENT_KEYS = ["Vorname", "Nachname", "Klasse", "Interne ID-Nummer"]
+TEACHER_KEYS = [
+    "Vorname",
+    "Nachname",
+    "E-Mail (Dienstlich)",
+    "eindeutige Nummer (GUID)",
+]
+
 
 class SchildUser(dict):
     def __repr__(self):
@@ -18,52 +30,128 @@ class SchildUsers(object):
         self.users = []
         self.teachers = teachers
         self.schild_file = schild_file
+        self._invalid_header = False
         if schild_file:
             self.users = self._users_from_schild()
 
+    @property
+    def users(self):
+        return self._users
+
+    @users.setter
+    def users(self, users):
+        self._users = users
+        self._schild_ids = None
+        self._search_index = None
+
+    @property
+    def schild_ids(self):
+        """set of all schild ids, built once per userlist"""
+        if self._schild_ids is None:
+            self._schild_ids = {str(user.schildID) for user in self._users or []}
+        return self._schild_ids
+
     def _users_from_schild(self) -> list:
         """
         takes a SCHILD text-file (csv) and returns a list of dicts.
         The keys are taken from the first csv-row.
         """
+        if not self._schild_file_exists():
+            return None
+        users = list(self.iter_users(all_columns=True))
+        if not users and self._invalid_header:
+            return None
+        return users
+
+    def _schild_file_exists(self):
         if not self.schild_file:
             print("load schild file first")
-            return None
+            return False
         if not isfile(self.schild_file):
             print(f"{self.schild_file} does not exist!")
-            return None
-        self.users = []
+            return False
+        return True
+
+    @property
+    def required_keys(self):
+        if self.teachers:
+            return TEACHER_KEYS
+        return STUDENT_KEYS
+
+    def iter_users(self, columns=(), all_columns=False, compact=False):
+        """
+        yields the users of the SCHILD file one by one without loading the file.
+        only the required columns and the given extra `columns` are kept,
+        unless all_columns is set.
+        compact yields slotted SchildRecords instead (students only, no extra columns).
+        """
+        if compact and (self.teachers or columns or all_columns):
+            raise ValueError("compact records only hold the student columns")
+        self._invalid_header = False
+        if not self._schild_file_exists():
+            return
         with open(self.schild_file, mode="r", encoding="utf-8-sig") as f:
             reader = DictReader(f, dialect="excel", delimiter=";")
-            users = list(reader)
-        # Check if Schildfile is sufficient
-        if self.teachers:
-            requirend_keys = [
-                "Vorname",
-                "Nachname",
-                "E-Mail (Dienstlich)",
-                "eindeutige Nummer (GUID)",
-            ]
-        else:
-            requirend_keys = ["Vorname", "Nachname", "Klasse", "Interne ID-Nummer"]
-        test_user = users[0]
-        if not set(requirend_keys).issubset(set(test_user.keys())):
-            print(
-                "Err - These Keys are needed: {}\nmake sure to use ; as delimiter".format(
-                    requirend_keys
+            # Check if Schildfile is sufficient
+            fieldnames = reader.fieldnames or []
+            if not set(self.required_keys).issubset(fieldnames):
+                self._invalid_header = True
+                print(
+                    "Err - These Keys are needed: {}\nmake sure to use ; as delimiter".format(
+                        self.required_keys
+                    )
                 )
+                return
+            keep = None
+            if not all_columns:
+                keep = list(self.required_keys) + [
+                    column for column in columns if column in fieldnames
+                ]
+            for user in reader:
+                # filter test-users, etc.
+                if user["Vorname"] == "" or user["Nachname"] == "":
+                    continue
+                if compact:
+                    yield SchildRecord(user)
+                    continue
+                if keep is not None:
+                    user = {key: user[key] for key in keep}
+                yield SchildUser(user)
+
+    @property
+    def search_index(self):
+        if self._search_index is None:
+            self._search_index = NameIndex(
+                self._users or [], lambda user: f"{user['Vorname']} {user['Nachname']}"
             )
-            return None
+        return self._search_index
 
-        # filter test-users, etc.
-        def _is_testuser(user):
-            return all([user["Vorname"] != "", user["Nachname"] != ""])
+    def find_users(self, string, fuzzy=False, school_class=None, limit=10):
+        """
+        returns a list of {"index": i, "user": user} for all users whose name
+        contains string. school_class only returns users of this Klasse.
 
-        return [SchildUser(user) for user in filter(_is_testuser, users)]
+        fuzzy returns up to `limit` matches ranked by similarity with an
+        additional "score", "Mueller" finds "Müller" and small typos still match.
+        """
+        users = self._users or []
+
+        def _accept(i):
+            return school_class is None or users[i]["Klasse"] == school_class
 
-    def find_users(self, string):
+        if fuzzy:
+            return [
+                {"index": i, "user": users[i], "score": score}
+                for score, i in self.search_index.search(string, limit, _accept)
+            ]
+        candidates = self.search_index.candidates(string)
+        if candidates is None:
+            candidates = range(len(users))
         matches = []
-        for i, user in enumerate(self.users):
+        for i in sorted(candidates):
+            user = users[i]
+            if not _accept(i):
+                continue
             if f"{user['Vorname']} {user['Nachname']}".casefold().find(string) >= 0:
                 matches.append({"index": i, "user": user})
         return matches
@@ -0,0 +1,89 @@
+from collections import Counter, defaultdict
+from itertools import chain
+
+from .names import normalize_name
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex(object):
+    """
+    trigram index over the normalized names of a list of users.
+
+        index = NameIndex(users, lambda user: user["name"]["fullName"])
+        index.search("Mueller")  # -> [(score, position), ...]
+
+    positions refer to the list the index was built from.
+    """
+
+    def __init__(self, users, get_name):
+        self.names = []
+        # the number of trigrams of every name, for the similarity score
+        self._sizes = []
+        self._postings = defaultdict(list)
+        for position, user in enumerate(users):
+            name = normalize_name(get_name(user))
+            self.names.append(name)
+            trigrams = _trigrams(name)
+            self._sizes.append(len(trigrams))
+            for trigram in trigrams:
+                self._postings[trigram].append(position)
+
+    def candidates(self, text):
+        """
+        positions whose normalized name may contain `text`, None means
+        `text` is too short to narrow anything down.
+        """
+        normalized = normalize_name(text)
+        if len(normalized) < 3:
+            return None
+        trigrams = [
+            normalized[i : i + 3] for i in range(len(normalized) - 2)
+        ]
+        postings = sorted((self._postings.get(t, ()) for t in trigrams), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                break
+        return result
+
+    def search(self, text, limit=10, accept=None, min_score=0.3):
+        """
+        ranked fuzzy search, returns up to `limit` (score, position) tuples.
+        the score is 1.0 for names containing `text` and the trigram
+        similarity otherwise, so typos still match.
+        `accept(position)` can filter the hits, e.g. by class.
+        """
+        normalized = normalize_name(text)
+        if not normalized:
+            return []
+        query = _trigrams(normalized)
+        shared = Counter(
+            chain.from_iterable(self._postings.get(trigram, ()) for trigram in query)
+        )
+        # count / (len(query) + size - count) >= min_score needs at least
+        # min_score * len(query) shared trigrams, names containing text
+        # share all trigrams of text itself
+        inner = {normalized[i : i + 3] for i in range(len(normalized) - 2)}
+        needed = min(min_score * len(query), len(inner))
+        hits = []
+        for position, count in shared.items():
+            if count < needed:
+                continue
+            if accept is not None and not accept(position):
+                continue
+            name = self.names[position]
+            if normalized in name:
+                # prefer matches at the start of a word and shorter names
+                score = 1.0 + (name.startswith(normalized) or f" {normalized}" in name)
+                score -= len(name) / 1000
+            else:
+                score = count / (len(query) + self._sizes[position] - count)
+            if score >= min_score:
+                hits.append((score, position))
+        hits.sort(key=lambda hit: (-hit[0], self.names[hit[1]]))
+        return hits[:limit]
@@ -0,0 +1,58 @@
+import os
+import os.path
+import pickle
+import time
+
+DEFAULT_SNAPSHOT_PATH = "secret/users.pickle"
+
+
+class Snapshot(object):
+    """
+    a local copy of the domain's userlist, stored beside secret/token.pickle.
+    a snapshot taken for another domain, or whose full listing is older than
+    `ttl` seconds, is ignored. saving own changes keeps the time of the
+    listing, so changes made elsewhere show up after ttl at the latest.
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        # time of the full listing the stored userlist is based on
+        self.listed = None
+
+    def load(self, domain):
+        """returns the stored list of user dicts or None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if snapshot.get("domain") != domain:
+            return None
+        if time.time() - snapshot.get("time", 0) > self.ttl:
+            return None
+        self.listed = snapshot["time"]
+        return snapshot["users"]
+
+    def save(self, domain, users, full=False):
+        """
+        writes the snapshot atomically, users is a list of dicts. full marks
+        users as a new listing of the whole domain, otherwise they are the
+        last listing with own changes applied.
+        """
+        if full or self.listed is None:
+            self.listed = time.time()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"domain": domain, "time": self.listed, "users": users}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.listed = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
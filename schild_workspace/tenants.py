@@ -0,0 +1,320 @@
+"""
+sync or rollover for several schools at once, one process per school.
+
+    tenants = load_tenants("schools.json")
+    report = run_tenants(tenants, job=SYNC, apply=True)
+    print(report)
+
+schools.json lists one entry per school, relative paths are resolved
+against the directory of the config file:
+
+    {"tenants": [
+        {"name": "gym", "domain": "gym.example.org",
+         "schild_file": "gym/SchildExport.txt", "secret_dir": "gym/secret",
+         "queries_per_second": 5},
+        {"name": "rs", "domain": "rs.example.org",
+         "schild_file": "rs/SchildExport.txt",
+         "service_account": "rs/service_account.json",
+         "subject": "admin@rs.example.org"}
+    ]}
+
+every school gets its own credentials, token cache, rate limit and
+output_dir (default: its name) for the password lists, the rollover
+journal, metrics.json and log.txt with everything the job printed.
+secret_dir defaults to output_dir/secret, never to the secret/ of the
+working directory. a job refuses to touch a domain whose listing contains
+users of another domain, e.g. because of the credentials of another school.
+"""
+import contextlib
+import datetime
+import json
+import os
+import os.path
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch import DEFAULT_BATCH_SIZE
+
+SYNC = "sync"
+ROLLOVER = "rollover"
+JOBS = (SYNC, ROLLOVER)
+FORMER = ("suspend", "delete", "keep")
+
+
+class Tenant(object):
+    """one school: its domain, credentials and SCHILD export"""
+
+    def __init__(
+        self,
+        domain,
+        schild_file=None,
+        name=None,
+        secret_dir=None,
+        service_account=None,
+        subject=None,
+        customer="my_customer",
+        queries_per_second=None,
+        output_dir=None,
+        onboarding=False,
+        former="suspend",
+        api_endpoint=None,
+    ):
+        if former not in FORMER:
+            raise ValueError(f"former must be one of {', '.join(FORMER)}")
+        self.domain = domain
+        self.schild_file = schild_file
+        self.name = name or domain
+        self.service_account = service_account
+        self.subject = subject
+        self.customer = customer
+        self.queries_per_second = queries_per_second
+        self.output_dir = output_dir or self.name
+        # the token cache is kept in secret_dir, also for service accounts
+        self.secret_dir = secret_dir or os.path.join(self.output_dir, "secret")
+        self.onboarding = onboarding
+        self.former = former
+        self.api_endpoint = api_endpoint
+
+    def __repr__(self):
+        return f"{self.name} - {self.domain}"
+
+    def workspace(self):
+        """a WorkspaceUsers object with the credentials and quota of this school"""
+        from .credentials import get_credentials
+        from .provisioning import TokenBucket
+        from .workspace_users import WorkspaceUsers
+
+        creds = get_credentials(self.service_account, self.subject, self.secret_dir)
+        # the domain is listed by the job, once it is needed
+        workspace = WorkspaceUsers(
+            self.domain,
+            creds=creds,
+            api_endpoint=self.api_endpoint,
+            customer=self.customer,
+            lazy=True,
+        )
+        workspace.quiet = True
+        if self.queries_per_second:
+            workspace.rate_limiter = TokenBucket(self.queries_per_second)
+        return workspace
+
+
+PATH_KEYS = ("schild_file", "secret_dir", "service_account", "output_dir")
+
+
+def load_tenants(path):
+    """the Tenants of a json config file, see the module docstring"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    tenants = []
+    for entry in config["tenants"]:
+        entry = dict(entry)
+        entry.setdefault("output_dir", entry.get("name") or entry["domain"])
+        for key in PATH_KEYS:
+            if entry.get(key):
+                entry[key] = os.path.join(base, entry[key])
+        tenants.append(Tenant(**entry))
+    names = [tenant.name for tenant in tenants]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate tenants: {', '.join(duplicates)}")
+    return tenants
+
+
+def _former(value):
+    from .reconcile import DELETE, SUSPEND
+
+    return {"suspend": SUSPEND, "delete": DELETE, "keep": None}[value]
+
+
+def _check_domain(tenant, users):
+    """raises a ValueError if users contains accounts outside tenant.domain"""
+    domains = {user["primaryEmail"].rpartition("@")[2].lower() for user in users}
+    foreign = sorted(domains - {tenant.domain.lower()})
+    if foreign:
+        raise ValueError(
+            f"the users of {tenant.name} belong to {', '.join(foreign)}, "
+            f"not {tenant.domain}"
+        )
+
+
+def _sync(tenant, workspace, apply, batch_size):
+    from .passwords import PasswordExport
+    from .reconcile import plan_sync
+    from .schild_users import SchildUsers
+
+    schild = SchildUsers(tenant.schild_file)
+    workspace.ensure_complete()
+    _check_domain(tenant, workspace.users)
+    plan = plan_sync(schild, workspace, tenant.onboarding, _former(tenant.former))
+    print(plan)
+    failed = []
+    if apply:
+        failed = plan.apply(batch_size, PasswordExport(tenant.output_dir)) or []
+    return plan.summary(), failed
+
+
+def _rollover(tenant, workspace, apply, batch_size):
+    from .journal import Journal
+    from .workspace_users import plan_next_year
+
+    # one journal per school year, an interrupted rollover resumes without
+    # listing the domain again
+    name = f"rollover_{datetime.date.today().year}.jsonl"
+    with Journal(os.path.join(tenant.output_dir, name)) as journal:
+        if journal.planned:
+            steps = journal.pending()
+        else:
+            workspace.ensure_complete()
+            _check_domain(tenant, workspace.users)
+            steps = plan_next_year(workspace.users)
+        deletes = sum(1 for _, step in steps if step["to"] == "delete")
+        changes = {"move": len(steps) - deletes, "delete": deletes}
+        changes = {action: count for action, count in changes.items() if count}
+        failed = []
+        if apply:
+            failed = workspace.move_to_next_year(True, batch_size, journal) or []
+    return changes, failed
+
+
+def _result(tenant, job, apply):
+    return {
+        "tenant": tenant.name,
+        "domain": tenant.domain,
+        "job": job,
+        "applied": apply,
+        "changes": {},
+        "failed": [],
+        "requests": 0,
+        "error": None,
+        "seconds": 0,
+    }
+
+
+def run_tenant(tenant, job=SYNC, apply=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    runs one job for one tenant and returns its result as a dict. errors
+    end up in result["error"] instead of being raised, so one school can
+    not stop the others.
+    """
+    if job not in JOBS:
+        raise ValueError(f"job must be one of {', '.join(JOBS)}")
+    result = _result(tenant, job, apply)
+    start = time.perf_counter()
+    try:
+        if job == SYNC and not os.path.isfile(tenant.schild_file or ""):
+            raise FileNotFoundError(f"could not read {tenant.schild_file}")
+        os.makedirs(tenant.output_dir, exist_ok=True)
+        log_path = os.path.join(tenant.output_dir, "log.txt")
+        with open(log_path, "w", encoding="utf-8") as log:
+            with contextlib.redirect_stdout(log):
+                workspace = tenant.workspace()
+                try:
+                    run = _sync if job == SYNC else _rollover
+                    changes, failed = run(tenant, workspace, apply, batch_size)
+                    result["changes"] = changes
+                    result["failed"] = [repr(error) for error in failed]
+                finally:
+                    metrics = workspace.metrics
+                    result["requests"] = metrics.summary()["total"]["requests"]
+                    metrics.write_json(os.path.join(tenant.output_dir, "metrics.json"))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+class TenantReport(object):
+    """the results of run_tenants, print(report) gives one line per tenant"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def ok(self):
+        return not any(result["error"] or result["failed"] for result in self.results)
+
+    def summary(self):
+        """the totals over all tenants"""
+        changes = {}
+        for result in self.results:
+            for action, count in result["changes"].items():
+                changes[action] = changes.get(action, 0) + count
+        return {
+            "tenants": len(self.results),
+            "errors": sum(1 for result in self.results if result["error"]),
+            "failed": sum(len(result["failed"]) for result in self.results),
+            "requests": sum(result["requests"] for result in self.results),
+            "changes": changes,
+        }
+
+    def __str__(self):
+        lines = []
+        for result in self.results:
+            if result["error"]:
+                status = f"error: {result['error']}"
+            else:
+                status = ", ".join(
+                    f"{action}: {count}" for action, count in result["changes"].items()
+                ) or "no changes"
+                if result["failed"]:
+                    status += f" - failed: {len(result['failed'])}"
+            lines.append(
+                f"{result['tenant']} ({result['domain']}) {result['job']}: {status}"
+                f" - {result['requests']} requests in {result['seconds']} s"
+            )
+        summary = self.summary()
+        lines.append(
+            f"{summary['tenants']} tenants, {summary['errors']} errors, "
+            f"{summary['failed']} failed users, {summary['requests']} requests"
+        )
+        return "\n".join(lines)
+
+    def to_json(self):
+        return json.dumps(
+            {"tenants": self.results, "total": self.summary()}, indent=2
+        )
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json() + "\n")
+
+
+def run_tenants(
+    tenants, job=SYNC, apply=False, processes=None, batch_size=DEFAULT_BATCH_SIZE
+):
+    """
+    runs job for all tenants in a pool of `processes` processes (default:
+    one per tenant, at most one per cpu) and returns a TenantReport.
+    processes=0 runs the tenants one after another in this process.
+    """
+    if job not in JOBS:
+        raise ValueError(f"job must be one of {', '.join(JOBS)}")
+    tenants = list(tenants)
+    if processes == 0 or not tenants:
+        return TenantReport(
+            [run_tenant(tenant, job, apply, batch_size) for tenant in tenants]
+        )
+    processes = processes or min(len(tenants), os.cpu_count() or 1)
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [
+            pool.submit(run_tenant, tenant, job, apply, batch_size)
+            for tenant in tenants
+        ]
+        for tenant, future in zip(tenants, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker process died, e.g. BrokenProcessPool
+                result = _result(tenant, job, apply)
+                result["error"] = f"{type(e).__name__}: {e}"
+                results.append(result)
+    return TenantReport(results)
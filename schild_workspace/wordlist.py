@@ -1,4 +1,4 @@
-from random import sample
+from secrets import SystemRandom
 
 wordlist = [
     "Eisvogel",
@@ -243,6 +243,15 @@ _wordlist = [
     "Zwergziege"
     ]
 
+_random = SystemRandom()
+
+
 def generate_password(length=2):
-    words = sample(wordlist, length)
+    words = _random.sample(wordlist, length)
     return " ".join(words)
+
+
+def generate_passwords(amount, length=2):
+    """`amount` passwords from the operating system's CSPRNG"""
+    sample = _random.sample
+    return [" ".join(sample(wordlist, length)) for _ in range(amount)]
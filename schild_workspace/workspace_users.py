@@ -1,39 +1,287 @@
 from __future__ import print_function
 from collections import UserDict
-import pickle
-import os.path
-import unicodedata
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from itertools import chain
+import threading
 
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
 
-from .wordlist import generate_password
+from .allocator import UsernameAllocator
+from .credentials import get_credentials
+from .names import sanitize_username
+from .search import NameIndex
+from .batch import DirectoryBatch, DEFAULT_BATCH_SIZE, new_batch_request
+from .records import UserRecord, USER_GET_FIELDS, USER_LIST_FIELDS, _MISSING
+from .metrics import Metrics
+from .passwords import CHECKPOINT_EVERY, PasswordExport
+from .progress import Progress
+from .provisioning import (
+    DEFAULT_QUERIES_PER_SECOND,
+    TokenBucket,
+    execute_with_backoff,
+    run_concurrently,
+)
+from .snapshot import Snapshot, DEFAULT_SNAPSHOT_PATH
+from .wordlist import generate_password, generate_passwords
 
 
-def sanitize_username(name):
-    REPLACE_MAP = {" ": "-", "ß": "ss", "ä": "ae", "ö": "oe", "ü": "ue", "æ": ""}
-    TARGET_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789._-"
-    username = ""
+# the directory api returns at most 500 users per page
+MAX_PAGE_SIZE = 500
 
-    def _char_translate(c):
-        base = unicodedata.decomposition(c).split(" ")[0].strip("0")
-        return bytes.fromhex(base).decode("utf-8")
 
-    for c in name.lower():
-        if c in TARGET_CHARS:
-            username += c
-        elif c in REPLACE_MAP:
-            username += REPLACE_MAP[c]
-        else:
-            username += _char_translate(c)
-    return username
+def _quote(value):
+    value = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{value}'"
+
+
+def build_query(org_unit=None, schild_id=None, name=None, email=None, suspended=None):
+    """
+    translates filters into a directory api query, e.g.
+
+        build_query(org_unit="/Schüler/05", name="Max")
+        -> "orgUnitPath='/Schüler/05' name:'Max'"
+
+    org_unit includes all sub org units, name matches the beginning of
+    words, email may end with * for a prefix search.
+    """
+    terms = []
+    if org_unit:
+        terms.append(f"orgUnitPath={_quote(org_unit)}")
+    if schild_id:
+        terms.append(f"externalId:{_quote(schild_id)}")
+    if name:
+        terms.append(f"name:{_quote(name)}")
+    if email:
+        terms.append(f"email:{email}")
+    if suspended is not None:
+        terms.append(f"isSuspended={'true' if suspended else 'false'}")
+    return " ".join(terms)
+
+
+def matches_filters(
+    user, org_unit=None, schild_id=None, name=None, email=None, suspended=None
+):
+    """the local counterpart of build_query"""
+    if org_unit and not (
+        user["orgUnitPath"] == org_unit
+        or user["orgUnitPath"].startswith(org_unit.rstrip("/") + "/")
+    ):
+        return False
+    if schild_id and str(schild_id) not in [
+        external_id["value"] for external_id in user.get("externalIds", [])
+    ]:
+        return False
+    # name: matches the beginning of words, "Max" finds "Max Muster", "ax" does not
+    if name and (
+        " " + name.rstrip("*").casefold()
+        not in " " + user["name"]["fullName"].casefold()
+    ):
+        return False
+    if email:
+        if email.endswith("*"):
+            if not user["primaryEmail"].startswith(email[:-1]):
+                return False
+        elif user["primaryEmail"] != email:
+            return False
+    if suspended is not None and user.get("suspended", False) != suspended:
+        return False
+    return True
+
+
+# the fields update_user sends, everything else is only set on insert
+UPDATE_FIELDS = ("orgUnitPath", "name", "externalIds", "suspended", "password")
+
+
+def _is_not_found(error):
+    return isinstance(error, HttpError) and error.resp.status == 404
+
+
+def username_for(first_name, last_name, teacher=False):
+    """teachers get f.lastname, students firstname.lastname"""
+    length = 1 if teacher else len(first_name)
+    raw_username = ".".join([first_name[0:length], last_name])
+    return sanitize_username(raw_username).lower()
+
+
+def org_unit_for_class(klasse, onboarding=False):
+    """maps a SCHILD class (05a, EF, IPD, ...) to its org unit"""
+    base_org_unit = "/Schüler"
+    if onboarding:
+        base_org_unit += "/onboarding"
+    if klasse in ["EF", "Q1", "Q2"]:
+        return f"{base_org_unit}/Oberstufe/{klasse}"
+    elif klasse == "IPD":
+        return f"{base_org_unit}/{klasse}"
+    return f"{base_org_unit}/{klasse[:2]}/{klasse}"
+
+
+def new_user_data(
+    first_name,
+    last_name,
+    recoveryEmail=None,
+    schild_id=None,
+    teacher=False,
+    schoolclass=None,
+    changePasswordAtNextLogin=False,
+):
+    """the fields of a new account, without primaryEmail and password"""
+    user = {}
+    user["name"] = {
+        "givenName": first_name,  # First Name
+        "fullName": f"{first_name} {last_name}",  # Full Name
+        "familyName": last_name,  # Last Name
+    }
+    if teacher:
+        user["orgUnitPath"] = "/Lehrer"
+        user["organizations"] = [
+            {"primary": True, "customType": "", "description": "Lehrer"}
+        ]
+        if recoveryEmail:
+            user["recoveryEmail"] = recoveryEmail
+    else:
+        if type(schoolclass) == int:
+            schoolclass = str(schoolclass)
+        if not schoolclass.startswith("/"):
+            if len(schoolclass) < 3:
+                schoolclass = "0" + schoolclass
+            schoolclass = "/Schüler/{}/{}".format(schoolclass[0:2], schoolclass)
+        user["orgUnitPath"] = schoolclass
+        user["organizations"] = [
+            {"primary": True, "customType": "", "description": "Schüler"}
+        ]
+        if schild_id:
+            user["externalIds"] = [{"value": str(schild_id), "type": "organization"}]
+    user["changePasswordAtNextLogin"] = changePasswordAtNextLogin
+    return user
+
+
+def insert_body(user, password):
+    # "externalIds": [{'value': '7618', 'type': 'organization'}]
+    body = {
+        "primaryEmail": user["primaryEmail"],
+        "password": password,
+        "changePasswordAtNextLogin": user["changePasswordAtNextLogin"],  # True or False
+        "orgUnitPath": user["orgUnitPath"],
+        "name": user["name"],
+    }
+    if "externalIds" in user:
+        body["externalIds"] = user["externalIds"]
+    return body
+
+
+def patch_body(user, cached):
+    """
+    the fields of user to send with users().patch. for the cached user
+    itself these are the fields assigned since it was loaded (user.dirty),
+    for other objects the fields that differ from the cached user.
+    """
+    dirty = getattr(user, "dirty", None)
+    body = {}
+    for field in UPDATE_FIELDS:
+        if field not in user:
+            continue
+        if cached is user and dirty is not None:
+            if field in dirty:
+                body[field] = user[field]
+        elif (
+            cached is None
+            or field == "password"
+            or _differs(user[field], cached.get(field))
+        ):
+            body[field] = user[field]
+    return body
+
+
+def _differs(value, cached_value):
+    """
+    compares dicts like name only in the keys of value, the api returns
+    more of them (e.g. name.displayName) than a new User has.
+    """
+    if isinstance(value, dict) and isinstance(cached_value, dict):
+        return any(cached_value.get(key) != value[key] for key in value)
+    return value != cached_value
+
+
+def next_org_unit(org_unit):
+    """returns the org unit for next year, "delete" or None to keep the user"""
+    if org_unit.startswith("/Lehrer"):
+        return None
+    elif org_unit.startswith("/Schüler/Ehemalige"):
+        return "delete"
+    elif org_unit.startswith("/Schüler/Oberstufe"):
+        return {
+            "/Schüler/Oberstufe/Q2": "/Schüler/Ehemalige_S2",
+            "/Schüler/Oberstufe/Q1": "/Schüler/Oberstufe/Q2",
+            "/Schüler/Oberstufe/EF": "/Schüler/Oberstufe/Q1",
+        }.get(org_unit)
+    elif org_unit.startswith("/Schüler/10"):
+        return "/Schüler/Ehemalige_S1"
+    elif org_unit.startswith("/Schüler/0"):
+        try:
+            jg, schoolclass = map(int, org_unit.split("/")[2:4])
+        except ValueError:
+            return None
+        jg += 1
+        schoolclass += 10
+        return f"/Schüler/{jg:02d}/{schoolclass:03d}"
+    return None
+
+
+def plan_next_year(users):
+    """list of (op, step) tuples, step holds primaryEmail, from and to"""
+    steps = []
+    for user in users:
+        org_unit = user["orgUnitPath"]
+        target = next_org_unit(org_unit)
+        if target is None:
+            if org_unit.startswith("/Lehrer"):
+                print("skipping Lehrer:", user)
+            elif org_unit.startswith("/Schüler"):
+                print("\n========\nerr - who is this")
+                print(user)
+                print("========\n")
+            continue
+        step = {"primaryEmail": user["primaryEmail"], "from": org_unit, "to": target}
+        steps.append((f"rollover:{user['primaryEmail']}", step))
+    return steps
 
 
 class User(UserDict):
     def __init__(self, userdata, workspace=None):
+        # fields assigned since the user was loaded, see WorkspaceUsers.update_user
+        self.dirty = set()
+        # their loaded values, restored by rollback() if saving them fails
+        self.original = {}
         super().__init__(userdata)
         self.workspace = workspace
+        self.clean()
+
+    def __setitem__(self, key, value):
+        if key not in self.dirty:
+            self.original[key] = self.data.get(key, _MISSING)
+        super().__setitem__(key, value)
+        self.dirty.add(key)
+
+    def clean(self):
+        """forgets the assigned fields, after they were saved or reloaded"""
+        self.dirty.clear()
+        self.original.clear()
+
+    def rollback(self, fields):
+        """restores the loaded values of fields whose patch failed"""
+        for field in fields:
+            if field not in self.dirty:
+                continue
+            value = self.original.pop(field)
+            if value is _MISSING:
+                self.data.pop(field, None)
+            else:
+                self.data[field] = value
+            self.dirty.discard(field)
 
     def __repr__(self):
         output = self["primaryEmail"] + " - " + self["orgUnitPath"]
@@ -50,7 +298,9 @@ class User(UserDict):
     @schildId.setter
     def schildId(self, value):
         if "externalIds" in self:
-            self["externalIds"][0]["value"] = str(value)
+            external_ids = [dict(external_id) for external_id in self["externalIds"]]
+            external_ids[0]["value"] = str(value)
+            self["externalIds"] = external_ids
         else:
             self["externalIds"] = [{"value": str(value), "type": "organization"}]
 
@@ -70,162 +320,609 @@ class User(UserDict):
 
     def save(self):
         if isinstance(self.workspace, WorkspaceUsers):
-            print("saving ...")
             return self.workspace.update_user(self)
         else:
             print("no workspace available...")
             return False
 
 
+class UserIndex(object):
+    """
+    hash indexes over a list of users (primaryEmail, schild id, orgUnitPath, name).
+    the keys a user was indexed with are remembered, so an entry can be removed
+    even if the user has been modified in the meantime.
+    """
+
+    def __init__(self, users=()):
+        self.by_mail = {}
+        self.by_schild_id = {}
+        self.by_org_unit = {}
+        self.by_name = {}
+        self._keys = {}
+        # all users per schild id, by_schild_id holds the first of them
+        self._schild_id_users = {}
+        for user in users:
+            self.add(user)
+
+    @staticmethod
+    def _user_keys(user):
+        name = user.get("name", {}).get("fullName", "").casefold()
+        return (
+            user.get("primaryEmail"),
+            user.schildId,
+            user.get("orgUnitPath"),
+            name,
+        )
+
+    def add(self, user):
+        if id(user) in self._keys:
+            self.remove(user)
+        mail, schild_id, org_unit, name = keys = self._user_keys(user)
+        self._keys[id(user)] = keys
+        if mail:
+            self.by_mail[mail] = user
+        if schild_id is not None:
+            # first user wins, same as the former linear scan
+            self.by_schild_id.setdefault(schild_id, user)
+            self._schild_id_users.setdefault(schild_id, []).append(user)
+        self.by_org_unit.setdefault(org_unit, []).append(user)
+        self.by_name.setdefault(name, []).append(user)
+
+    def remove(self, user):
+        keys = self._keys.pop(id(user), None)
+        if keys is None:
+            return
+        mail, schild_id, org_unit, name = keys
+        if self.by_mail.get(mail) is user:
+            del self.by_mail[mail]
+        if schild_id is not None:
+            others = [
+                other
+                for other in self._schild_id_users.get(schild_id, [])
+                if other is not user
+            ]
+            if others:
+                self._schild_id_users[schild_id] = others
+                if self.by_schild_id.get(schild_id) is user:
+                    self.by_schild_id[schild_id] = others[0]
+            else:
+                self._schild_id_users.pop(schild_id, None)
+                self.by_schild_id.pop(schild_id, None)
+        for index, key in ((self.by_org_unit, org_unit), (self.by_name, name)):
+            bucket = [other for other in index.get(key, []) if other is not user]
+            if bucket:
+                index[key] = bucket
+            else:
+                index.pop(key, None)
+
+    def update(self, user):
+        self.add(user)
+
+
 class WorkspaceUsers(object):
-    def __init__(self, domain):
+    def __init__(
+        self,
+        domain,
+        creds=None,
+        api_endpoint=None,
+        snapshot_ttl=None,
+        snapshot_path=DEFAULT_SNAPSHOT_PATH,
+        compact=False,
+        lazy=False,
+        list_org_units=None,
+        metrics=None,
+        customer="my_customer",
+    ):
+        """
+        creds and api_endpoint are optional, by default the credentials are
+        loaded from secret/ and the public directory api is used. customer
+        is the account id whose users are listed, "my_customer" is the
+        account of the authenticated admin.
+
+        with snapshot_ttl (seconds) set, the userlist is stored in snapshot_path
+        and reused on the next start until its last full listing is older than
+        snapshot_ttl. own writes are applied to the snapshot, outside of bulk
+        jobs each of them rewrites the whole file.
+
+        with compact set, users are stored as slotted UserRecords instead of
+        User dicts, which saves memory on large domains.
+
+        with lazy set, the domain is not listed on start. lookups and
+        fetch() load the matching users with filtered requests, bulk jobs
+        load the whole domain first (see ensure_complete).
+
+        with list_org_units set, e.g. ("/Schüler", "/Lehrer"), the domain is
+        listed one org unit per thread instead of page by page. users outside
+        these org units are not loaded then, so the workspace is not complete:
+        like a lazy one it fetches other users on lookup, keeps no snapshot of
+        the slice and lists the whole domain before bulk jobs.
+
+        every api request is counted in self.metrics (see Metrics),
+        bulk jobs report their progress on stderr unless self.quiet is set.
+        """
         self.domain = domain
-        self.creds = self._get_credentials()
-        self.users = self._get_users()
+        self.customer = customer
+        self.api_endpoint = api_endpoint
+        self._batch = None
+        # one service per thread, httplib2.Http is not thread-safe
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.service_stats = {"builds": 0}
+        # guards self.users and its indexes
+        self._lock = threading.RLock()
+        self.rate_limiter = None
+        self.retries = 5
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.quiet = False
+        self.list_org_units = list_org_units
+        self.user_class = UserRecord if compact else User
+        self.snapshot = None
+        if snapshot_ttl:
+            self.snapshot = Snapshot(snapshot_path, ttl=snapshot_ttl)
+        self._bulk_depth = 0
+        # queries fetched while lazy, and addresses known not to exist
+        self._fetched = set()
+        self._missing = set()
+        self.creds = creds if creds is not None else get_credentials()
+        self.complete = not lazy
+        if lazy:
+            self.users = []
+        else:
+            self.users = self._load_users()
+
+    @property
+    def users(self):
+        return self._users
+
+    @users.setter
+    def users(self, users):
+        self._users = users
+        self.index = UserIndex(users)
+        self._search_index = None
+        self._allocator = None
+
+    def _make_user(self, userdata):
+        return self.user_class(userdata, workspace=self)
+
+    def _load_users(self):
+        if self.snapshot is not None:
+            users = self.snapshot.load(self.domain)
+            if users is not None:
+                return [self._make_user(user) for user in users]
+        if self.list_org_units:
+            self.complete = False
+            users = self._list_org_units(self.list_org_units)
+            return [self._make_user(user) for user in users]
+        users = self._get_users()
+        self.save_snapshot(users, full=True)
+        return users
+
+    def save_snapshot(self, users=None, full=False):
+        """
+        stores the userlist, full is set right after listing the whole
+        domain. every save pickles the whole userlist.
+
+        a lazy workspace that is not complete yet only holds a slice of the
+        domain, which must not be loaded as the whole domain on the next
+        start. its changes make the stored userlist outdated, so it is
+        removed instead.
+        """
+        if self.snapshot is None:
+            return
+        if not self.complete:
+            self.snapshot.clear()
+            return
+        with self._lock:
+            users = self._users if users is None else users
+            self.snapshot.save(self.domain, [user.data for user in users], full)
+
+    def _changed(self):
+        # outside of bulk jobs every single write stores the whole snapshot,
+        # bulk jobs store it once they are done
+        if self._bulk_depth == 0:
+            self.save_snapshot()
+
+    @contextmanager
+    def _bulk_job(self, batch_size=None):
+        """yields the active DirectoryBatch or None, stores the snapshot at the end"""
+        with self._lock:
+            self._bulk_depth += 1
+        try:
+            with self._batch_or_nothing(batch_size) as batch:
+                yield batch
+        finally:
+            with self._lock:
+                self._bulk_depth -= 1
+            self._changed()
+
+    @contextmanager
+    def _rate_limited(self, queries_per_second=None):
+        """
+        limits the requests of a thread pool to queries_per_second, a
+        configured self.rate_limiter or DEFAULT_QUERIES_PER_SECOND
+        """
+        # a configured limiter, e.g. the quota of a school, is kept
+        rate_limiter = self.rate_limiter
+        if queries_per_second:
+            self.rate_limiter = TokenBucket(queries_per_second)
+        elif rate_limiter is None:
+            self.rate_limiter = TokenBucket(DEFAULT_QUERIES_PER_SECOND)
+        try:
+            yield self.rate_limiter
+        finally:
+            self.rate_limiter = rate_limiter
+
+    def _add_to_users(self, user):
+        with self._lock:
+            self._users.append(user)
+            self.index.add(user)
+            self._search_index = None
+            if self._allocator is not None:
+                self._allocator.add(user["primaryEmail"])
+        return user
+
+    def _remove_from_users(self, user):
+        with self._lock:
+            self.index.remove(user)
+            self._search_index = None
+            if self._allocator is not None:
+                self._allocator.release(user["primaryEmail"])
+            for i, other in enumerate(self._users):
+                if other is user:
+                    del self._users[i]
+                    break
+            self._changed()
+
+    def _store_result(self, result):
+        """merge an api response into the local userlist and return the cached User"""
+        with self._lock:
+            user = self.index.by_mail.get(result["primaryEmail"])
+            if user is None:
+                user = self._add_to_users(self._make_user(result))
+            else:
+                user.data = result
+                user.clean()
+                self.index.update(user)
+                self._search_index = None
+            self._changed()
+        return user
+
+    @property
+    def allocator(self):
+        """UsernameAllocator over all addresses and aliases of the domain"""
+        with self._lock:
+            if self._allocator is None:
+                self._allocator = UsernameAllocator.from_users(self.domain, self._users)
+            return self._allocator
 
     def __str__(self):
         return "\n".join([user["primaryEmail"] for user in self.users])
 
-    def _get_credentials(self):
-        """load or request creds"""
-        creds = None
-        if os.path.exists("secret/token.pickle"):
-            with open("secret/token.pickle", "rb") as token:
-                creds = pickle.load(token)
-        # If there are no (valid) credentials available, let the user log in.
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    "secret/credentials.json",
-                    ["https://www.googleapis.com/auth/admin.directory.user"],
-                )
-                creds = flow.run_local_server(port=0)
-            # Save the credentials for the next run
-            with open("secret/token.pickle", "wb") as token:
-                pickle.dump(creds, token)
-        return creds
-
-    def _get_users(self):
-        """returns a list of all users"""
+    @property
+    def service(self):
+        """the directory service of the current thread, built on first use"""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = self._build_service()
+        return service
+
+    def _build_service(self):
+        client_options = None
+        if self.api_endpoint:
+            client_options = {"api_endpoint": self.api_endpoint}
+        # a single keep-alive connection per host, reused by every request
+        http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        with self._stats_lock:
+            self.service_stats["builds"] += 1
+        return build(
+            "admin",
+            "directory_v1",
+            http=http,
+            client_options=client_options,
+        )
+
+    def _new_batch_request(self, callback):
+        return new_batch_request(self.service, callback, self.api_endpoint)
+
+    def batch(self, size=DEFAULT_BATCH_SIZE):
+        """
+        with workspace.batch(50) as batch:
+            workspace.delete_user(...)
+            ...
+
+        inside the with-block inserts, updates and deletes are queued and sent
+        in groups of `size` requests. batch.results maps every response or
+        error back to its User.
+        """
+        return DirectoryBatch(self, size=size)
+
+    def _send(self, request):
+        return execute_with_backoff(
+            request, self.rate_limiter, self.retries, metrics=self.metrics
+        )
+
+    def _execute(self, operation, request, user, on_success, on_error=None):
+        """run a request now or queue it, if a batch is active"""
+        if self._batch is not None:
+            self._batch.add(operation, request, user, on_success, on_error)
+            return user
+        try:
+            result = self._send(request)
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            raise
+        return on_success(result)
+
+    def _get_users(self, query=None):
+        """returns a list of all users, or of the users matching a directory query"""
+        users = self._list_users(query)
+        # apply custom dicts for better console output
+        return [self._make_user(user) for user in users]
+
+    def _list_users(self, query=None):
         users = []
-        service = build("admin", "directory_v1", credentials=self.creds)
+        for page in self.iter_pages(query):
+            users += page
+        return users
+
+    def iter_pages(self, query=None, fields=USER_LIST_FIELDS):
+        """
+        yields the users of the domain (or matching a directory query) one
+        page at a time as plain dicts, without adding them to self.users.
+        fields is the partial response, "nextPageToken,users(...)".
+        """
+        service = self.service
+        # only request the fields used by this package
         request = service.users().list(
-            customer="my_customer", maxResults=200, orderBy="email"
+            customer=self.customer,
+            maxResults=MAX_PAGE_SIZE,
+            orderBy="email",
+            fields=fields,
+            query=query,
         )
         while request is not None:
-            result = request.execute()
-            users += result.get("users", [])
+            result = self._send(request)
+            yield result.get("users", [])
             request = service.users().list_next(request, result)
-        # apply custom dicts for better console output
-        return [User(user, workspace=self) for user in users]
+
+    def _list_org_units(self, org_units, workers=None):
+        """
+        lists every org unit (including its sub org units) in its own thread,
+        the pages of one org unit are still fetched one after another.
+        users in overlapping org units are returned only once.
+        """
+        tasks = [
+            partial(self._list_users, build_query(org_unit=org_unit))
+            for org_unit in org_units
+        ]
+        results = run_concurrently(tasks, workers=workers or len(org_units))
+        users = {}
+        for result, error in results:
+            if error is not None:
+                raise error
+            for user in result:
+                users.setdefault(user["primaryEmail"], user)
+        return sorted(users.values(), key=lambda user: user["primaryEmail"])
 
     def get_user_by_schild_id(self, schild_id):
-        result = None
-        for user in self.users:
-            if "externalIds" in user:
-                if user["externalIds"][0]["value"] == str(schild_id):
-                    # heißt im deutschen UI "Mitarbeiter-ID" und in der csv "interne ID-Nummer"
-                    result = user
-                    break
-        return result
+        # heißt im deutschen UI "Mitarbeiter-ID" und in der csv "interne ID-Nummer"
+        user = self.index.by_schild_id.get(str(schild_id))
+        if user is None and not self.complete and schild_id:
+            self.fetch(schild_id=schild_id)
+            user = self.index.by_schild_id.get(str(schild_id))
+        return user
 
     def get_user_by_mail(self, mail):
-        result = None
-        for user in self.users:
-            if user["primaryEmail"] == mail:
-                result = user
-                break
-        return result
+        user = self.index.by_mail.get(mail)
+        if user is None and not self.complete and mail not in self._missing:
+            user = self.fetch_user(mail)
+            if user is None:
+                self._missing.add(mail)
+        return user
+
+    def ensure_complete(self):
+        """loads the whole domain, if only slices of it were fetched so far"""
+        if not self.complete:
+            self.users = self._get_users()
+            self.complete = True
+            self.save_snapshot(full=True)
+
+    def fetch(self, refresh=False, **filters):
+        """
+        fetch(org_unit=None, schild_id=None, name=None, email=None, suspended=None)
+
+        lists only the users matching the filters (see build_query, name
+        matches the beginning of words of the full name) and merges them
+        into the local userlist. a query that was fetched before
+        is not sent again, unless refresh is set. returns the matching users.
+        """
+        query = build_query(**filters)
+        if not query:
+            self.ensure_complete()
+            return list(self.users)
+        if (self.complete or query in self._fetched) and not refresh:
+            return [user for user in self.users if matches_filters(user, **filters)]
+        results = [user.data for user in self._get_users(query)]
+        self._fetched.add(query)
+        with self._bulk_job():
+            return [self._store_result(result) for result in results]
+
+    def fetch_user(self, mail):
+        """loads a single user from the api into the local userlist, None if unknown"""
+        request = self.service.users().get(userKey=mail, fields=USER_GET_FIELDS)
+        try:
+            result = self._send(request)
+        except HttpError as e:
+            if _is_not_found(e):
+                return None
+            raise
+        return self._store_result(result)
+
+    def get_users_by_org_unit(self, org_unit):
+        return list(self.index.by_org_unit.get(org_unit, []))
+
+    def get_users_by_name(self, full_name):
+        return list(self.index.by_name.get(full_name.casefold(), []))
 
     def get_students_without_schild_id(self):
-        result = []
-        for user in self.users:
-            if not "externalIds" in user and user["orgUnitPath"].startswith("/Schüler"):
-                result.append(user)
-        return result
+        return self.classify()["students_without_schild_id"]
+
+    @property
+    def search_index(self):
+        """NameIndex over self.users, rebuilt after the userlist changed"""
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = NameIndex(
+                    self._users, lambda user: user["name"]["fullName"]
+                )
+            return self._search_index
 
     def query(self, name="", school_class=""):
+        if not self.complete:
+            # the api matches name: against word prefixes, not substrings,
+            # so only an org unit narrows down what has to be loaded
+            if school_class.startswith("/"):
+                self.fetch(org_unit=school_class)
+            else:
+                self.ensure_complete()
+        candidates = self.search_index.candidates(name)
+        if candidates is None:
+            candidates = range(len(self.users))
+        users = [self.users[i] for i in sorted(candidates)]
         return [
             user
-            for user in self.users
+            for user in users
             if name.casefold() in user["name"]["fullName"].casefold()
-            and school_class.casefold() in user["orgUnitPath"]
+            and school_class.casefold() in user["orgUnitPath"].casefold()
         ]
 
-    def move_to_next_year(self, i_really_know_what_i_am_doing=False):
+    def search(self, name, school_class="", limit=10):
+        """
+        fuzzy name search, returns up to `limit` users ranked by similarity.
+        umlauts and diacritics are normalized, so "Mueller" finds "Müller".
+        school_class works like in query().
+        """
+        users = self.users
+
+        def _accept(i):
+            return school_class.casefold() in users[i]["orgUnitPath"].casefold()
+
+        return [
+            users[i] for _, i in self.search_index.search(name, limit, _accept)
+        ]
+
+    def _batch_or_nothing(self, batch_size):
+        if batch_size:
+            return self.batch(batch_size)
+        return nullcontext()
+
+    def move_to_next_year(
+        self, i_really_know_what_i_am_doing=False, batch_size=None, journal=None
+    ):
+        """
+        promote all students to the next grade.
+        with batch_size set, updates and deletes are sent in batches
+        and the list of failed BatchResults is returned.
+
+        with a Journal, the planned moves and deletes are recorded before
+        anything is sent. running again with the same journal resumes the
+        recorded plan and skips completed users instead of promoting the
+        already promoted classes a second time. a resume does not list the
+        domain again, a lazy workspace only fetches the users of the
+        remaining steps.
+        """
         if not i_really_know_what_i_am_doing:
             print("think again!")
             return None
-        for user in self.users:
-            print(user)
-            update = True
-            if user["orgUnitPath"].startswith("/Lehrer"):
-                update = False
-                print("skipping Lehrer:", user)
-            elif user["orgUnitPath"].startswith("/Schüler/Ehemalige"):
-                self.delete_user(user)
-                update = False
-                # implement deleting
-            elif user["orgUnitPath"].startswith("/Schüler/Oberstufe"):
-                if user["orgUnitPath"] == "/Schüler/Oberstufe/Q2":
-                    user["orgUnitPath"] = "/Schüler/Ehemalige_S2"
-                elif user["orgUnitPath"] == "/Schüler/Oberstufe/Q1":
-                    user["orgUnitPath"] = "/Schüler/Oberstufe/Q2"
-                elif user["orgUnitPath"] == "/Schüler/Oberstufe/EF":
-                    user["orgUnitPath"] = "/Schüler/Oberstufe/Q1"
+        if journal is not None and journal.planned:
+            steps = journal.pending()
+            print(f"resuming: {len(steps)} of {len(journal.planned)} steps left")
+        else:
+            self.ensure_complete()
+            steps = plan_next_year(self.users)
+            if journal is not None:
+                journal.plan_all(steps)
+        # the local userlist follows every update and delete, no reload needed
+        progress = Progress("move_to_next_year", len(steps), quiet=self.quiet)
+        with progress, self._bulk_job(batch_size) as batch:
+            self._move_to_next_year(steps, batch, journal, progress)
+        if batch is not None:
+            for error in batch.errors:
+                print("failed:", error)
+            return batch.errors
+
+    def _move_to_next_year(self, steps, batch, journal, progress):
+        ops = {}
+        if journal is not None and batch is not None:
+
+            def _journal_flushed(results):
+                for result in results:
+                    op = ops.pop(id(result.user), None)
+                    if op is None:
+                        continue
+                    if result.ok or _is_not_found(result.error):
+                        journal.complete(op)
+                    else:
+                        journal.fail(op, result.error)
+
+            batch.on_flush = _journal_flushed
+        for op, step in steps:
+            user = self.get_user_by_mail(step["primaryEmail"])
+            if user is None:
+                if step["to"] != "delete":
+                    print("unknown user, skipping:", step["primaryEmail"])
+                    progress.skip()
+                    continue
+                # deleted already or not in the local userlist
+                user = self._make_user({"primaryEmail": step["primaryEmail"]})
+            ops[id(user)] = op
+            try:
+                if step["to"] == "delete":
+                    self.delete_user(user)
                 else:
-                    Print("\n========\nerr - who is this")
-                    print(user)
-                    Print("========\n")
-                    update = False
-            elif user["orgUnitPath"].startswith("/Schüler/10"):
-                user["orgUnitPath"] = "/Schüler/Ehemalige_S1"
-            elif user["orgUnitPath"].startswith("/Schüler/0"):
-                jg, schoolclass = map(int, user["orgUnitPath"].split("/")[2:4])
-                jg += 1
-                schoolclass += 10
-                user["orgUnitPath"] = f"/Schüler/{jg:02d}/{schoolclass:03d}"
-            else:
-                update = False
-            if update:
-                print(
-                    "key:",
-                    user["primaryEmail"],
-                    "body:",
-                    f"{{'orgUnitPath': '{user['orgUnitPath']}'}}",
-                )
-                updated_user = self.update_user(user)
-                print("updated:", updated_user)
-        # get a fresh userlist
-        self.users = self._get_users()
+                    user["orgUnitPath"] = step["to"]
+                    self.update_user(user)
+            except Exception as e:
+                if journal is not None and step["to"] == "delete" and _is_not_found(e):
+                    journal.complete(op)
+                    progress.skip()
+                    continue
+                progress.fail(step["primaryEmail"])
+                if journal is not None:
+                    journal.fail(op, e)
+                raise
+            progress.update(f"{step['primaryEmail']} -> {step['to']}")
+            if journal is not None and batch is None:
+                journal.complete(op)
 
     def delete_user(self, user):
-        service = build("admin", "directory_v1", credentials=self.creds)
+        service = self.service
         request = service.users().delete(userKey=user["primaryEmail"])
-        result = request.execute()
-        return result
+
+        def _deleted(result):
+            cached = self.index.by_mail.get(user["primaryEmail"])
+            if cached is not None:
+                self._remove_from_users(cached)
+            return result
+
+        return self._execute("delete", request, user, _deleted)
 
     def _insert_user(self, user, password):
-        service = build("admin", "directory_v1", credentials=self.creds)
-        # "externalIds": [{'value': '7618', 'type': 'organization'}]
-        body = {
-            "primaryEmail": user["primaryEmail"],
-            "password": password,
-            "changePasswordAtNextLogin": user[
-                "changePasswordAtNextLogin"
-            ],  # True or False
-            "orgUnitPath": user["orgUnitPath"],
-            "name": user["name"],
-        }
-        if "externalIds" in user:
-            body["externalIds"] = user["externalIds"]
+        service = self.service
+        body = insert_body(user, password)
         request = service.users().insert(body=body)
-        result = request.execute()
-        self.users.append(User(result, workspace=self))
-        # print(result)
-        return User(result, workspace=self)
+        if self._batch is None:
+            return self._execute("insert", request, user, self._store_result)
+        # reserve the address until the batch is sent
+        pending = self._make_user(body)
+        del pending["password"]
+        self._add_to_users(pending)
+
+        def _failed(error):
+            self._remove_from_users(pending)
+
+        return self._execute("insert", request, pending, self._store_result, _failed)
 
     def add_user(
         self,
@@ -237,6 +934,7 @@ class WorkspaceUsers(object):
         teacher=False,
         schoolclass=None,
         changePasswordAtNextLogin=False,
+        primaryEmail=None,
     ):
         """
         add_user(
@@ -247,64 +945,51 @@ class WorkspaceUsers(object):
             password=None,
             teacher=False,
             schoolclass=None,
-            changePasswordAtNextLogin=False
+            changePasswordAtNextLogin=False,
+            primaryEmail=None
         ):
 
+        primaryEmail is an address reserved with self.allocator beforehand,
+        by default the next free address is allocated.
+
         returns a tuple (User, password)
         """
         if not teacher and not schoolclass:
             print("you need to proivide a schoolclass for students")
             return None
 
-        user = User({}, workspace=self)
-        user["name"] = {
-            "givenName": first_name,  # First Name
-            "fullName": f"{first_name} {last_name}",  # Full Name
-            "familyName": last_name,  # Last Name
-        }
-        if teacher:
-            length = 1
-            user["orgUnitPath"] = "/Lehrer"
-            user["organizations"] = [
-                {"primary": True, "customType": "", "description": "Lehrer"}
-            ]
-            if recoveryEmail:
-                user["recoveryEmail"] = recoveryEmail
-        else:
-            length = len(first_name)
-            if type(schoolclass) == int:
-                schoolclass = str(schoolclass)
-            if not schoolclass.startswith("/"):
-                if len(schoolclass) < 3:
-                    schoolclass = "0" + schoolclass
-                schoolclass = "/Schüler/{}/{}".format(schoolclass[0:2], schoolclass)
-            user["orgUnitPath"] = schoolclass
-            user["organizations"] = [
-                {"primary": True, "customType": "", "description": "Schüler"}
-            ]
-            if schild_id:
-                user["externalIds"] = [
-                    {"value": str(schild_id), "type": "organization"}
-                ]
-        raw_username = ".".join([first_name[0:length], last_name])
-        username = sanitize_username(raw_username).lower()
-        primaryEmail = f"{username}@{self.domain}"
-        # is primaryEmail still available?
-        counter = 0
-        while self.get_user_by_mail(primaryEmail):
-            counter += 1
-            primaryEmail = f"{username}{counter}@{self.domain}"
-        user["primaryEmail"] = primaryEmail
-        user["changePasswordAtNextLogin"] = changePasswordAtNextLogin
+        user = User(
+            new_user_data(
+                first_name,
+                last_name,
+                recoveryEmail,
+                schild_id,
+                teacher,
+                schoolclass,
+                changePasswordAtNextLogin,
+            ),
+            workspace=self,
+        )
         if self.get_user_by_schild_id(schild_id):
-            print(
-                "already exists! UPDATE! (please reload users when done. Hint: .refresh() method)"
-            )
+            print("already exists! UPDATE!")
             user["primaryEmail"] = self.get_user_by_schild_id(schild_id)["primaryEmail"]
             return self.update_user(user), None
+        # the allocator keeps the address reserved, so concurrent or
+        # batched add_user calls never pick the same one
+        if not primaryEmail:
+            username = username_for(first_name, last_name, teacher)
+            if not self.complete:
+                # load every address starting with username
+                self.fetch(email=f"{username}*")
+            primaryEmail = self.allocator.allocate(username)
+        user["primaryEmail"] = primaryEmail
         if not password:
             password = generate_password()
-        return self._insert_user(user, password), password
+        try:
+            return self._insert_user(user, password), password
+        except Exception:
+            self.allocator.release(primaryEmail)
+            raise
 
     def add_user_interactive(self):
         print("is teacher? [n]/y\n > ", end="")
@@ -339,92 +1024,424 @@ class WorkspaceUsers(object):
             )
 
     def add_schild_students(
-        self, schild_users, onboarding=False, write_existing_users_too=False
+        self,
+        schild_users,
+        onboarding=False,
+        write_existing_users_too=False,
+        batch_size=None,
+        workers=None,
+        queries_per_second=None,
+        password_export=None,
+        journal=None,
     ):
+        """
+        schild_users is a list of SchildUser or an iterator like
+        SchildUsers.iter_users(), which is consumed lazily.
+
+        passwords of new accounts go to password_export (a PasswordExport,
+        by default passwords_{Klasse}.csv in the working directory), which is
+        written every CHECKPOINT_EVERY accounts and at the end of the run,
+        also if it fails.
+
+        with batch_size set, the accounts are created in batches. passwords
+        are exported after each batch and only for successful inserts,
+        the failed BatchResults are returned.
+
+        with workers set, the accounts are created by a pool of threads,
+        limited to queries_per_second requests (default: self.rate_limiter
+        or DEFAULT_QUERIES_PER_SECOND). a list of
+        (schild_user, error) tuples is returned for failed students.
+
+        with a Journal, every student is recorded as done once the password
+        is exported and skipped when the job runs again with the same journal.
+        """
         requirend_keys = ["Vorname", "Nachname", "Klasse", "Interne ID-Nummer"]
-        test_user = schild_users[0]
+        if batch_size and workers:
+            raise ValueError("use either batch_size or workers")
+        # schild_users may be a generator like SchildUsers.iter_users()
+        remaining = iter(schild_users)
+        test_user = next(remaining, None)
+        if test_user is None:
+            return None
         if not set(requirend_keys).issubset(set(test_user.keys())):
             print("Err - These Keys are needed: {}".format(requirend_keys))
             return None
-        amount_users = len(schild_users)
-        for i, user in enumerate(schild_users):
-            base_org_unit = "/Schüler"
-            if onboarding:
-                base_org_unit += "/onboarding"
-            with open(f"passwords_{user['Klasse']}.csv", "a") as log:
-                if user["Klasse"] in ["EF", "Q1", "Q2"]:
-                    schoolclass = f"{base_org_unit}/Oberstufe/{user['Klasse']}"
-                elif user["Klasse"] == "IPD":
-                    schoolclass = f"{base_org_unit}/{user['Klasse']}"
-                else:
-                    schoolclass = (
-                        f"{base_org_unit}/{user['Klasse'][:2]}/{user['Klasse']}"
+        self.ensure_complete()
+        amount_users = None
+        addresses = {}
+        if hasattr(schild_users, "__len__"):
+            amount_users = len(schild_users)
+            addresses = self._allocate_schild_addresses(schild_users)
+        schild_users = chain([test_user], remaining)
+        if password_export is None:
+            password_export = PasswordExport()
+        try:
+            with password_export:
+                if workers:
+                    return self._add_schild_students_concurrently(
+                        list(schild_users),
+                        onboarding,
+                        write_existing_users_too,
+                        workers,
+                        queries_per_second,
+                        addresses,
+                        password_export,
+                        journal,
                     )
-                workspace_user, pw = self.add_user(
-                    first_name=user["Vorname"],
-                    last_name=user["Nachname"],
-                    schild_id=user["Interne ID-Nummer"],
-                    teacher=False,
-                    schoolclass=schoolclass,
+                return self._add_schild_students(
+                    schild_users,
+                    amount_users,
+                    onboarding,
+                    write_existing_users_too,
+                    batch_size,
+                    addresses,
+                    password_export,
+                    journal,
                 )
-                # default: write only new users to file
-                if write_existing_users_too:
-                    if not pw:
-                        pw = "****"
-                if pw:
-                    log.write(
-                        "{};{};{};{}\n".format(
-                            workspace_user["name"]["givenName"],
-                            workspace_user["name"]["familyName"],
-                            workspace_user["primaryEmail"],
+        finally:
+            self._release_unused(addresses)
+
+    def _add_schild_students(
+        self,
+        schild_users,
+        amount_users,
+        onboarding,
+        write_existing_users_too,
+        batch_size,
+        addresses,
+        password_export,
+        journal,
+    ):
+        # passwords and journal entries of batched users wait for the
+        # result of their batch
+        pending_passwords = {}
+        pending_ops = {}
+        # the other students are journaled as done once their password is written
+        unsaved_ops = []
+
+        def _checkpoint():
+            password_export.checkpoint()
+            for op in unsaved_ops:
+                journal.complete(op)
+            unsaved_ops.clear()
+
+        def _export_flushed(results):
+            for result in results:
+                pending = pending_passwords.pop(id(result.user), None)
+                if pending and result.ok:
+                    password_export.add(*pending)
+                op = pending_ops.pop(id(result.user), None)
+                if op and result.ok:
+                    journal.complete(op)
+                elif op:
+                    journal.fail(op, result.error)
+            password_export.checkpoint()
+
+        progress = Progress("add_schild_students", amount_users, quiet=self.quiet)
+        with progress, self._bulk_job(batch_size) as batch:
+            if batch is not None:
+                batch.on_flush = _export_flushed
+            for user in schild_users:
+                workspace_user, pw = self._add_schild_student(
+                    user, onboarding, write_existing_users_too, addresses, journal
+                )
+                if workspace_user is None:
+                    progress.skip()
+                    continue
+                op = f"add:{user['Interne ID-Nummer']}"
+                if batch is not None:
+                    if journal is not None:
+                        pending_ops[id(workspace_user)] = op
+                    if pw:
+                        pending_passwords[id(workspace_user)] = (
+                            user["Klasse"],
+                            workspace_user,
                             pw,
                         )
-                    )
-                print(
-                    f"processing no. {i+1} / {amount_users} - {workspace_user['primaryEmail']}"
+                else:
+                    if journal is not None:
+                        unsaved_ops.append(op)
+                    if pw:
+                        password_export.add(user["Klasse"], workspace_user, pw)
+                    if max(len(password_export), len(unsaved_ops)) >= CHECKPOINT_EVERY:
+                        _checkpoint()
+                progress.update(workspace_user["primaryEmail"])
+        if batch is None:
+            _checkpoint()
+        if batch is not None:
+            for error in batch.errors:
+                print("failed:", error)
+            return batch.errors
+
+    def _add_schild_students_concurrently(
+        self,
+        schild_users,
+        onboarding,
+        write_existing_users_too,
+        workers,
+        queries_per_second,
+        addresses,
+        password_export,
+        journal,
+    ):
+        progress = Progress("add_schild_students", len(schild_users), quiet=self.quiet)
+
+        def _add(user):
+            try:
+                workspace_user, pw = self._add_schild_student(
+                    user, onboarding, write_existing_users_too, addresses, journal
                 )
-        self.users = self._get_users()
+            except Exception:
+                progress.fail(user["Interne ID-Nummer"])
+                raise
+            if workspace_user is None:
+                progress.skip()
+            else:
+                progress.update(workspace_user["primaryEmail"])
+            return workspace_user, pw
+
+        with progress, self._rate_limited(queries_per_second), self._bulk_job():
+            results = run_concurrently(
+                [lambda user=user: _add(user) for user in schild_users],
+                workers=workers,
+            )
+        failed = []
+        for user, (result, error) in zip(schild_users, results):
+            if error is not None:
+                print("failed:", user, error)
+                failed.append((user, error))
+                continue
+            workspace_user, pw = result
+            if pw:
+                password_export.add(user["Klasse"], workspace_user, pw)
+        password_export.checkpoint()
+        if journal is not None:
+            for user, (result, error) in zip(schild_users, results):
+                if error is None and result[0] is not None:
+                    journal.complete(f"add:{user['Interne ID-Nummer']}")
+        return failed
+
+    def _allocate_schild_addresses(self, schild_users):
+        """
+        reserves addresses for all new students in one pass, returns
+        {schild id: address}. students are ordered by schild id, so a rerun
+        assigns the same addresses.
+        """
+        requests = [
+            (
+                str(user["Interne ID-Nummer"]),
+                username_for(user["Vorname"], user["Nachname"]),
+            )
+            for user in schild_users
+            if not self.get_user_by_schild_id(user["Interne ID-Nummer"])
+        ]
+        return self.allocator.allocate_batch(requests)
+
+    def _release_unused(self, addresses):
+        """releases the reserved addresses no account was created with"""
+        with self._lock:
+            for address in addresses.values():
+                if address not in self.index.by_mail:
+                    self.allocator.release(address)
+
+    def _add_schild_student(
+        self, user, onboarding, write_existing_users_too, addresses=None, journal=None
+    ):
+        """
+        returns (None, None) for students the journal marks as done. the
+        caller completes the journal entry once the password is exported.
+        """
+        schild_id = str(user["Interne ID-Nummer"])
+        primaryEmail = (addresses or {}).get(schild_id)
+        op = f"add:{schild_id}"
+        if journal is not None:
+            if journal.is_done(op):
+                return None, None
+            planned = journal.planned.get(op, {}).get("primaryEmail")
+            if planned and not self.get_user_by_schild_id(schild_id):
+                # the insert may have been sent before the job was interrupted
+                self.fetch_user(planned)
+            journal.plan(op, primaryEmail=primaryEmail)
+        schoolclass = org_unit_for_class(user["Klasse"], onboarding)
+        try:
+            workspace_user, pw = self.add_user(
+                first_name=user["Vorname"],
+                last_name=user["Nachname"],
+                schild_id=schild_id,
+                teacher=False,
+                schoolclass=schoolclass,
+                primaryEmail=primaryEmail,
+            )
+        except Exception as e:
+            if journal is not None:
+                journal.fail(op, e)
+            raise
+        # default: write only new users to file
+        if write_existing_users_too:
+            if not pw:
+                pw = "****"
+        return workspace_user, pw
 
     def refresh(self):
+        """reloads the whole domain, only needed after changes made elsewhere"""
         self.users = self._get_users()
+        self.complete = True
+        self.save_snapshot(full=True)
 
-    # TODO: handle suspended users
     def update_user(self, user):
-        service = build("admin", "directory_v1", credentials=self.creds)
-        if "suspended" in user:
+        """
+        saves the changed fields of user with a users().patch request.
+
+        for a user from self.users only the fields assigned since it was
+        loaded are sent (assign whole values, user["name"]["fullName"] = ...
+        is not tracked). for other User objects, e.g. built by add_user,
+        the fields that differ from the cached user are sent.
+        no request is made if nothing changed. if the patch fails, the
+        fields of a user from self.users are set back to the loaded values.
+        """
+        cached = self.index.by_mail.get(user["primaryEmail"])
+        body = patch_body(user, cached)
+        if not body:
+            if self._batch is not None:
+                self._batch.skip("update", user)
+                return user
+            return cached if cached is not None else user
+        request = self.service.users().patch(userKey=user["primaryEmail"], body=body)
+
+        def _failed(error):
+            # the server kept the old values, so does the local userlist
+            user.rollback(body)
+
+        on_error = _failed if cached is user else None
+        return self._execute("update", request, user, self._store_result, on_error)
+
+    def rotate_passwords(
+        self,
+        org_unit,
+        batch_size=None,
+        workers=None,
+        queries_per_second=None,
+        password_export=None,
+        changePasswordAtNextLogin=False,
+        length=2,
+    ):
+        """
+        sets a new password for every user in org_unit (and its sub org
+        units), e.g. rotate_passwords("/Schüler/05/05a").
+
+        all passwords are generated up front, each user gets a patch request
+        with only the password. the requests are sent in batches of
+        batch_size (default: DEFAULT_BATCH_SIZE), or by a pool of `workers`
+        threads, limited like in add_schild_students. batch_size=0 updates
+        the users one by one. the passwords of successful updates are
+        written to password_export (by default new_passwords_{Klasse}.csv,
+        Klasse is the last part of the org unit, so the passwords of the
+        onboarding are kept) in a single write at the end. returns a list of
+        (user, error) tuples.
+        """
+        if batch_size and workers:
+            raise ValueError("use either batch_size or workers")
+        if batch_size is None and not workers:
+            batch_size = DEFAULT_BATCH_SIZE
+        users = self.fetch(org_unit=org_unit)
+        passwords = generate_passwords(len(users), length)
+        changed = []
+        failed = []
+
+        def _rotate(user, password):
             body = {
-                "orgUnitPath": user["orgUnitPath"],
-                "name": user["name"],
-                "suspended": user["suspended"],
+                "password": password,
+                "changePasswordAtNextLogin": changePasswordAtNextLogin,
             }
+            request = self.service.users().patch(
+                userKey=user["primaryEmail"], body=body
+            )
+            return self._execute("password", request, user, self._store_result)
+
+        progress = Progress("rotate_passwords", len(users), quiet=self.quiet)
+        if workers or not batch_size:
+
+            def _rotate_now(user, password):
+                try:
+                    _rotate(user, password)
+                except Exception:
+                    progress.fail(user["primaryEmail"])
+                    raise
+                progress.update(user["primaryEmail"])
+
+            with progress, self._rate_limited(queries_per_second), self._bulk_job():
+                results = run_concurrently(
+                    [
+                        lambda user=user, password=password: _rotate_now(user, password)
+                        for user, password in zip(users, passwords)
+                    ],
+                    workers=workers or 1,
+                )
+            for user, password, (_, error) in zip(users, passwords, results):
+                if error is None:
+                    changed.append((user, password))
+                else:
+                    failed.append((user, error))
         else:
-            body = {"orgUnitPath": user["orgUnitPath"], "name": user["name"]}
+            rotated = {}
 
-        if "externalIds" in user:
-            body["externalIds"] = user["externalIds"]
-        if "password" in user:
-            body["password"] = user["password"]
-        request = service.users().update(userKey=user["primaryEmail"], body=body)
-        result = request.execute()
-        return User(result, workspace=self)
+            def _flushed(results):
+                for result in results:
+                    user, password = rotated.pop(id(result.user))
+                    if result.ok:
+                        changed.append((user, password))
+                        progress.update(user["primaryEmail"])
+                    else:
+                        failed.append((user, result.error))
+                        progress.fail(user["primaryEmail"])
 
-    def get_not_agreed_users(self):
-        not_agreed = [user for user in self.users if user["agreedToTerms"] == False]
-        return not_agreed
+            with progress, self._bulk_job(batch_size) as batch:
+                batch.on_flush = _flushed
+                for user, password in zip(users, passwords):
+                    rotated[id(user)] = (user, password)
+                    _rotate(user, password)
+        if password_export is None:
+            password_export = PasswordExport(prefix="new_passwords")
+        with password_export:
+            for user, password in changed:
+                klasse = user["orgUnitPath"].rsplit("/", 1)[-1]
+                password_export.add(klasse, user, password)
+        for user, error in failed:
+            print("failed:", user["primaryEmail"], error)
+        return failed
 
-    def get_former_students(self, schild_object):
-        former_users = []
-        active_schild_ids = [user.schildID for user in schild_object.users]
+    def classify(self, schild_object=None):
+        """
+        sorts the users into categories in a single pass:
+            former_students: students whose schild id is not in schild_object
+            students_without_schild_id: students without externalIds
+            not_agreed: users who did not agree to the terms yet
+        former_students is only filled when a schild_object is given.
+        """
+        self.ensure_complete()
+        active_schild_ids = schild_object.schild_ids if schild_object else None
+        result = {
+            "former_students": [],
+            "students_without_schild_id": [],
+            "not_agreed": [],
+        }
         for user in self.users:
-            if user.is_student():
-                if not user.schildId in active_schild_ids:
-                    former_users.append(user)
-        return former_users
+            if user.get("agreedToTerms") == False:
+                result["not_agreed"].append(user)
+            if not user.is_student():
+                continue
+            schild_id = user.schildId
+            if schild_id is None:
+                result["students_without_schild_id"].append(user)
+            if active_schild_ids is not None and schild_id not in active_schild_ids:
+                result["former_students"].append(user)
+        return result
 
+    def get_not_agreed_users(self):
+        return self.classify()["not_agreed"]
 
-# TODO: delete suspended and old users ...
-# now = datetime.now().astimezone()
-# now - datetime.fromisoformat(s.data['lastLoginTime']) > timedelta(days=360)
+    def get_former_students(self, schild_object):
+        return self.classify(schild_object)["former_students"]
 
 # TODO:
 # - tidy up
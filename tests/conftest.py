@@ -0,0 +1,5 @@
+import os
+import sys
+
+# make the fake directory api importable from the test modules
+sys.path.insert(0, os.path.dirname(__file__))
@@ -0,0 +1,353 @@
+"""
+a small local stand-in for the users part of the Directory API.
+
+    with FakeDirectory() as directory:
+        workspace = WorkspaceUsers(
+            "example.org",
+            creds=AnonymousCredentials(),
+            api_endpoint=directory.url,
+        )
+
+supports users list/get/insert/update/patch/delete and the http batch endpoint.
+every handled call is counted in `directory.calls`.
+
+student() builds the user fixtures of the tests, DirectoryTestCase starts
+a FakeDirectory for every test.
+"""
+import email
+import json
+import re
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+USERS_PATH = "/admin/directory/v1/users"
+
+
+class FakeDirectory(object):
+    def __init__(self, users=(), latency=0.0, page_size=None):
+        self.users = {}
+        for user in users:
+            self.users[user["primaryEmail"]] = self._complete(user)
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = Counter()
+        # (operation, key, body) of every handled call
+        self.log = []
+        self.fail = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        directory = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.directory = directory
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _complete(user):
+        user = json.loads(json.dumps(user))
+        user.setdefault("kind", "admin#directory#user")
+        user.setdefault("orgUnitPath", "/")
+        user.setdefault("suspended", False)
+        user.setdefault("agreedToTerms", True)
+        user.setdefault("lastLoginTime", "1970-01-01T00:00:00.000Z")
+        user.setdefault("creationTime", "2020-08-01T00:00:00.000Z")
+        name = user.setdefault("name", {})
+        name.setdefault(
+            "fullName", f"{name.get('givenName', '')} {name.get('familyName', '')}"
+        )
+        return user
+
+    # -- request handling, shared by plain and batched requests
+
+    def handle(self, method, url, body):
+        parts = urlsplit(url)
+        path = unquote(parts.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if not path.startswith(USERS_PATH):
+            return 404, _error(404, "notFound")
+        key = path[len(USERS_PATH) :].strip("/")
+        operation = {
+            ("GET", False): "list",
+            ("GET", True): "get",
+            ("POST", False): "insert",
+            ("PUT", True): "update",
+            ("PATCH", True): "patch",
+            ("DELETE", True): "delete",
+        }.get((method, bool(key)))
+        if operation is None:
+            return 405, _error(405, "methodNotAllowed")
+        with self._lock:
+            self.calls[operation] += 1
+            self.log.append((operation, key, body))
+            # fail[(operation, key)] is a status code or a list of status codes
+            # that are returned for the next calls only
+            status = self.fail.get((operation, key or (body or {}).get("primaryEmail")))
+            if isinstance(status, list):
+                status = status.pop(0) if status else None
+            if status:
+                return status, _error(status, "failure")
+            return getattr(self, "_" + operation)(key, params, body)
+
+    def _list(self, key, params, body):
+        users = sorted(self.users.values(), key=lambda user: user["primaryEmail"])
+        users = [user for user in users if _matches(user, params.get("query", ""))]
+        max_results = int(params.get("maxResults", 100))
+        if self.page_size:
+            max_results = min(max_results, self.page_size)
+        start = int(params.get("pageToken", 0))
+        page = users[start : start + max_results]
+        result = {"kind": "admin#directory#users", "users": page}
+        if start + max_results < len(users):
+            result["nextPageToken"] = str(start + max_results)
+        return 200, _project(result, params.get("fields"))
+
+    def _get(self, key, params, body):
+        if key not in self.users:
+            return 404, _error(404, "notFound")
+        return 200, _project(self.users[key], params.get("fields"))
+
+    def _insert(self, key, params, body):
+        if body["primaryEmail"] in self.users:
+            return 409, _error(409, "duplicate")
+        user = self._complete({k: v for k, v in body.items() if k != "password"})
+        self.users[user["primaryEmail"]] = user
+        return 200, user
+
+    def _update(self, key, params, body):
+        # users.update supports patch semantics as well
+        if key not in self.users:
+            return 404, _error(404, "notFound")
+        user = self.users[key]
+        for field, value in body.items():
+            if field != "password":
+                user[field] = value
+        return 200, user
+
+    _patch = _update
+
+    def _delete(self, key, params, body):
+        if self.users.pop(key, None) is None:
+            return 404, _error(404, "notFound")
+        return 204, None
+
+    def handle_batch(self, content_type, payload):
+        with self._lock:
+            self.calls["batch"] += 1
+        message = email.message_from_bytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + payload
+        )
+        boundary = "batch_fake_boundary"
+        out = []
+        for part in message.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            raw = part.get_payload(decode=False)
+            head, _, body = raw.replace("\r\n", "\n").partition("\n\n")
+            request_line = head.split("\n")[0]
+            method, url, _ = request_line.split(" ")
+            data = json.loads(body) if body.strip() else None
+            status, result = self.handle(method, url, data)
+            content = json.dumps(result) if result is not None else ""
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {_reason(status)}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(content.encode())}\r\n\r\n"
+                f"{content}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode()
+
+
+def student(i, org_unit="/Schüler/05/051", given="Student"):
+    """studentI@example.org with schild id I"""
+    return {
+        "primaryEmail": f"student{i}@example.org",
+        "orgUnitPath": org_unit,
+        "name": {"givenName": given, "familyName": str(i)},
+        "externalIds": [{"value": str(i), "type": "organization"}],
+    }
+
+
+class DirectoryTestCase(unittest.TestCase):
+    """
+    starts a FakeDirectory with directory_users() (ten students of 051 by
+    default) as self.directory before every test.
+    """
+
+    page_size = None
+
+    def directory_users(self):
+        return [student(i) for i in range(10)]
+
+    def setUp(self):
+        self.directory = FakeDirectory(self.directory_users(), page_size=self.page_size)
+        self.directory.start()
+        self.addCleanup(self.directory.stop)
+
+    def new_workspace(self, **kwargs):
+        """a WorkspaceUsers object on self.directory"""
+        from google.auth.credentials import AnonymousCredentials
+
+        from schild_workspace import WorkspaceUsers
+
+        return WorkspaceUsers(
+            "example.org",
+            creds=AnonymousCredentials(),
+            api_endpoint=self.directory.url,
+            **kwargs,
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    directory = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _respond(self, status, content_type, content):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _dispatch(self):
+        if self.directory.latency:
+            time.sleep(self.directory.latency)
+        raw = self._body()
+        if self.path.rstrip("/").endswith("/batch"):
+            content_type, content = self.directory.handle_batch(
+                self.headers["Content-Type"], raw
+            )
+            return self._respond(200, content_type, content)
+        data = json.loads(raw) if raw.strip() else None
+        status, result = self.directory.handle(self.command, self.path, data)
+        content = json.dumps(result).encode() if result is not None else b""
+        self._respond(status, "application/json; charset=UTF-8", content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+def _reason(status):
+    return {200: "OK", 204: "No Content", 404: "Not Found", 409: "Conflict"}.get(
+        status, "Error"
+    )
+
+
+def _error(status, reason):
+    return {
+        "error": {
+            "code": status,
+            "message": reason,
+            "errors": [{"reason": reason, "message": reason}],
+        }
+    }
+
+
+def _matches(user, query):
+    """supports the orgUnitPath=, externalId=, email: and name: query terms"""
+    for term in re.findall(r"(\w+)([=:])('[^']*'|\S+)", query):
+        field, _, value = term
+        value = value.strip("'")
+        if field == "orgUnitPath":
+            org_unit = user.get("orgUnitPath", "/")
+            if not (org_unit == value or org_unit.startswith(value.rstrip("/") + "/")):
+                return False
+        elif field == "externalId":
+            if value not in [e["value"] for e in user.get("externalIds", [])]:
+                return False
+        elif field == "email":
+            mail = user["primaryEmail"]
+            if value.endswith("*"):
+                if not mail.startswith(value[:-1]):
+                    return False
+            elif mail != value:
+                return False
+        elif field == "name":
+            # like the api: the value has to start at the beginning of a word
+            full_name = " " + user["name"]["fullName"].casefold()
+            if " " + value.rstrip("*").casefold() not in full_name:
+                return False
+        elif field == "isSuspended":
+            if user.get("suspended", False) != (value == "true"):
+                return False
+    return True
+
+
+def _project(result, fields):
+    """very small subset of the partial response syntax: a,b,users(c,d)"""
+    if not fields:
+        return result
+    selection = _parse_fields(fields)
+    return _apply_fields(result, selection)
+
+
+def _parse_fields(fields):
+    selection = {}
+    depth = 0
+    name = ""
+    start = None
+    for i, c in enumerate(fields + ","):
+        if c == "(":
+            if depth == 0:
+                start = i + 1
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                selection[name.strip()] = _parse_fields(fields[start:i])
+                name = ""
+        elif c == "," and depth == 0:
+            if name.strip():
+                selection[name.strip()] = None
+            name = ""
+        elif depth == 0:
+            name += c
+    return selection
+
+
+def _apply_fields(value, selection):
+    if isinstance(value, list):
+        return [_apply_fields(item, selection) for item in value]
+    result = {}
+    for field, sub in selection.items():
+        if field in value:
+            result[field] = value[field] if sub is None else _apply_fields(
+                value[field], sub
+            )
+    return result
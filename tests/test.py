@@ -1,24 +1,27 @@
+import os
+import tempfile
 import unittest
-from random import (
-        sample,
-        randint,
-        random,
-        choice
-        )
-from string import (
-        ascii_letters,
-        digits
-        )
 
-import schild_to_gsuite
+import schild_workspace
+from schild_workspace.allocator import UsernameAllocator
+from schild_workspace.workspace_users import username_for
 
 
 class TestStudent(unittest.TestCase):
     def test_test_class(self):
-        assert(True)
+        self.assertTrue(hasattr(schild_workspace, "SchildUsers"))
 
-    def test_duplicates(unittest.TestCase):
-        pass
+    def test_duplicates(self):
+        allocator = UsernameAllocator("example.org")
+        username = username_for("Max", "Muster")
+        self.assertEqual(
+            [allocator.allocate(username), allocator.allocate(username)],
+            ["max.muster@example.org", "max.muster1@example.org"],
+        )
 
-    def test_wrong_keys(unittest.TestCase):
-        pass
+    def test_wrong_keys(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "schild.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("Vorname,Nachname,Klasse\nMax,Muster,05a\n")
+            self.assertIsNone(schild_workspace.SchildUsers(path).users)
@@ -0,0 +1,35 @@
+import unittest
+
+from schild_workspace.allocator import UsernameAllocator
+
+
+class TestUsernameAllocator(unittest.TestCase):
+    def setUp(self):
+        self.allocator = UsernameAllocator(
+            "example.org",
+            ["max.muster@example.org", "max.muster1@example.org", "eva.b2@example.org"],
+        )
+
+    def test_allocate_reserves(self):
+        self.assertEqual(self.allocator.allocate("max.muster"), "max.muster2@example.org")
+        self.assertEqual(self.allocator.allocate("max.muster"), "max.muster3@example.org")
+        self.assertEqual(self.allocator.allocate("eva.b"), "eva.b@example.org")
+        self.assertEqual(self.allocator.allocate("eva.b"), "eva.b1@example.org")
+        self.assertEqual(self.allocator.allocate("eva.b"), "eva.b3@example.org")
+
+    def test_release(self):
+        self.allocator.release("max.muster@example.org")
+        self.assertNotIn("max.muster@example.org", self.allocator)
+        self.assertEqual(self.allocator.allocate("max.muster"), "max.muster@example.org")
+
+    def test_batch_is_deterministic(self):
+        requests = [("3", "max.muster"), ("1", "max.muster"), ("2", "eva.b")]
+        first = UsernameAllocator("example.org").allocate_batch(requests)
+        second = UsernameAllocator("example.org").allocate_batch(list(reversed(requests)))
+        self.assertEqual(first, second)
+        self.assertEqual(first["1"], "max.muster@example.org")
+        self.assertEqual(first["3"], "max.muster1@example.org")
+
+
+if __name__ == "__main__":
+    unittest.main()
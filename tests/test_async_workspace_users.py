@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.errors import HttpError
+
+from schild_workspace import AsyncWorkspaceUsers
+from schild_workspace.passwords import PasswordExport
+
+from fake_directory import DirectoryTestCase
+
+
+class TestAsyncWorkspaceUsers(DirectoryTestCase):
+    page_size = 3
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_with_workspace(self, job, listed=True, **kwargs):
+        async def _run():
+            async with AsyncWorkspaceUsers(
+                "example.org",
+                creds=AnonymousCredentials(),
+                api_endpoint=self.directory.url,
+                **kwargs,
+            ) as workspace:
+                workspace.base_delay = 0
+                if listed:
+                    await workspace.list()
+                return workspace, await job(workspace)
+
+        return asyncio.run(_run())
+
+    def test_list_org_units(self):
+        async def _job(workspace):
+            return await workspace.list(org_units=["/Schüler/05", "/Schüler"])
+
+        workspace, users = self.run_with_workspace(_job, concurrency=2)
+        self.assertEqual(len(workspace.users), 10)
+        self.assertEqual(len(users), 10)
+        self.assertEqual(
+            workspace.get_user_by_schild_id(3)["primaryEmail"], "student3@example.org"
+        )
+        self.assertEqual(self.directory.calls["list"], 4 + 8)
+
+    def test_add_schild_students(self):
+        students = [
+            {
+                "Vorname": "Max",
+                "Nachname": "Muster",
+                "Klasse": "05a",
+                "Interne ID-Nummer": str(i),
+            }
+            for i in range(100, 120)
+        ]
+        students.append(
+            {
+                "Vorname": "Student",
+                "Nachname": "1",
+                "Klasse": "06a",
+                "Interne ID-Nummer": "1",
+            }
+        )
+        self.directory.fail[("insert", "max.muster3@example.org")] = [503]
+        self.directory.fail[("insert", "max.muster5@example.org")] = 409
+
+        async def _job(workspace):
+            return await workspace.add_schild_students(
+                students, password_export=PasswordExport(self.tmp.name)
+            )
+
+        workspace, failed = self.run_with_workspace(_job, concurrency=5)
+        self.assertEqual([user["Interne ID-Nummer"] for user, _ in failed], ["105"])
+        self.assertIsInstance(failed[0][1], HttpError)
+        self.assertEqual(len(self.directory.users), 29)
+        self.assertIn("max.muster19@example.org", self.directory.users)
+        self.assertEqual(
+            self.directory.users["student1@example.org"]["orgUnitPath"],
+            "/Schüler/06/06a",
+        )
+        self.assertEqual(workspace.metrics.retries["insert"], 1)
+        with open(os.path.join(self.tmp.name, "passwords_05a.csv")) as f:
+            self.assertEqual(len(f.readlines()), 19)
+
+    def test_move_to_next_year(self):
+        former = self.directory.users["student9@example.org"]
+        former["orgUnitPath"] = "/Schüler/Ehemalige_S1"
+
+        async def _job(workspace):
+            return await workspace.move_to_next_year(True)
+
+        workspace, failed = self.run_with_workspace(_job)
+        self.assertEqual(failed, [])
+        self.assertNotIn("student9@example.org", self.directory.users)
+        self.assertEqual(
+            self.directory.users["student0@example.org"]["orgUnitPath"],
+            "/Schüler/06/061",
+        )
+        self.assertEqual(len(workspace.users), 9)
+        self.assertEqual(self.directory.calls["patch"], 9)
+
+    def test_move_to_next_year_lists_the_domain(self):
+        async def _job(workspace):
+            return await workspace.move_to_next_year(True)
+
+        workspace, failed = self.run_with_workspace(_job, listed=False)
+        self.assertEqual(failed, [])
+        self.assertTrue(workspace.complete)
+        self.assertEqual(self.directory.calls["patch"], 10)
+
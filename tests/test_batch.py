@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from schild_workspace.journal import Journal
+from schild_workspace.passwords import PasswordExport
+
+from fake_directory import DirectoryTestCase
+
+
+class TestBatch(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workspace = self.new_workspace()
+
+    def test_updates_are_sent_in_groups(self):
+        with self.workspace.batch(4) as batch:
+            for user in self.workspace.users:
+                user["orgUnitPath"] = "/Schüler/06/061"
+                self.workspace.update_user(user)
+        self.assertEqual(self.directory.calls["batch"], 3)
+        self.assertEqual(self.directory.calls["patch"], 10)
+        self.assertEqual(len(batch.results), 10)
+        self.assertEqual(batch.errors, [])
+        self.assertEqual(len(self.workspace.get_users_by_org_unit("/Schüler/06/061")), 10)
+
+    def test_retryable_parts_are_sent_again(self):
+        self.directory.fail[("patch", "student2@example.org")] = [503, 429]
+        self.directory.fail[("patch", "student3@example.org")] = 400
+        with mock.patch("schild_workspace.batch.time.sleep") as sleep:
+            with self.workspace.batch() as batch:
+                for user in self.workspace.users[:5]:
+                    user["orgUnitPath"] = "/Schüler/06/061"
+                    self.workspace.update_user(user)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(self.directory.calls["batch"], 3)
+        self.assertEqual(
+            [result.user["primaryEmail"] for result in batch.errors],
+            ["student3@example.org"],
+        )
+        self.assertEqual(
+            self.directory.users["student2@example.org"]["orgUnitPath"],
+            "/Schüler/06/061",
+        )
+        self.assertEqual(self.workspace.metrics.retries["patch"], 2)
+
+    def test_errors_are_mapped_to_users(self):
+        self.directory.fail[("delete", "student3@example.org")] = 404
+        with self.workspace.batch() as batch:
+            for user in list(self.workspace.users[:5]):
+                self.workspace.delete_user(user)
+        self.assertEqual(len(batch.errors), 1)
+        self.assertEqual(batch.errors[0].user["primaryEmail"], "student3@example.org")
+        self.assertEqual(len(self.workspace.users), 6)
+        self.assertIsNotNone(self.workspace.get_user_by_mail("student3@example.org"))
+
+    def test_pending_inserts_reserve_addresses(self):
+        with self.workspace.batch() as batch:
+            first, _ = self.workspace.add_user("Max", "Muster", schild_id=100, schoolclass="051")
+            second, _ = self.workspace.add_user("Max", "Muster", schild_id=101, schoolclass="051")
+        self.assertEqual(first["primaryEmail"], "max.muster@example.org")
+        self.assertEqual(second["primaryEmail"], "max.muster1@example.org")
+        self.assertEqual(self.directory.calls["insert"], 2)
+        self.assertEqual(self.directory.calls["batch"], 1)
+        self.assertIn("max.muster1@example.org", self.directory.users)
+        self.assertEqual(first["kind"], "admin#directory#user")
+
+    def test_failed_batch_rolls_back_pending_inserts(self):
+        with mock.patch(
+            "googleapiclient.http.BatchHttpRequest.execute",
+            side_effect=ConnectionError("network down"),
+        ):
+            with self.assertRaises(ConnectionError):
+                with self.workspace.batch():
+                    self.workspace.add_user(
+                        "Max", "Muster", schild_id=100, schoolclass="051"
+                    )
+        self.assertIsNone(self.workspace.get_user_by_schild_id(100))
+        self.assertIsNone(self.workspace.get_user_by_mail("max.muster@example.org"))
+        user, _ = self.workspace.add_user(
+            "Max", "Muster", schild_id=100, schoolclass="051"
+        )
+        self.assertEqual(user["primaryEmail"], "max.muster@example.org")
+        self.assertEqual(self.directory.calls["insert"], 1)
+
+    def test_add_schild_students_skips_passwords_of_failed_inserts(self):
+        self.directory.fail[("insert", "eva.beispiel@example.org")] = 400
+        students = [
+            {"Vorname": "Max", "Nachname": "Muster", "Klasse": "05a", "Interne ID-Nummer": "200"},
+            {"Vorname": "Eva", "Nachname": "Beispiel", "Klasse": "05a", "Interne ID-Nummer": "201"},
+        ]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                errors = self.workspace.add_schild_students(students, batch_size=10)
+                with open("passwords_05a.csv") as f:
+                    lines = f.readlines()
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("Max;Muster;max.muster@example.org;"))
+
+    def test_add_schild_students_reports_every_student(self):
+        # the api returns more name fields than a new account has
+        self.directory.users["student1@example.org"]["name"].update(
+            fullName="Student 1", displayName="Student 1"
+        )
+        workspace = self.new_workspace()
+        students = [
+            {
+                "Vorname": given,
+                "Nachname": family,
+                "Klasse": "051",
+                "Interne ID-Nummer": i,
+            }
+            for given, family, i in [
+                ("Student", "1", "1"),
+                ("Max", "Muster", "200"),
+                ("Eva", "Muster", "201"),
+            ]
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = Journal(os.path.join(tmp, "journal.jsonl"))
+            errors = workspace.add_schild_students(
+                students,
+                write_existing_users_too=True,
+                batch_size=1,
+                password_export=PasswordExport(tmp),
+                journal=journal,
+            )
+            with open(os.path.join(tmp, "passwords_051.csv")) as f:
+                rows = [line.split(";") for line in f.read().splitlines()]
+        self.assertEqual(errors, [])
+        self.assertEqual(self.directory.calls["patch"], 0)
+        self.assertEqual(
+            [(row[2], row[3] == "****") for row in rows],
+            [
+                ("student1@example.org", True),
+                ("max.muster@example.org", False),
+                ("eva.muster@example.org", False),
+            ],
+        )
+        self.assertEqual(journal.done, {"add:1", "add:200", "add:201"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import datetime
+import io
+from unittest import mock
+
+from schild_workspace.cleanup import DELETE, SUSPEND, Cleanup, CleanupPolicy
+from schild_workspace.provisioning import DEFAULT_QUERIES_PER_SECOND, TokenBucket
+
+from fake_directory import DirectoryTestCase
+
+NOW = datetime.datetime(2026, 8, 1, tzinfo=datetime.timezone.utc)
+
+
+def _user(name, org_unit, last_login, **fields):
+    user = {
+        "primaryEmail": f"{name}@example.org",
+        "orgUnitPath": org_unit,
+        "lastLoginTime": last_login,
+        "creationTime": "2020-08-01T00:00:00.000Z",
+    }
+    user.update(fields)
+    return user
+
+
+class TestCleanup(DirectoryTestCase):
+    page_size = 2
+
+    def directory_users(self):
+        return [
+            _user("active", "/Schüler/07/071", "2026-07-01T08:00:00.000Z"),
+            _user("idle", "/Schüler/07/071", "2025-01-10T08:00:00.000Z"),
+            _user("never", "/Schüler/05/051", "1970-01-01T00:00:00.000Z"),
+            _user(
+                "new",
+                "/Schüler/05/051",
+                "1970-01-01T00:00:00.000Z",
+                creationTime="2026-07-20T00:00:00.000Z",
+            ),
+            _user(
+                "gone", "/Schüler/07/071", "2024-01-10T08:00:00.000Z", suspended=True
+            ),
+            _user("former1", "/Schüler/Ehemalige_S1", "2026-06-01T08:00:00.000Z"),
+            _user("former2", "/Schüler/Ehemalige_S2", "2026-06-01T08:00:00.000Z"),
+            _user("admin", "/Lehrer", "2024-01-01T08:00:00.000Z", isAdmin=True),
+            _user("teacher", "/Lehrer", "2026-07-30T08:00:00.000Z"),
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.workspace = self.new_workspace(lazy=True)
+        self.workspace.quiet = True
+        self.cleanup = Cleanup(
+            self.workspace,
+            [
+                CleanupPolicy(DELETE, org_unit="/Schüler/Ehemalige_S2"),
+                CleanupPolicy(DELETE, inactive_days=360, suspended=True),
+                CleanupPolicy(SUSPEND, inactive_days=360),
+            ],
+            now=NOW,
+        )
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        report = self.cleanup.run(out=out)
+        self.assertEqual(
+            report.summary(),
+            {"scanned": 9, "protected": 1, "delete": 2, "suspend": 2, "failed": 0},
+        )
+        self.assertEqual(
+            [line.split()[:2] for line in out.getvalue().splitlines()],
+            [
+                ["delete", "former2@example.org"],
+                ["delete", "gone@example.org"],
+                ["suspend", "idle@example.org"],
+                ["suspend", "never@example.org"],
+            ],
+        )
+        self.assertEqual(self.directory.calls["list"], 5)
+        self.assertEqual(self.directory.calls["delete"], 0)
+        self.assertEqual(self.directory.calls["patch"], 0)
+        self.assertEqual(self.workspace.users, [])
+
+    def test_apply(self):
+        report = self.cleanup.run(apply=True, batch_size=3, out=io.StringIO())
+        self.assertTrue(report.ok)
+        users = self.directory.users
+        self.assertNotIn("former2@example.org", users)
+        self.assertNotIn("gone@example.org", users)
+        self.assertTrue(users["idle@example.org"]["suspended"])
+        self.assertTrue(users["never@example.org"]["suspended"])
+        self.assertFalse(users["new@example.org"].get("suspended", False))
+        self.assertFalse(users["admin@example.org"].get("suspended", False))
+        self.assertIn("former1@example.org", users)
+        self.assertEqual(self.directory.calls["delete"], 2)
+
+    def test_apply_is_rate_limited(self):
+        limiter = mock.Mock(wraps=TokenBucket(1000))
+        with mock.patch(
+            "schild_workspace.workspace_users.TokenBucket", return_value=limiter
+        ) as bucket:
+            self.cleanup.run(apply=True, out=io.StringIO())
+        bucket.assert_called_once_with(DEFAULT_QUERIES_PER_SECOND)
+        # 5 pages of the listing, 2 suspensions and 2 deletions
+        self.assertEqual(limiter.acquire.call_count, 9)
+        self.assertIsNone(self.workspace.rate_limiter)
+
+    def test_failures_are_reported(self):
+        self.directory.fail[("delete", "gone@example.org")] = 400
+        report = self.cleanup.run(apply=True, out=io.StringIO())
+        self.assertFalse(report.ok)
+        self.assertEqual(
+            [result.user["primaryEmail"] for result in report.failed],
+            ["gone@example.org"],
+        )
+        self.assertNotIn("former2@example.org", self.directory.users)
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+from schild_workspace.cli import main
+
+from fake_directory import FakeDirectory
+
+CSV = """Vorname;Nachname;Klasse;Interne ID-Nummer
+Max;Muster;05a;1
+Eva;Beispiel;Q1;3
+"""
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.schild_file = os.path.join(self.tmp.name, "schild.txt")
+        with open(self.schild_file, "w", encoding="utf-8") as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = main(list(argv))
+        return code, out.getvalue()
+
+    def test_find_in_schild_export_skips_google_imports(self):
+        script = (
+            "import sys\n"
+            "from schild_workspace.cli import main\n"
+            f"main(['find', 'max', '--schild', {self.schild_file!r}])\n"
+            "assert not [m for m in sys.modules if m.startswith('googleapiclient')]\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            cwd=os.path.join(os.path.dirname(__file__), ".."),
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout, "Max Muster - 05a - 1\n")
+
+    def test_sync_and_export(self):
+        directory = FakeDirectory(
+            [
+                {
+                    "primaryEmail": "former@example.org",
+                    "orgUnitPath": "/Schüler/06/06a",
+                    "externalIds": [{"value": "9", "type": "organization"}],
+                }
+            ]
+        )
+        with directory, mock.patch(
+            "schild_workspace.credentials.get_credentials",
+            return_value=AnonymousCredentials(),
+        ):
+            api = ["--domain", "example.org", "--api-endpoint", directory.url, "--quiet"]
+            code, out = self.run_cli(
+                "sync", self.schild_file, "--apply", "--passwords-dir", self.tmp.name, *api
+            )
+            self.assertEqual(code, 0)
+            self.assertIn("create: 2, suspend: 1", out)
+            self.assertTrue(directory.users["former@example.org"]["suspended"])
+
+            code, out = self.run_cli("export", "--org-unit", "/Schüler/05", *api)
+            self.assertEqual(
+                out.splitlines()[1:],
+                [
+                    "max.muster@example.org;Max;Muster;/Schüler/05/05a;1;False;"
+                    "1970-01-01T00:00:00.000Z"
+                ],
+            )
+
+    def test_inactive_dry_run(self):
+        directory = FakeDirectory(
+            [
+                {
+                    "primaryEmail": "idle@example.org",
+                    "orgUnitPath": "/Schüler/07/071",
+                    "lastLoginTime": "2020-01-01T00:00:00.000Z",
+                }
+            ]
+        )
+        with directory, mock.patch(
+            "schild_workspace.credentials.get_credentials",
+            return_value=AnonymousCredentials(),
+        ):
+            code, out = self.run_cli(
+                "inactive", "--days", "360", "--org-unit", "/Schüler",
+                "--domain", "example.org", "--api-endpoint", directory.url, "--quiet",
+            )
+        self.assertEqual(code, 0)
+        self.assertIn("suspend idle@example.org /Schüler/07/071", out)
+        self.assertIn("dry run - scanned: 1, protected: 0, suspend: 1", out)
+        self.assertFalse(directory.users["idle@example.org"].get("suspended", False))
@@ -0,0 +1,64 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+import google.auth.credentials
+
+from schild_workspace.credentials import SharedCredentials
+
+
+class CountingCredentials(google.auth.credentials.Credentials):
+    """hands out token-1, token-2, ... valid for `lifetime` seconds"""
+
+    def __init__(self, lifetime=3600):
+        super().__init__()
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def refresh(self, request):
+        self.calls += 1
+        self.token = f"token-{self.calls}"
+        self.expiry = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        ) + datetime.timedelta(seconds=self.lifetime)
+
+
+class TestSharedCredentials(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "access_token.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_token_is_shared_through_the_cache(self):
+        first = SharedCredentials(CountingCredentials(), self.cache_path, key="a")
+        headers = {}
+        first.before_request(None, "GET", "https://example.org", headers)
+        self.assertEqual(headers["authorization"], "Bearer token-1")
+        self.assertEqual(os.stat(self.cache_path).st_mode & 0o777, 0o600)
+
+        # another process with the same account
+        source = CountingCredentials()
+        second = SharedCredentials(source, self.cache_path, key="a")
+        self.assertTrue(second.valid)
+        second.refresh(None)
+        self.assertEqual((second.token, source.calls), ("token-1", 0))
+
+        other = SharedCredentials(CountingCredentials(), self.cache_path, key="b")
+        self.assertIsNone(other.token)
+
+    def test_refreshes_before_expiry(self):
+        # tokens live 602 s, the margin of 600 s leaves 2 s until the refresh
+        source = CountingCredentials(lifetime=602)
+        creds = SharedCredentials(source, self.cache_path, margin=600, key="a").start()
+        try:
+            deadline = time.monotonic() + 10
+            while source.calls < 2 and time.monotonic() < deadline:
+                time.sleep(0.1)
+        finally:
+            creds.stop()
+        self.assertGreaterEqual(source.calls, 2)
+        self.assertEqual(creds.token, f"token-{source.calls}")
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from googleapiclient.errors import HttpError
+
+from schild_workspace.journal import Journal
+from schild_workspace.passwords import PasswordExport
+from schild_workspace.schild_users import SchildUser
+
+from fake_directory import DirectoryTestCase, student
+
+
+class TestJournal(DirectoryTestCase):
+    def directory_users(self):
+        return [student(i) for i in range(5)] + [student(9, "/Schüler/Ehemalige_S1")]
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "rollover.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _workspace(self):
+        workspace = self.new_workspace()
+        workspace.retries = 0
+        return workspace
+
+    def test_interrupted_rollover_resumes(self):
+        self.directory.fail[("patch", "student3@example.org")] = [500]
+        with self.assertRaises(HttpError):
+            self._workspace().move_to_next_year(True, journal=Journal(self.path))
+        journal = Journal(self.path)
+        self.assertEqual(len(journal.planned), 6)
+        self.assertEqual(len(journal.done), 3)
+        self.assertEqual(len(journal.failed), 1)
+
+        # the resume fetches the remaining users instead of listing the domain
+        lists = self.directory.calls["list"]
+        workspace = self.new_workspace(lazy=True)
+        workspace.move_to_next_year(True, journal=journal)
+        journal.close()
+        self.assertEqual(self.directory.calls["list"], lists)
+        self.assertEqual(self.directory.calls["get"], 3)
+        org_units = {mail: user["orgUnitPath"] for mail, user in self.directory.users.items()}
+        self.assertEqual(set(org_units.values()), {"/Schüler/06/061"})
+        self.assertEqual(len(org_units), 5)
+        self.assertEqual(len(Journal(self.path).pending()), 0)
+
+    def test_students_are_done_after_their_password_is_written(self):
+        export = PasswordExport(self.tmp.name)
+        students = [
+            SchildUser(
+                {
+                    "Vorname": "Max",
+                    "Nachname": "Muster",
+                    "Klasse": "05a",
+                    "Interne ID-Nummer": "7",
+                }
+            )
+        ]
+        with mock.patch.object(export, "checkpoint", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self._workspace().add_schild_students(
+                    students, password_export=export, journal=Journal(self.path)
+                )
+        self.assertFalse(Journal(self.path).is_done("add:7"))
+
+        self._workspace().add_schild_students(
+            students, password_export=export, journal=Journal(self.path)
+        )
+        self.assertTrue(Journal(self.path).is_done("add:7"))
+        self.assertEqual(self.directory.calls["insert"], 1)
+
+    def test_file_is_opened_once(self):
+        with mock.patch("builtins.open", wraps=open) as opened:
+            with Journal(self.path) as journal:
+                for op in ("a", "b", "c"):
+                    journal.plan(op)
+                    journal.complete(op)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(Journal(self.path).done, {"a", "b", "c"})
+
+    def test_journal_survives_cut_off_line(self):
+        journal = Journal(self.path)
+        journal.plan("a", primaryEmail="a@example.org")
+        journal.complete("a")
+        with open(self.path, "a") as f:
+            f.write('{"op": "b", "sta')
+        journal = Journal(self.path)
+        self.assertTrue(journal.is_done("a"))
+        journal.complete("c")
+        self.assertTrue(Journal(self.path).is_done("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+from schild_workspace import WorkspaceUsers
+from schild_workspace.metrics import Metrics
+from schild_workspace.progress import Progress
+
+from fake_directory import FakeDirectory
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp.name, "api.jsonl")
+        self.directory = FakeDirectory(
+            [{"primaryEmail": f"student{i}@example.org"} for i in range(5)]
+        )
+        self.directory.start()
+        self.workspace = WorkspaceUsers(
+            "example.org",
+            creds=AnonymousCredentials(),
+            api_endpoint=self.directory.url,
+            metrics=Metrics(log_path=self.log_path),
+        )
+        self.workspace.quiet = True
+
+    def tearDown(self):
+        self.directory.stop()
+        self.tmp.cleanup()
+
+    def test_requests_retries_and_bytes(self):
+        self.directory.fail[("get", "student9@example.org")] = [429]
+        with mock.patch("schild_workspace.provisioning.time.sleep"):
+            self.assertIsNone(self.workspace.fetch_user("student9@example.org"))
+        summary = self.workspace.metrics.summary()
+        self.assertEqual(summary["list"]["requests"], 1)
+        self.assertGreater(summary["list"]["bytes_received"], 0)
+        self.assertEqual(summary["get"]["requests"], 2)
+        self.assertEqual(summary["get"]["errors"], 2)
+        self.assertEqual(summary["get"]["quota_errors"], 1)
+        self.assertEqual(summary["get"]["retries"], 1)
+        with open(self.log_path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["operation"] for entry in entries], ["list", "get", "get"])
+
+    def test_batched_requests(self):
+        with self.workspace.batch(2):
+            for user in list(self.workspace.users)[:3]:
+                user["suspended"] = True
+                self.workspace.update_user(user)
+        summary = self.workspace.metrics.summary()
+        self.assertEqual(summary["batch"]["requests"], 2)
+        self.assertEqual(summary["patch"]["requests"], 3)
+        self.assertGreater(summary["patch"]["bytes_sent"], 0)
+        self.assertEqual(summary["total"]["requests"], 6)
+
+    def test_prometheus(self):
+        text = self.workspace.metrics.prometheus()
+        self.assertIn('schild_workspace_requests_total{operation="list"} 1', text)
+        self.assertIn(
+            'schild_workspace_request_duration_seconds_bucket{operation="list",le="+Inf"} 1',
+            text,
+        )
+        path = os.path.join(self.tmp.name, "schild_workspace.prom")
+        self.workspace.metrics.write_prometheus(path)
+        with open(path) as f:
+            self.assertEqual(f.read(), text)
+
+
+class TestProgress(unittest.TestCase):
+    def test_final_line(self):
+        out = io.StringIO()
+        with Progress("job", 3, out=out, interval=3600) as progress:
+            progress.update("a")
+            progress.skip()
+            progress.fail("c")
+        lines = out.getvalue().strip().split("\r")
+        self.assertTrue(lines[-1].startswith("job: 3 / 3 (100%)"))
+        self.assertIn("1 skipped, 1 failed", lines[-1])
@@ -0,0 +1,26 @@
+import unittest
+
+from schild_workspace.names import normalize_name, sanitize_username, sanitize_usernames
+
+
+class TestNames(unittest.TestCase):
+    def test_sanitize_username(self):
+        self.assertEqual(sanitize_username("J.Müller-Lüdenscheidt"), "j.mueller-luedenscheidt")
+        self.assertEqual(sanitize_username("Max.van der Groß"), "max.van-der-gross")
+        self.assertEqual(sanitize_username("N.Noémie"), "n.noemie")
+        self.assertEqual(sanitize_username("Æ.Ǘ"), ".ue")
+
+    def test_characters_without_decomposition(self):
+        self.assertEqual(sanitize_username("Ł.Dørđević"), "l.dordevic")
+        self.assertEqual(sanitize_username("Y.Yıldız"), "y.yildiz")
+        self.assertEqual(sanitize_username("A.O'Neil"), "a.oneil")
+
+    def test_batch(self):
+        self.assertEqual(sanitize_usernames(["Zoë", "Çağla"]), ["zoe", "cagla"])
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Jürgen   MÜLLER "), "juergen mueller")
+
+
+if __name__ == "__main__":
+    unittest.main()
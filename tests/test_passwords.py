@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from schild_workspace.passwords import PasswordExport
+
+
+def _user(i):
+    return {
+        "primaryEmail": f"student{i}@example.org",
+        "name": {"givenName": "Student", "familyName": str(i)},
+    }
+
+
+class TestPasswordExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _lines(self, klasse, extension="csv"):
+        with open(os.path.join(self.tmp.name, f"passwords_{klasse}.{extension}")) as f:
+            return f.read().splitlines()
+
+    def test_written_once_and_appended(self):
+        with open(os.path.join(self.tmp.name, "passwords_05a.csv"), "w") as f:
+            f.write("Old;Line;old@example.org;secret\n")
+        with PasswordExport(self.tmp.name) as export:
+            export.add("05a", _user(1), "Eisvogel Dohle")
+            export.add("05b", _user(2), "Elster Bongo")
+            self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "passwords_05b.csv")))
+        self.assertEqual(
+            self._lines("05a"),
+            ["Old;Line;old@example.org;secret", "Student;1;student1@example.org;Eisvogel Dohle"],
+        )
+        self.assertEqual(self._lines("05b"), ["Student;2;student2@example.org;Elster Bongo"])
+        self.assertEqual(os.listdir(self.tmp.name).count("passwords_05a.csv.tmp"), 0)
+
+    def test_flushed_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            with PasswordExport(self.tmp.name) as export:
+                export.add("05a", _user(1), "Eisvogel Dohle")
+                raise RuntimeError
+        self.assertEqual(len(self._lines("05a")), 1)
+
+    def test_passwords_are_only_kept_for_sheets(self):
+        with PasswordExport(self.tmp.name) as export:
+            export.add("05a", _user(1), "Eisvogel Dohle")
+        self.assertEqual(dict(export._written), {})
+
+    def test_sheets(self):
+        with PasswordExport(self.tmp.name, sheets=True) as export:
+            export.add("05a", _user(1), "Eisvogel Dohle")
+            export.checkpoint()
+            export.add("05a", _user(2), "Elster Bongo")
+        sheet = "\n".join(self._lines("05a", "txt"))
+        self.assertIn("Login:    student1@example.org", sheet)
+        self.assertIn("Passwort: Elster Bongo", sheet)
+
+
+if __name__ == "__main__":
+    unittest.main()
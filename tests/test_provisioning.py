@@ -0,0 +1,104 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+from schild_workspace import WorkspaceUsers
+from schild_workspace.provisioning import DEFAULT_QUERIES_PER_SECOND, TokenBucket
+
+from fake_directory import FakeDirectory
+
+
+class TestProvisioning(unittest.TestCase):
+    def setUp(self):
+        self.directory = FakeDirectory(latency=0.01)
+        self.directory.start()
+        self.workspace = WorkspaceUsers(
+            "example.org",
+            creds=AnonymousCredentials(),
+            api_endpoint=self.directory.url,
+        )
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        self.directory.stop()
+
+    def test_concurrent_workers_allocate_unique_addresses(self):
+        students = [
+            {"Vorname": "Max", "Nachname": "Muster", "Klasse": "05a", "Interne ID-Nummer": str(i)}
+            for i in range(20)
+        ]
+        failed = self.workspace.add_schild_students(students, workers=8, queries_per_second=1000)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(self.directory.users), 20)
+        self.assertIn("max.muster@example.org", self.directory.users)
+        self.assertIn("max.muster19@example.org", self.directory.users)
+        with open("passwords_05a.csv") as f:
+            self.assertEqual(len(f.readlines()), 20)
+
+    def test_workers_keep_the_configured_rate_limiter(self):
+        students = [
+            {
+                "Vorname": "Eva",
+                "Nachname": "Muster",
+                "Klasse": "05a",
+                "Interne ID-Nummer": str(i),
+            }
+            for i in range(3)
+        ]
+        limiter = self.workspace.rate_limiter = mock.Mock(wraps=TokenBucket(1000))
+        self.assertEqual(self.workspace.add_schild_students(students, workers=2), [])
+        self.assertIs(self.workspace.rate_limiter, limiter)
+        self.assertEqual(limiter.acquire.call_count, 3)
+
+    def test_rotated_passwords_are_exported_separately(self):
+        students = [
+            {
+                "Vorname": "Eva",
+                "Nachname": "Muster",
+                "Klasse": "05a",
+                "Interne ID-Nummer": str(i),
+            }
+            for i in range(3)
+        ]
+        self.workspace.add_schild_students(students, workers=2)
+        with mock.patch(
+            "schild_workspace.workspace_users.TokenBucket", wraps=TokenBucket
+        ) as bucket:
+            failed = self.workspace.rotate_passwords("/Schüler/05/05a", workers=2)
+        self.assertEqual(failed, [])
+        bucket.assert_called_once_with(DEFAULT_QUERIES_PER_SECOND)
+        self.assertIsNone(self.workspace.rate_limiter)
+        with open("passwords_05a.csv") as f:
+            onboarding = f.readlines()
+        with open("new_passwords_05a.csv") as f:
+            rotated = f.readlines()
+        self.assertEqual(len(onboarding), 3)
+        self.assertEqual(len(rotated), 3)
+        self.assertFalse(set(onboarding) & set(rotated))
+
+    def test_rate_limit_errors_are_retried(self):
+        self.directory.fail[("insert", "max.muster@example.org")] = [429, 503]
+        self.workspace.retries = 3
+        with mock.patch("schild_workspace.provisioning.time.sleep"):
+            user, _ = self.workspace.add_user("Max", "Muster", schoolclass="051")
+        self.assertEqual(user["primaryEmail"], "max.muster@example.org")
+        self.assertEqual(self.directory.calls["insert"], 3)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+from googleapiclient.errors import HttpError
+
+from schild_workspace import SchildUsers
+from schild_workspace.passwords import PasswordExport
+from schild_workspace.reconcile import plan_sync
+from schild_workspace.schild_users import SchildUser
+
+from fake_directory import DirectoryTestCase, student
+
+
+def _schild(i, klasse, given="Student"):
+    return SchildUser(
+        {"Vorname": given, "Nachname": str(i), "Klasse": klasse, "Interne ID-Nummer": str(i)}
+    )
+
+
+class TestReconcile(DirectoryTestCase):
+    def directory_users(self):
+        return [
+            student(1, "/Schüler/05/05a"),
+            student(2, "/Schüler/05/05a"),
+            student(3, "/Schüler/05/05b"),
+            student(4, "/Schüler/06/06a"),
+            {"primaryEmail": "teacher@example.org", "orgUnitPath": "/Lehrer"},
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.workspace = self.new_workspace()
+        self.schild = SchildUsers()
+        self.schild.users = [
+            _schild(1, "05a"),
+            _schild(2, "05b"),
+            _schild(3, "05b", given="Renamed"),
+            _schild(5, "05a"),
+        ]
+
+    def test_plan_contains_only_real_changes(self):
+        plan = plan_sync(self.schild, self.workspace)
+        self.assertEqual(
+            plan.summary(), {"create": 1, "move": 1, "rename": 1, "suspend": 1, "noop": 1}
+        )
+        self.assertEqual(len(plan), 4)
+        self.assertEqual(self.directory.calls["patch"], 0)
+
+    def test_apply(self):
+        plan = plan_sync(self.schild, self.workspace)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                plan.apply()
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(self.directory.calls["patch"], 3)
+        self.assertEqual(self.directory.calls["insert"], 1)
+        users = self.directory.users
+        self.assertEqual(users["student2@example.org"]["orgUnitPath"], "/Schüler/05/05b")
+        self.assertEqual(users["student3@example.org"]["name"]["givenName"], "Renamed")
+        self.assertTrue(users["student4@example.org"]["suspended"])
+        self.assertIn("student.5@example.org", users)
+        self.assertEqual(len(plan_sync(self.schild, self.workspace)), 0)
+
+    def test_suspended_students_in_schild_are_reactivated(self):
+        self.directory.users["student1@example.org"]["suspended"] = True
+        self.directory.users["student2@example.org"]["suspended"] = True
+        self.workspace.refresh()
+        plan = plan_sync(self.schild, self.workspace)
+        self.assertEqual(plan.summary()["reactivate"], 2)
+        self.assertNotIn("noop", plan.summary())
+        with tempfile.TemporaryDirectory() as tmp:
+            plan.apply(password_export=PasswordExport(tmp))
+        users = self.directory.users
+        self.assertFalse(users["student1@example.org"]["suspended"])
+        self.assertFalse(users["student2@example.org"]["suspended"])
+        # moved and reactivated with a single patch
+        self.assertEqual(
+            users["student2@example.org"]["orgUnitPath"], "/Schüler/05/05b"
+        )
+        self.assertEqual(self.directory.calls["patch"], 4)
+
+    def test_passwords_survive_a_failed_request(self):
+        self.schild.users += [_schild(6, "05a", given="Max"), _schild(7, "05a", given="Eva")]
+        self.directory.fail[("insert", "eva.7@example.org")] = 400
+        plan = plan_sync(self.schild, self.workspace)
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(HttpError):
+                plan.apply(password_export=PasswordExport(tmp))
+            with open(os.path.join(tmp, "passwords_05a.csv")) as f:
+                mails = [line.split(";")[2] for line in f.read().splitlines()]
+        self.assertEqual(mails, ["student.5@example.org", "max.6@example.org"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from schild_workspace import SchildUsers
+
+CSV = """﻿Vorname;Nachname;Klasse;Interne ID-Nummer;Geburtsdatum;Konfession
+Max;Muster;05a;1;01.01.2014;rk
+;Test;05a;2;;
+Eva;Beispiel;Q1;3;02.02.2008;ev
+"""
+
+
+class TestSchildUsers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "schild.txt")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_keeps_all_columns(self):
+        schild = SchildUsers(self.path)
+        self.assertEqual(len(schild.users), 2)
+        self.assertEqual(schild.users[0]["Konfession"], "rk")
+        self.assertEqual(schild.schild_ids, {"1", "3"})
+
+    def test_iter_users_projects_columns(self):
+        schild = SchildUsers()
+        schild.schild_file = self.path
+        users = schild.iter_users(columns=["Geburtsdatum"])
+        first = next(users)
+        self.assertEqual(
+            list(first.keys()),
+            ["Vorname", "Nachname", "Klasse", "Interne ID-Nummer", "Geburtsdatum"],
+        )
+        self.assertEqual([user.schildID for user in users], ["3"])
+
+    def test_compact_records(self):
+        schild = SchildUsers()
+        schild.schild_file = self.path
+        first = next(schild.iter_users(compact=True))
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual(repr(first), "Max Muster - 05a - 1")
+        self.assertEqual(first["Klasse"], "05a")
+        self.assertEqual(first.schildID, "1")
+
+    def test_invalid_header(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("Vorname,Nachname,Klasse\nMax,Muster,05a\n")
+        self.assertIsNone(SchildUsers(self.path).users)
+        self.assertEqual(list(SchildUsers(self.path).iter_users()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from schild_workspace import SchildUsers
+from schild_workspace.schild_users import SchildUser
+from schild_workspace.search import NameIndex
+
+
+def _schild(first, last, klasse):
+    return SchildUser(
+        {"Vorname": first, "Nachname": last, "Klasse": klasse, "Interne ID-Nummer": "1"}
+    )
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.schild = SchildUsers()
+        self.schild.users = [
+            _schild("Jürgen", "Müller", "05a"),
+            _schild("Anna", "Mueller", "06b"),
+            _schild("Max", "Muster", "05a"),
+            _schild("José", "Schmidt", "Q1"),
+        ]
+
+    def test_substring_search(self):
+        matches = self.schild.find_users("mü")
+        self.assertEqual([match["index"] for match in matches], [0])
+        matches = self.schild.find_users("muster")
+        self.assertEqual([match["index"] for match in matches], [2])
+
+    def test_umlauts_and_typos(self):
+        hits = [match["index"] for match in self.schild.find_users("Mueller", fuzzy=True)]
+        self.assertEqual(sorted(hits), [0, 1])
+        hits = [match["index"] for match in self.schild.find_users("Jose Schmitt", fuzzy=True)]
+        self.assertEqual(hits[0], 3)
+
+    def test_filter_by_class(self):
+        matches = self.schild.find_users("Müller", fuzzy=True, school_class="06b")
+        self.assertEqual([match["index"] for match in matches], [1])
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        names = ["Jürgen Müller", "Anna Mueller", "Max Muster", "Lea Weber"]
+        self.index = NameIndex(names, lambda name: name)
+
+    def test_substrings_are_never_pruned(self):
+        self.assertEqual(sorted(i for _, i in self.index.search("uell")), [0, 1])
+        self.assertEqual([i for _, i in self.index.search("webe")], [3])
+
+    def test_min_score(self):
+        hits = self.index.search("Max Mustre")
+        self.assertEqual([i for _, i in hits], [2])
+        self.assertEqual(self.index.search("Max Mustre", min_score=0.9), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from google.auth.credentials import AnonymousCredentials
+
+from schild_workspace.tenants import ROLLOVER, Tenant, load_tenants, run_tenants
+
+from fake_directory import FakeDirectory
+
+CSV = """Vorname;Nachname;Klasse;Interne ID-Nummer
+Max;Muster;05a;1
+Eva;Beispiel;Q1;3
+"""
+
+
+class TestTenants(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directories = {
+            "gym": FakeDirectory(
+                [
+                    {
+                        "primaryEmail": "former@gym.example.org",
+                        "orgUnitPath": "/Schüler/06/06a",
+                        "externalIds": [{"value": "9", "type": "organization"}],
+                    }
+                ]
+            ),
+            "rs": FakeDirectory(
+                [
+                    {
+                        "primaryEmail": "eva.beispiel@rs.example.org",
+                        "orgUnitPath": "/Schüler/Oberstufe/Q1",
+                        "name": {"givenName": "Eva", "familyName": "Beispiel"},
+                        "externalIds": [{"value": "3", "type": "organization"}],
+                    }
+                ]
+            ),
+        }
+        for directory in self.directories.values():
+            directory.start()
+        entries = []
+        for name, directory in self.directories.items():
+            os.makedirs(os.path.join(self.tmp.name, name))
+            with open(os.path.join(self.tmp.name, name, "schild.txt"), "w") as f:
+                f.write(CSV)
+            entries.append(
+                {
+                    "name": name,
+                    "domain": f"{name}.example.org",
+                    "schild_file": f"{name}/schild.txt",
+                    "secret_dir": f"{name}/secret",
+                    "output_dir": f"{name}/out",
+                    "queries_per_second": 100,
+                    "api_endpoint": directory.url,
+                }
+            )
+        self.config = os.path.join(self.tmp.name, "schools.json")
+        with open(self.config, "w") as f:
+            json.dump({"tenants": entries}, f)
+
+    def tearDown(self):
+        for directory in self.directories.values():
+            directory.stop()
+        self.tmp.cleanup()
+
+    def test_load_tenants(self):
+        gym, rs = load_tenants(self.config)
+        self.assertEqual(gym.domain, "gym.example.org")
+        self.assertEqual(gym.schild_file, os.path.join(self.tmp.name, "gym", "schild.txt"))
+        self.assertEqual(rs.secret_dir, os.path.join(self.tmp.name, "rs", "secret"))
+        self.assertEqual(rs.customer, "my_customer")
+
+    def test_secret_dir_defaults_to_the_output_dir(self):
+        with open(self.config) as f:
+            config = json.load(f)
+        for entry in config["tenants"]:
+            del entry["secret_dir"]
+        with open(self.config, "w") as f:
+            json.dump(config, f)
+        gym, rs = load_tenants(self.config)
+        self.assertEqual(gym.secret_dir, os.path.join(self.tmp.name, "gym", "out", "secret"))
+        self.assertEqual(Tenant("rs.example.org").secret_dir, os.path.join("rs.example.org", "secret"))
+
+    def test_users_of_other_domains_are_refused(self):
+        self.directories["gym"].users["eva.beispiel@rs.example.org"] = {
+            "primaryEmail": "eva.beispiel@rs.example.org",
+            "orgUnitPath": "/Schüler/Oberstufe/Q1",
+        }
+        with mock.patch(
+            "schild_workspace.credentials.get_credentials",
+            return_value=AnonymousCredentials(),
+        ):
+            report = run_tenants(load_tenants(self.config), apply=True, processes=0)
+        gym, rs = report
+        self.assertIn("ValueError", gym["error"])
+        self.assertIn("rs.example.org", gym["error"])
+        self.assertIsNone(rs["error"])
+        self.assertEqual(self.directories["gym"].calls["insert"], 0)
+        self.assertFalse(self.directories["gym"].users["former@gym.example.org"].get("suspended"))
+
+    def test_sync_and_rollover_inline(self):
+        tenants = load_tenants(self.config)
+        with mock.patch(
+            "schild_workspace.credentials.get_credentials",
+            return_value=AnonymousCredentials(),
+        ) as get_credentials:
+            report = run_tenants(tenants, apply=True, processes=0)
+            self.assertTrue(report.ok, str(report))
+            gym, rs = report
+            self.assertEqual(gym["changes"], {"create": 2, "suspend": 1})
+            self.assertEqual(rs["changes"], {"create": 1, "noop": 1})
+            self.assertEqual(report.summary()["changes"]["create"], 3)
+            self.assertTrue(self.directories["gym"].users["former@gym.example.org"]["suspended"])
+            self.assertIn("max.muster@rs.example.org", self.directories["rs"].users)
+            self.assertNotIn("max.muster@gym.example.org", self.directories["rs"].users)
+            # every school uses its own secret directory
+            self.assertEqual(
+                [call.args[2] for call in get_credentials.call_args_list],
+                [tenant.secret_dir for tenant in tenants],
+            )
+            for name in ("gym", "rs"):
+                out = os.path.join(self.tmp.name, name, "out")
+                self.assertTrue(os.path.exists(os.path.join(out, "passwords_05a.csv")))
+                self.assertTrue(os.path.exists(os.path.join(out, "metrics.json")))
+
+            report = run_tenants(tenants, ROLLOVER, processes=0)
+            self.assertEqual(report.results[1]["changes"], {"move": 1})
+        self.assertIn("rs (rs.example.org) rollover: move: 1", str(report))
+
+    def test_errors_stay_with_their_tenant(self):
+        os.remove(os.path.join(self.tmp.name, "gym", "schild.txt"))
+        os.remove(os.path.join(self.tmp.name, "rs", "schild.txt"))
+        report = run_tenants(load_tenants(self.config), processes=2)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.summary()["errors"], 2)
+        self.assertIn("FileNotFoundError", report.results[0]["error"])
+        self.assertEqual(json.loads(report.to_json())["total"]["tenants"], 2)
@@ -0,0 +1,344 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from googleapiclient.errors import HttpError
+
+from schild_workspace import SchildUsers
+from schild_workspace.passwords import PasswordExport
+from schild_workspace.schild_users import SchildUser
+from schild_workspace.snapshot import Snapshot
+from schild_workspace.workspace_users import User, UserIndex
+
+from fake_directory import DirectoryTestCase, FakeDirectory, student
+
+
+class TestUserIndex(unittest.TestCase):
+    def test_lookups(self):
+        users = [User(student(i)) for i in range(3)]
+        users.append(User(student(3, org_unit="/Schüler/06/061")))
+        users[1]["name"] = {"fullName": "Student 1"}
+        index = UserIndex(users)
+        self.assertIs(index.by_mail["student2@example.org"], users[2])
+        self.assertIs(index.by_schild_id["3"], users[3])
+        self.assertEqual(index.by_org_unit["/Schüler/05/051"], users[:3])
+        self.assertEqual(index.by_name["student 1"], [users[1]])
+
+    def test_remove_uses_the_indexed_keys(self):
+        user = User(student(1))
+        index = UserIndex([user])
+        user["orgUnitPath"] = "/Schüler/06/061"
+        index.remove(user)
+        self.assertEqual(
+            (index.by_mail, index.by_schild_id, index.by_org_unit), ({}, {}, {})
+        )
+        index.update(user)
+        self.assertEqual(index.by_org_unit, {"/Schüler/06/061": [user]})
+
+    def test_shared_schild_id(self):
+        first = User(student(1))
+        second = User(dict(student(1), primaryEmail="student1b@example.org"))
+        index = UserIndex([first, second])
+        self.assertIs(index.by_schild_id["1"], first)
+        index.remove(first)
+        self.assertIs(index.by_schild_id["1"], second)
+        index.remove(second)
+        self.assertNotIn("1", index.by_schild_id)
+
+
+class TestWorkspaceUsers(DirectoryTestCase):
+    page_size = 3
+
+    def setUp(self):
+        super().setUp()
+        self.workspace = self.new_workspace()
+
+    def test_index_follows_writes(self):
+        user = self.workspace.get_user_by_schild_id(4)
+        user["orgUnitPath"] = "/Schüler/06/061"
+        self.workspace.update_user(user)
+        self.assertEqual(
+            self.workspace.get_users_by_org_unit("/Schüler/06/061"), [user]
+        )
+        self.workspace.delete_user(user)
+        self.assertIsNone(self.workspace.get_user_by_schild_id(4))
+        self.assertIsNone(self.workspace.get_user_by_mail("student4@example.org"))
+        self.assertEqual(len(self.workspace.users), 9)
+
+    def test_update_sends_only_changed_fields(self):
+        user = self.workspace.get_user_by_schild_id(4)
+        self.assertIs(self.workspace.update_user(user), user)
+        self.assertEqual(self.directory.calls["patch"], 0)
+        user["orgUnitPath"] = "/Schüler/06/061"
+        self.workspace.update_user(user)
+        self.assertEqual(
+            self.directory.log[-1],
+            ("patch", "student4@example.org", {"orgUnitPath": "/Schüler/06/061"}),
+        )
+        self.assertEqual(user.dirty, set())
+        # unchanged students are not written again
+        self.workspace.add_user(
+            "Student", "4", schild_id=4, schoolclass="/Schüler/06/061"
+        )
+        self.assertEqual(self.directory.calls["patch"], 1)
+
+    def test_service_is_built_once_per_thread(self):
+        for user in list(self.workspace.users):
+            self.workspace.update_user(user)
+        self.assertEqual(self.workspace.service_stats["builds"], 1)
+        thread = threading.Thread(target=self.workspace.refresh)
+        thread.start()
+        thread.join()
+        self.assertEqual(self.workspace.service_stats["builds"], 2)
+        self.assertEqual(len(self.workspace.users), 10)
+
+    def test_list_requests_only_used_fields(self):
+        user = self.directory.users["student0@example.org"]
+        user["thumbnailPhotoUrl"] = "https://..."
+        self.workspace.refresh()
+        self.assertNotIn("thumbnailPhotoUrl", self.workspace.get_user_by_schild_id(0))
+        self.assertNotIn("kind", self.workspace.get_user_by_schild_id(0))
+
+    def test_compact_records(self):
+        workspace = self.new_workspace(compact=True)
+        user = workspace.get_user_by_schild_id(3)
+        self.assertFalse(hasattr(user, "__dict__"))
+        self.assertEqual(repr(user), "student3@example.org - /Schüler/05/051 - 3")
+        self.assertTrue(user.is_student())
+        user["orgUnitPath"] = "/Schüler/06/061"
+        self.assertIs(workspace.update_user(user), user)
+        self.assertEqual(
+            self.directory.users["student3@example.org"]["orgUnitPath"],
+            "/Schüler/06/061",
+        )
+        self.assertEqual(workspace.get_users_by_org_unit("/Schüler/06/061"), [user])
+        with self.assertRaises(KeyError):
+            user["thumbnailPhotoUrl"]
+        with mock.patch("builtins.print"):
+            user.generate_new_password()
+        self.assertEqual(set(self.directory.log[-1][2]), {"password"})
+        with workspace.batch():
+            pending, _ = workspace.add_user("Max", "Muster", schoolclass="051")
+            self.assertIs(type(pending), type(user))
+        self.assertEqual({type(other) for other in workspace.users}, {type(user)})
+
+    def test_query_and_search(self):
+        self.assertEqual(len(self.workspace.query("student")), 10)
+        self.assertEqual(
+            self.workspace.query("Student 3"), [self.workspace.get_user_by_schild_id(3)]
+        )
+        self.assertEqual(self.workspace.query("student 3", school_class="06"), [])
+        hits = self.workspace.search("studnet 7", limit=1)
+        self.assertEqual(hits, [self.workspace.get_user_by_schild_id(7)])
+
+    def test_lazy_lookups_fetch_slices(self):
+        self.directory.users["teacher@example.org"] = FakeDirectory._complete(
+            {"primaryEmail": "teacher@example.org", "orgUnitPath": "/Lehrer"}
+        )
+        calls = self.directory.calls["list"]
+        workspace = self.new_workspace(lazy=True)
+        self.assertEqual(self.directory.calls["list"], calls)
+        user = workspace.get_user_by_mail("student1@example.org")
+        self.assertEqual(user.schildId, "1")
+        self.assertEqual(self.directory.calls["get"], 1)
+        self.assertIsNone(workspace.get_user_by_mail("nobody@example.org"))
+        self.assertIsNone(workspace.get_user_by_mail("nobody@example.org"))
+        self.assertEqual(self.directory.calls["get"], 2)
+        self.assertEqual(
+            workspace.get_user_by_schild_id(2)["primaryEmail"], "student2@example.org"
+        )
+        self.assertEqual(len(workspace.query(school_class="/Schüler")), 10)
+        self.assertEqual(len(workspace.query(school_class="/Schüler")), 10)
+        # one page by schild id, four for /Schüler
+        self.assertEqual(self.directory.calls["list"], calls + 5)
+        self.assertEqual(len(workspace.users), 10)
+        user, _ = workspace.add_user("Student", "3", schoolclass="051")
+        self.assertEqual(user["primaryEmail"], "student.3@example.org")
+        self.assertEqual(self.directory.log[-2][0], "list")
+
+    def test_list_org_units_in_parallel(self):
+        self.directory.users["teacher@example.org"] = FakeDirectory._complete(
+            {"primaryEmail": "teacher@example.org", "orgUnitPath": "/Lehrer"}
+        )
+        self.directory.users["student10@example.org"] = FakeDirectory._complete(
+            student(10, org_unit="/Schüler/06/061")
+        )
+        workspace = self.new_workspace(
+            list_org_units=("/Schüler", "/Schüler/05", "/Lehrer")
+        )
+        expected = [f"student{i}@example.org" for i in range(11)]
+        expected.append("teacher@example.org")
+        mails = [user["primaryEmail"] for user in workspace.users]
+        self.assertEqual(mails, sorted(expected))
+        # users outside of the listed org units are fetched, not taken as free
+        self.assertFalse(workspace.complete)
+        self.directory.users["max.muster@example.org"] = FakeDirectory._complete(
+            {"primaryEmail": "max.muster@example.org", "orgUnitPath": "/Verwaltung"}
+        )
+        self.assertIsNotNone(workspace.get_user_by_mail("max.muster@example.org"))
+        user, _ = workspace.add_user("Max", "Muster", schoolclass="051")
+        self.assertEqual(user["primaryEmail"], "max.muster1@example.org")
+
+    def test_list_org_units_keeps_no_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.pickle")
+            self.new_workspace(
+                list_org_units=("/Lehrer",), snapshot_ttl=60, snapshot_path=path
+            )
+            self.assertFalse(os.path.exists(path))
+            restarted = self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            self.assertEqual(len(restarted.users), 10)
+
+    def test_rotate_passwords(self):
+        self.directory.fail[("patch", "student3@example.org")] = 400
+        with tempfile.TemporaryDirectory() as tmp:
+            # default batches, batches of 4 and threads
+            runs = [({}, 1), ({"batch_size": 4}, 3), ({"workers": 3}, 0)]
+            for options, batch_requests in runs:
+                log_start = len(self.directory.log)
+                batches = self.directory.calls["batch"]
+                failed = self.workspace.rotate_passwords(
+                    "/Schüler/05", password_export=PasswordExport(tmp), **options
+                )
+                self.assertEqual(
+                    [user["primaryEmail"] for user, _ in failed],
+                    ["student3@example.org"],
+                )
+                bodies = [
+                    body
+                    for op, _, body in self.directory.log[log_start:]
+                    if op == "patch"
+                ]
+                self.assertEqual(len(bodies), 10)
+                self.assertEqual(
+                    set(bodies[0]), {"password", "changePasswordAtNextLogin"}
+                )
+                batches = self.directory.calls["batch"] - batches
+                self.assertEqual(batches, batch_requests)
+            with open(os.path.join(tmp, "passwords_051.csv")) as f:
+                self.assertEqual(len(f.readlines()), 27)
+        self.assertNotIn("password", self.workspace.get_user_by_schild_id(1))
+
+    def test_classify(self):
+        self.directory.users["student0@example.org"]["agreedToTerms"] = False
+        del self.directory.users["student1@example.org"]["externalIds"]
+        self.workspace.refresh()
+        schild = SchildUsers()
+        schild.users = [SchildUser({"Interne ID-Nummer": str(i)}) for i in range(5)]
+        categories = self.workspace.classify(schild)
+        self.assertEqual(len(categories["not_agreed"]), 1)
+        self.assertEqual(len(categories["students_without_schild_id"]), 1)
+        # 5..9 and the student without a schild id
+        self.assertEqual(len(categories["former_students"]), 6)
+        self.assertEqual(
+            self.workspace.get_former_students(schild), categories["former_students"]
+        )
+
+    def test_snapshot_replaces_full_listing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.pickle")
+            workspace = self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            user = workspace.get_user_by_schild_id(1)
+            user["orgUnitPath"] = "/Schüler/06/061"
+            workspace.update_user(user)
+            workspace.delete_user(workspace.get_user_by_schild_id(2))
+            lists = self.directory.calls["list"]
+            restarted = self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            self.assertEqual(self.directory.calls["list"], lists)
+            self.assertEqual(len(restarted.users), 9)
+            self.assertEqual(
+                restarted.get_user_by_schild_id(1)["orgUnitPath"], "/Schüler/06/061"
+            )
+
+    def test_own_writes_keep_the_snapshot_age(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.pickle")
+            workspace = self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            listed = workspace.snapshot.listed
+            with mock.patch("schild_workspace.snapshot.time.time") as now:
+                now.return_value = listed + 50
+                user = workspace.get_user_by_schild_id(1)
+                user["orgUnitPath"] = "/Schüler/06/061"
+                workspace.update_user(user)
+                self.assertEqual(len(Snapshot(path, ttl=60).load("example.org")), 10)
+                now.return_value = listed + 61
+                self.assertIsNone(Snapshot(path, ttl=60).load("example.org"))
+
+    def test_failed_updates_are_rolled_back(self):
+        self.directory.fail[("patch", "student2@example.org")] = 400
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.pickle")
+            workspace = self.new_workspace(snapshot_ttl=3600, snapshot_path=path)
+            with mock.patch("builtins.print"):
+                failed = workspace.move_to_next_year(True, batch_size=10)
+            self.assertEqual(len(failed), 1)
+            user = workspace.get_user_by_mail("student2@example.org")
+            self.assertEqual(user["orgUnitPath"], "/Schüler/05/051")
+            self.assertEqual(user.dirty, set())
+            stored = {
+                user["primaryEmail"]: user["orgUnitPath"]
+                for user in Snapshot(path, ttl=3600).load("example.org")
+            }
+            self.assertEqual(stored["student2@example.org"], "/Schüler/05/051")
+            self.assertEqual(stored["student3@example.org"], "/Schüler/06/061")
+        for compact in (False, True):
+            user = self.new_workspace(compact=compact).get_user_by_schild_id(2)
+            user["orgUnitPath"] = "/Schüler/06/061"
+            user.schildId = 20
+            with self.assertRaises(HttpError):
+                user.save()
+            self.assertEqual(user["orgUnitPath"], "/Schüler/05/051")
+            self.assertEqual(user.schildId, "2")
+            self.assertEqual(user.dirty, set())
+
+    def test_lazy_workspace_keeps_no_partial_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.pickle")
+            self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            lazy = self.new_workspace(lazy=True, snapshot_ttl=60, snapshot_path=path)
+            user = lazy.get_user_by_schild_id(1)
+            user["orgUnitPath"] = "/Schüler/06/061"
+            lazy.update_user(user)
+            self.assertFalse(os.path.exists(path))
+            lists = self.directory.calls["list"]
+            restarted = self.new_workspace(snapshot_ttl=60, snapshot_path=path)
+            self.assertGreater(self.directory.calls["list"], lists)
+            self.assertEqual(len(restarted.users), 10)
+            self.assertEqual(
+                restarted.get_user_by_schild_id(1)["orgUnitPath"], "/Schüler/06/061"
+            )
+
+    def test_lazy_query_matches_substrings(self):
+        workspace = self.new_workspace(lazy=True)
+        self.assertEqual(len(workspace.query("tudent")), 10)
+        self.assertEqual(workspace.fetch(name="tudent"), [])
+        self.assertEqual(len(workspace.fetch(name="Student")), 10)
+
+    def test_add_schild_students_releases_reserved_addresses(self):
+        max_muster = {
+            "Vorname": "Max",
+            "Nachname": "Muster",
+            "Klasse": "05a",
+            "Interne ID-Nummer": "100",
+        }
+        eva = dict(max_muster, Vorname="Eva", Nachname="Beispiel")
+        eva["Interne ID-Nummer"] = "101"
+        without_id = {key: max_muster[key] for key in ("Vorname", "Nachname", "Klasse")}
+        with mock.patch("builtins.print"):
+            self.assertIsNone(self.workspace.add_schild_students([without_id]))
+        with self.assertRaises(ValueError):
+            self.workspace.add_schild_students([max_muster], batch_size=10, workers=2)
+        self.directory.fail[("insert", "eva.beispiel@example.org")] = 400
+        with tempfile.TemporaryDirectory() as tmp, self.assertRaises(HttpError):
+            self.workspace.add_schild_students(
+                [eva, max_muster], password_export=PasswordExport(tmp)
+            )
+        allocator = self.workspace.allocator
+        self.assertEqual(allocator.allocate("max.muster"), "max.muster@example.org")
+        self.assertEqual(allocator.allocate("eva.beispiel"), "eva.beispiel@example.org")
+
+
+if __name__ == "__main__":
+    unittest.main()